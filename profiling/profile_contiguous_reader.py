@@ -0,0 +1,74 @@
+"""
+Compares regular and contiguous TDS readers on values which span packet
+boundaries.
+
+Stream consists of endless sequence of 4096 byte packets whose payload is
+a sequence of 3000 byte UCS2 strings, so most of the strings are split
+between two packets.
+"""
+import struct
+import cProfile
+import pstats
+import timeit
+
+import pytds.tds
+from pytds.collate import ucs2_codec
+
+
+BUFSIZE = 4096
+HEADER = struct.Struct('>BBHHBx')
+STR_BYTES = 3000
+
+
+class Sock:
+    def __init__(self):
+        self._read_pos = 0
+        payload = (u'x' * (STR_BYTES // 2)).encode('utf-16le')
+        payload = (payload * (2 * BUFSIZE // STR_BYTES + 1))[:BUFSIZE - HEADER.size]
+        self._buf = bytearray(b'\x00' * HEADER.size) + payload
+        HEADER.pack_into(self._buf, 0, 4, 0, BUFSIZE, 0, 0)
+
+    def sendall(self, data, flags=0):
+        pass
+
+    def recv_into(self, buffer, size=0):
+        if size == 0:
+            size = len(buffer)
+        res = self.recv(size)
+        buffer[:len(res)] = res
+        return len(res)
+
+    def recv(self, size):
+        if self._read_pos >= len(self._buf):
+            self._read_pos = 0
+        res = self._buf[self._read_pos:self._read_pos + size]
+        self._read_pos += len(res)
+        return res
+
+    def close(self):
+        pass
+
+
+class Session:
+    def __init__(self):
+        self._transport = Sock()
+
+
+def read_strings(rdr, count=20000):
+    for _ in range(count):
+        rdr.read_str(STR_BYTES, ucs2_codec)
+
+
+for reader_class in (pytds.tds._TdsReader, pytds.tds._TdsContiguousReader):
+    rdr = reader_class(Session())
+    print('{}: {:.3f} sec'.format(reader_class.__name__,
+                                   timeit.timeit(lambda: read_strings(rdr), number=1)))
+
+rdr = pytds.tds._TdsContiguousReader(Session())
+pr = cProfile.Profile()
+pr.enable()
+read_strings(rdr)
+pr.disable()
+sortby = 'tottime'
+ps = pstats.Stats(pr).sort_stats(sortby)
+ps.print_stats()
@@ -0,0 +1,144 @@
+"""
+Compares decoding of fixed width values by serializers with the previous
+approach, which built intermediate SQL value objects, e.g. Date, Time and
+DateTime2, and divided decimals in a local decimal context.
+
+Every value is decoded from a reader which serves the same encoded bytes
+over and over, so only decoding is measured.
+"""
+import datetime
+import decimal
+import functools
+import struct
+import timeit
+
+import pytds.tds_types as tt
+import pytds.tz
+
+COUNT = 200000
+
+
+class Session:
+    tzinfo_factory = None
+    utc_tzinfo = None
+
+
+class Reader:
+    """ Minimal reader which serves the same encoded value over and over """
+    def __init__(self, buf):
+        self._buf = buf
+        self._pos = 0
+        self.session = Session()
+
+    def readall(self, size):
+        res = self._buf[self._pos:self._pos + size]
+        self._pos = (self._pos + size) % len(self._buf)
+        return res
+
+    def unpack(self, struc):
+        return struc.unpack(self.readall(struc.size))
+
+    def get_byte(self):
+        return self.readall(1)[0]
+
+    def get_int(self):
+        return struct.unpack('<l', self.readall(4))[0]
+
+    def get_smallint(self):
+        return struct.unpack('<h', self.readall(2))[0]
+
+
+def legacy_decode_num(buf):
+    return functools.reduce(lambda acc, val: acc * 256 + val, reversed(buf), 0)
+
+
+def legacy_datetime2(r, size):
+    buf = r.readall(size)
+    val = legacy_decode_num(buf[:size - 3]) * 10 ** (7 - 7)
+    time = tt.Time(nsec=val * 100)
+    date = tt.Date(days=legacy_decode_num(buf[size - 3:]))
+    res = tt.DateTime2(date=date, time=time).to_pydatetime()
+    if r.session.tzinfo_factory is not None:
+        res = res.replace(tzinfo=r.session.tzinfo_factory(0))
+    return res
+
+
+def legacy_datetimeoffset(r, size):
+    time = tt.Time(nsec=legacy_decode_num(r.readall(size - 5)) * 100)
+    date = tt.Date(days=legacy_decode_num(r.readall(3)))
+    offset = r.get_smallint()
+    return tt.DateTimeOffset(date=date, time=time, offset=offset).to_pydatetime()
+
+
+def legacy_date(r):
+    return tt.Date(days=legacy_decode_num(r.readall(3))).to_pydate()
+
+
+def legacy_datetime(r):
+    days, t = r.unpack(tt.DateTimeSerializer._struct)
+    return tt.DateTime(days=days, time_part=t).to_pydatetime()
+
+
+def legacy_decimal(r, size, scale):
+    positive = r.get_byte()
+    val = decimal.Decimal(legacy_decode_num(r.readall(size - 1)))
+    with decimal.localcontext() as ctx:
+        ctx.prec = 38
+        if not positive:
+            val *= -1
+        val /= 10 ** scale
+    return val
+
+
+def legacy_money(r):
+    return decimal.Decimal(r.get_int()) / 10000
+
+
+dt = datetime.datetime(2020, 5, 17, 13, 45, 12, 345678)
+dt2_serializer = tt.DateTime2Serializer(tt.DateTime2Type(precision=7))
+dto_serializer = tt.DateTimeOffsetSerializer(tt.DateTimeOffsetType(precision=7))
+date_serializer = tt.MsDateSerializer(tt.DateType())
+dec_serializer = tt.MsDecimalSerializer(precision=18, scale=4)
+
+
+def encode(serializer, value):
+    class W:
+        def __init__(self):
+            self.data = b''
+            self.session = Session()
+
+        def write(self, data):
+            self.data += data
+
+        def put_byte(self, value):
+            self.data += struct.pack('B', value)
+
+        def put_smallint(self, value):
+            self.data += struct.pack('<h', value)
+    w = W()
+    serializer.write(w, value)
+    return w.data[1:]  # without size byte
+
+
+cases = [
+    ('datetime2', encode(dt2_serializer, dt),
+     lambda r: legacy_datetime2(r, 8), lambda r: dt2_serializer.read_fixed(r, 8)),
+    ('datetimeoffset', encode(dto_serializer, dt.replace(tzinfo=pytds.tz.FixedOffsetTimezone(180))),
+     lambda r: legacy_datetimeoffset(r, 10), lambda r: dto_serializer.read_fixed(r, 10)),
+    ('date', encode(date_serializer, dt.date()),
+     legacy_date, date_serializer.read_fixed),
+    ('datetime', tt.DateTimeSerializer.encode(dt),
+     legacy_datetime, tt.DateTimeSerializer.instance.read),
+    ('decimal', encode(dec_serializer, decimal.Decimal('12345678.9012')),
+     lambda r: legacy_decimal(r, 9, 4), lambda r: dec_serializer.read_fixed(r, 9)),
+    ('money', struct.pack('<l', 123456789),
+     legacy_money, tt.Money4Serializer.instance.read),
+]
+
+for name, buf, legacy, fast in cases:
+    r = Reader(buf)
+    assert legacy(r) == fast(r), name
+    legacy_time = timeit.timeit(lambda: legacy(r), number=COUNT)
+    fast_time = timeit.timeit(lambda: fast(r), number=COUNT)
+    print('{:16} legacy: {:.3f} sec, fast: {:.3f} sec, speedup {:.1f}x'.format(
+        name, legacy_time, fast_time, legacy_time / fast_time))
@@ -0,0 +1,112 @@
+"""
+Compares encoding of temporal and decimal values by serializers with the
+previous approach, which built intermediate SQL value objects, e.g. Date
+and Time, and emitted decimal digits one byte at a time.
+
+Values are written into a writer which discards the data, so only
+encoding is measured.
+"""
+import datetime
+import decimal
+import struct
+import timeit
+
+import pytds.tds_types as tt
+import pytds.tz
+
+COUNT = 200000
+
+
+class Session:
+    use_tz = None
+
+
+class Writer:
+    """ Minimal writer which discards everything """
+    session = Session()
+
+    def write(self, data):
+        pass
+
+    def put_byte(self, value):
+        pass
+
+    def put_smallint(self, value):
+        pass
+
+    def pack(self, struc, *args):
+        struc.pack(*args)
+
+
+def legacy_datetime2(serializer, w, value):
+    w.put_byte(serializer.size)
+    serializer._write_time(w, tt.Time.from_pytime(value), serializer._typ.precision)
+    serializer._write_date(w, tt.Date.from_pydate(value))
+
+
+def legacy_datetimeoffset(serializer, w, value):
+    utcoffset = value.utcoffset()
+    value = value.astimezone(tt._utc).replace(tzinfo=None)
+    w.put_byte(serializer.size)
+    serializer._write_time(w, tt.Time.from_pytime(value), serializer._typ.precision)
+    serializer._write_date(w, tt.Date.from_pydate(value))
+    w.put_smallint(int(utcoffset.total_seconds()) // 60)
+
+
+def legacy_time(serializer, w, value):
+    w.put_byte(serializer.size)
+    serializer._write_time(w, tt.Time.from_pytime(value), serializer._typ.precision)
+
+
+def legacy_date(serializer, w, value):
+    w.put_byte(3)
+    serializer._write_date(w, tt.Date.from_pydate(value))
+
+
+def legacy_datetime(w, value):
+    dt = tt.DateTime.from_pydatetime(value)
+    w.write(tt.DateTimeSerializer._struct.pack(dt.days, dt.time_part))
+
+
+def legacy_decimal(serializer, w, value):
+    with decimal.localcontext() as context:
+        context.prec = 38
+        value = value.normalize()
+        size = serializer.size
+        w.put_byte(size)
+        val = value
+        positive = 1 if val > 0 else 0
+        w.put_byte(positive)
+        if not positive:
+            val *= -1
+        size -= 1
+        val *= 10 ** serializer.scale
+        for i in range(size):
+            w.put_byte(int(val % 256))
+            val //= 256
+
+
+dt = datetime.datetime(2020, 5, 17, 13, 45, 12, 345678)
+dto = dt.replace(tzinfo=pytds.tz.FixedOffsetTimezone(180))
+dec = decimal.Decimal('12345678.9012')
+dt2_serializer = tt.DateTime2Serializer(tt.DateTime2Type(precision=7))
+dto_serializer = tt.DateTimeOffsetSerializer(tt.DateTimeOffsetType(precision=7))
+time_serializer = tt.MsTimeSerializer(tt.TimeType(precision=7))
+date_serializer = tt.MsDateSerializer(tt.DateType())
+dec_serializer = tt.MsDecimalSerializer(precision=18, scale=4)
+w = Writer()
+
+cases = [
+    ('datetime2', lambda: legacy_datetime2(dt2_serializer, w, dt), lambda: dt2_serializer.write(w, dt)),
+    ('datetimeoffset', lambda: legacy_datetimeoffset(dto_serializer, w, dto), lambda: dto_serializer.write(w, dto)),
+    ('time', lambda: legacy_time(time_serializer, w, dt.time()), lambda: time_serializer.write(w, dt.time())),
+    ('date', lambda: legacy_date(date_serializer, w, dt.date()), lambda: date_serializer.write(w, dt.date())),
+    ('datetime', lambda: legacy_datetime(w, dt), lambda: w.write(tt.DateTimeSerializer.encode(dt))),
+    ('decimal', lambda: legacy_decimal(dec_serializer, w, dec), lambda: dec_serializer.write(w, dec)),
+]
+
+for name, legacy, fast in cases:
+    legacy_time_ = timeit.timeit(legacy, number=COUNT)
+    fast_time = timeit.timeit(fast, number=COUNT)
+    print('{:16} legacy: {:.3f} sec, fast: {:.3f} sec, speedup {:.1f}x'.format(
+        name, legacy_time_, fast_time, legacy_time_ / fast_time))
@@ -0,0 +1,77 @@
+"""
+Parses recorded response offline with I/O free protocol session.
+
+Response consists of COLMETADATA for 7 columns, ROWS rows and DONE token,
+it is split into 4096 byte packets and fed into the parser in 64KB chunks.
+"""
+import cProfile
+import pstats
+import struct
+import timeit
+
+import pytds.tds
+import pytds.tds_base
+import pytds.tds_types
+from pytds.collate import raw_collation
+from pytds.protocol import ProtocolSession, Rows
+
+ROWS = 50000
+CHUNK = 65536
+
+
+def make_response():
+    serializers = [
+        pytds.tds_types.IntSerializer.instance,
+        pytds.tds_types.BigIntSerializer.instance,
+        pytds.tds_types.FloatSerializer.instance,
+        pytds.tds_types.SmallIntSerializer.instance,
+        pytds.tds_types.IntSerializer.instance,
+        pytds.tds_types.IntNSerializer(pytds.tds_types.IntType()),
+        pytds.tds_types.NVarChar72Serializer(size=40, collation=raw_collation),
+    ]
+    row = [1, 2 ** 40, 0.5, 3, 4, 5, u'some text']
+    sess = ProtocolSession()
+    w = sess._writer
+    w.begin_packet(4)
+    w.put_byte(pytds.tds_base.TDS7_RESULT_TOKEN)
+    w.put_usmallint(len(serializers))
+    for i, serializer in enumerate(serializers):
+        w.put_uint(0)
+        w.put_usmallint(1)
+        w.put_byte(serializer.type)
+        serializer.write_info(w)
+        name = u'c{}'.format(i)
+        w.put_byte(len(name))
+        w.write_ucs2(name)
+    for _ in range(ROWS):
+        w.put_byte(pytds.tds_base.TDS_ROW_TOKEN)
+        for serializer, value in zip(serializers, row):
+            serializer.write(w, value)
+    w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_COUNT, 0, ROWS)
+    w.flush()
+    return sess.data_to_send()
+
+
+response = make_response()
+
+
+def parse():
+    sess = ProtocolSession()
+    rows = 0
+    for pos in range(0, len(response), CHUNK):
+        sess.feed(response[pos:pos + CHUNK])
+        for event in sess.events():
+            if isinstance(event, Rows):
+                rows += len(event.rows)
+    assert rows == ROWS
+
+
+print('parse: {:.3f} sec'.format(timeit.timeit(parse, number=1)))
+
+pr = cProfile.Profile()
+pr.enable()
+parse()
+pr.disable()
+sortby = 'tottime'
+ps = pstats.Stats(pr).sort_stats(sortby)
+ps.print_stats(20)
@@ -0,0 +1,71 @@
+"""
+Compares decoding of short strings by _TdsReader.read_str with the
+previous approach, which joined chunks returned by readall and decoded
+the joined buffer, and reading of collations with and without interning.
+
+Strings are served offline from memory split into 4096 byte packets.
+"""
+import timeit
+
+import pytds.tds
+from pytds.collate import Collation, ucs2_codec
+
+COUNT = 200000
+BUFSIZE = 4096
+
+value = ucs2_codec.encode(u'some short text')[0]
+collation = Collation(1033, 0, True, False, False, False, False, False, 0).pack()
+
+
+def make_packets(item):
+    per_packet = (BUFSIZE - pytds.tds._header.size) // len(item)
+    payload = item * per_packet
+    packet = pytds.tds._header.pack(4, 0, pytds.tds._header.size + len(payload), 0, 0) + payload
+    return packet, per_packet
+
+
+class Sock:
+    def __init__(self, packet):
+        self._packet = packet
+        self._pos = 0
+
+    def recv_into(self, buffer, size=0):
+        if size == 0:
+            size = len(buffer)
+        res = self._packet[self._pos:self._pos + size]
+        buffer[:len(res)] = res
+        self._pos = (self._pos + len(res)) % len(self._packet)
+        return len(res)
+
+
+def open_reader(packet):
+    tds = pytds.tds._TdsSocket()
+    sess = pytds.tds._TdsSession(tds, Sock(packet), None)
+    return pytds.tds._TdsReader(sess)
+
+
+def legacy_str(r):
+    return ucs2_codec.decode(r.readall(len(value)))[0]
+
+
+def fast_str(r):
+    return r.read_str(len(value), ucs2_codec)
+
+
+def legacy_collation(r):
+    return Collation.unpack(r.readall(Collation.wire_size)).get_charset()
+
+
+def fast_collation(r):
+    return r.get_collation().get_codec()
+
+
+for name, item, legacy, fast in [('string', value, legacy_str, fast_str),
+                                 ('collation', collation, legacy_collation, fast_collation)]:
+    packet, per_packet = make_packets(item)
+    r = open_reader(packet)
+    legacy_time = timeit.timeit(lambda: legacy(r), number=COUNT)
+    r = open_reader(packet)
+    fast_time = timeit.timeit(lambda: fast(r), number=COUNT)
+    print('{:10} legacy: {:.3f} sec, fast: {:.3f} sec, speedup {:.1f}x'.format(
+        name, legacy_time, fast_time, legacy_time / fast_time))
@@ -0,0 +1,102 @@
+"""
+Compares decoding of ROW streams column by column with serializers against
+compiled row decoder.
+
+Result has 30 columns: mix of not-null fixed size integers and floats,
+nullable integers and short strings.
+"""
+import cProfile
+import pstats
+import timeit
+
+import pytds.tds
+import pytds.tds_types
+from pytds.collate import raw_collation
+from pytds.tds_base import Column
+
+ROWS = 50000
+
+
+class Sock:
+    def __init__(self):
+        self.packets = []
+        self._data = b''
+        self._read_pos = 0
+
+    def sendall(self, data, flags=0):
+        self.packets.append(bytes(data))
+
+    def rewind(self):
+        self._data = b''.join(self.packets)
+        self._read_pos = 0
+
+    def recv_into(self, buffer, size=0):
+        if size == 0:
+            size = len(buffer)
+        res = self._data[self._read_pos:self._read_pos + size]
+        self._read_pos += len(res)
+        buffer[:len(res)] = res
+        return len(res)
+
+    def close(self):
+        pass
+
+
+def make_columns():
+    serializers = [
+        pytds.tds_types.IntSerializer.instance,
+        pytds.tds_types.BigIntSerializer.instance,
+        pytds.tds_types.FloatSerializer.instance,
+        pytds.tds_types.SmallIntSerializer.instance,
+        pytds.tds_types.IntSerializer.instance,
+        pytds.tds_types.IntNSerializer(pytds.tds_types.IntType()),
+        pytds.tds_types.NVarChar72Serializer(size=40, collation=raw_collation),
+    ] * 4 + [pytds.tds_types.BitSerializer.instance] * 2
+    columns = []
+    for serializer in serializers:
+        col = Column()
+        col.serializer = serializer
+        columns.append(col)
+    return columns
+
+
+columns = make_columns()
+row = [1, 2 ** 40, 0.5, 3, 4, 5, u'some text'] * 4 + [True, False]
+sock = Sock()
+sess = pytds.tds._TdsSession(pytds.tds._TdsSocket(), sock, None)
+w = sess._writer
+w.begin_packet(4)
+for _ in range(ROWS):
+    for col, value in zip(columns, row):
+        col.serializer.write(w, value)
+w.flush()
+
+
+def read_by_columns():
+    sock.rewind()
+    r = sess._reader = pytds.tds._TdsReader(sess)
+    values = [None] * len(columns)
+    for _ in range(ROWS):
+        for i, curcol in enumerate(columns):
+            values[i] = curcol.serializer.read(r)
+
+
+def read_by_decoder():
+    sock.rewind()
+    r = sess._reader = pytds.tds._TdsReader(sess)
+    decoder = pytds.tds._RowDecoder(columns)
+    values = [None] * len(columns)
+    for _ in range(ROWS):
+        decoder.read_row(r, values)
+
+
+print('by columns: {:.3f} sec'.format(timeit.timeit(read_by_columns, number=1)))
+print('by decoder: {:.3f} sec'.format(timeit.timeit(read_by_decoder, number=1)))
+
+pr = cProfile.Profile()
+pr.enable()
+read_by_decoder()
+pr.disable()
+sortby = 'tottime'
+ps = pstats.Stats(pr).sort_stats(sortby)
+ps.print_stats()
@@ -1,12 +1,17 @@
 """DB-SIG compliant module for communicating with MS SQL servers"""
+import collections
 from collections import deque
 import datetime
+import decimal
 import errno
+import itertools
 import keyword
 import os
 import re
 import six
 import socket
+import threading
+import time
 import uuid
 import warnings
 import weakref
@@ -20,7 +25,7 @@ import pytds.tz
 from .tds import (
     _TdsSocket, tds7_get_instances,
     _create_exception_by_message,
-    output, default
+    output, default, ColumnData, _split_column, _slice_bulk_columns
 )
 from . import tds_base
 from .tds_base import (
@@ -32,7 +37,9 @@ from .tds_base import (
     PreLoginEnc)
 
 from .tds_types import (
-    TableValuedParam, Binary
+    TableValuedParam, Binary, sql_type_by_serializer,
+    TextType, NTextType, ImageType, VarCharMaxType, NVarCharMaxType, VarBinaryMaxType,
+    VarCharMaxSerializer, NVarCharMaxSerializer,
 )
 
 from .tds_base import (
@@ -40,6 +47,7 @@ from .tds_base import (
 )
 
 from . import tls
+from .collate import raw_collation
 import pkg_resources
 
 __author__ = 'Mikhail Denisenko <denisenkom@gmail.com>'
@@ -70,7 +78,10 @@ paramstyle = 'pyformat'
 
 
 class _TdsLogin:
-    pass
+    contiguous_reads = False
+    read_ahead = 0
+    scatter_writes = False
+    metadata_cache_size = 64
 
 
 def tuple_row_strategy(column_names):
@@ -148,23 +159,668 @@ def recordtype_row_strategy(column_names):
     return row_factory
 
 
-class _ConnectionPool(object):
-    def __init__(self, max_pool_size=100, min_pool_size=0):
+class _PoolWaiter(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.served = False
+        self.item = None
+
+
+class _PoolEntry(object):
+    """ Connections of the pool which share the same connection parameters """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = deque()  # (item, time when it was returned)
+        self.waiters = deque()
+        self.size = 0  # idle, in use and being created connections
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.creations = 0
+        self.discards = 0
+
+
+class ConnectionPool(object):
+    """ Pool of connections used by :func:`connect` when ``pooling=True``
+
+    Connections are pooled separately for each set of connection parameters.
+    Number of connections for each set, both idle and in use, is limited by
+    `max_pool_size`, when limit is reached :func:`connect` waits until some
+    pooled connection is closed, waiting threads are served in FIFO order.
+
+    Pool used by :func:`connect` is available as ``pytds.connection_pool``,
+    it can be configured with :func:`configure` and inspected with :func:`stats`.
+
+    :param max_pool_size: Maximum number of connections for each set of parameters, ``None`` means no limit
+    :param min_pool_size: Number of idle connections for each set of parameters which are kept
+      even when they are idle longer than `idle_timeout`
+    :param timeout: Time in seconds to wait for a free connection, ``None`` means to wait up to
+      login timeout of the connection
+    :param idle_timeout: Idle connections older than this number of seconds are closed, ``None`` means
+      to keep them forever
+    """
+    def __init__(self, max_pool_size=100, min_pool_size=0, timeout=None, idle_timeout=None):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._max_pool_size = None
+        self._min_pool_size = 0
+        self._timeout = None
+        self._idle_timeout = None
+        self.configure(max_pool_size=max_pool_size, min_pool_size=min_pool_size,
+                       timeout=timeout, idle_timeout=idle_timeout)
+
+    def configure(self, **kwargs):
+        """ Changes settings of the pool, accepts the same keyword arguments as constructor
+
+        New limits are applied to connections as they are returned to the pool.
+        """
+        for name in kwargs:
+            if name not in ('max_pool_size', 'min_pool_size', 'timeout', 'idle_timeout'):
+                raise TypeError("configure() got an unexpected keyword argument '{0}'".format(name))
+        max_pool_size = kwargs.get('max_pool_size', self._max_pool_size)
+        min_pool_size = kwargs.get('min_pool_size', self._min_pool_size)
+        if max_pool_size is not None and max_pool_size < 1:
+            raise ValueError('max_pool_size should be positive')
+        if max_pool_size is not None and min_pool_size > max_pool_size:
+            raise ValueError('min_pool_size should not be greater than max_pool_size')
         self._max_pool_size = max_pool_size
-        self._pool = {}
+        self._min_pool_size = min_pool_size
+        self._timeout = kwargs.get('timeout', self._timeout)
+        self._idle_timeout = kwargs.get('idle_timeout', self._idle_timeout)
+
+    @property
+    def max_pool_size(self):
+        return self._max_pool_size
+
+    @property
+    def min_pool_size(self):
+        return self._min_pool_size
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout
+
+    def _get_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _PoolEntry()
+            return entry
+
+    def _take_idle(self, entry, to_close):
+        """ Takes most recently used idle connection, closed connections and
+        connections idle for too long are moved into to_close list
+        """
+        if self._idle_timeout is not None:
+            expire = time.time() - self._idle_timeout
+            while len(entry.idle) > self._min_pool_size and entry.idle[0][1] < expire:
+                to_close.append(entry.idle.popleft()[0])
+                entry.size -= 1
+                entry.discards += 1
+        while entry.idle:
+            item = entry.idle.pop()[0]
+            if item[0].is_connected():
+                return item
+            to_close.append(item)
+            entry.size -= 1
+            entry.discards += 1
+        return None
+
+    def acquire(self, key, timeout=None):
+        """ Takes connection from the pool or reserves place for a new one
+
+        :param key: Connection parameters
+        :param timeout: Time in seconds to wait for a free connection, ``None`` means to wait forever
+        :returns: Pooled item or ``None`` if caller should create new connection
+          and later return it with :func:`release` or free the place with :func:`discard`
+        """
+        entry = self._get_entry(key)
+        to_close = []
+        try:
+            with entry.lock:
+                entry.checkouts += 1
+                item = self._take_idle(entry, to_close)
+                if item is not None:
+                    return item
+                if self._max_pool_size is None or entry.size < self._max_pool_size:
+                    entry.size += 1
+                    entry.creations += 1
+                    return None
+                waiter = _PoolWaiter()
+                entry.waiters.append(waiter)
+                entry.waits += 1
+        finally:
+            _close_pooled(to_close)
+        start = time.time()
+        waiter.event.wait(timeout)
+        with entry.lock:
+            entry.wait_time += time.time() - start
+            if not waiter.served:
+                entry.waiters.remove(waiter)
+                raise OperationalError('Timed out waiting for a connection from the pool')
+            if waiter.item is None:
+                entry.creations += 1
+            return waiter.item
+
+    def release(self, key, item):
+        """ Returns connection back to the pool, it is given to the first waiting thread if there is one """
+        entry = self._get_entry(key)
+        with entry.lock:
+            if self._max_pool_size is None or entry.size <= self._max_pool_size:
+                if entry.waiters:
+                    waiter = entry.waiters.popleft()
+                    waiter.item = item
+                    waiter.served = True
+                    waiter.event.set()
+                else:
+                    entry.idle.append((item, time.time()))
+                return
+        self.discard(key, item)
+
+    def discard(self, key, item=None):
+        """ Frees place of connection which was taken from the pool
+
+        :param item: Pooled item which should be closed, or ``None`` if
+          connection was not created
+        """
+        entry = self._get_entry(key)
+        with entry.lock:
+            if item is not None:
+                entry.discards += 1
+            if entry.waiters and (self._max_pool_size is None or entry.size <= self._max_pool_size):
+                # pass the place to the first waiting thread, it will create new connection
+                waiter = entry.waiters.popleft()
+                waiter.served = True
+                waiter.event.set()
+            else:
+                entry.size -= 1
+        if item is not None:
+            _close_pooled([item])
+
+    def clear(self):
+        """ Closes all idle connections """
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            with entry.lock:
+                to_close = [item for item, _ in entry.idle]
+                entry.idle.clear()
+                entry.size -= len(to_close)
+                entry.discards += len(to_close)
+            _close_pooled(to_close)
+
+    def stats(self, key=None):
+        """ Returns counters of the pool
+
+        :param key: Connection parameters, if not provided counters are summed over all of them
+        :returns: Dictionary with following items: ``size`` - number of connections,
+          ``idle`` - number of idle connections, ``waiting`` - number of waiting threads,
+          ``checkouts`` - number of acquisitions, ``waits`` - number of acquisitions which had to wait,
+          ``wait_time`` - total time of waiting in seconds, ``creations`` - number of created connections,
+          ``discards`` - number of closed connections
+        """
+        with self._lock:
+            if key is None:
+                entries = list(self._entries.values())
+            else:
+                entries = [self._entries[key]] if key in self._entries else []
+        result = dict(size=0, idle=0, waiting=0, checkouts=0, waits=0, wait_time=0.0, creations=0, discards=0)
+        for entry in entries:
+            with entry.lock:
+                result['size'] += entry.size
+                result['idle'] += len(entry.idle)
+                result['waiting'] += len(entry.waiters)
+                result['checkouts'] += entry.checkouts
+                result['waits'] += entry.waits
+                result['wait_time'] += entry.wait_time
+                result['creations'] += entry.creations
+                result['discards'] += entry.discards
+        return result
+
+
+def _close_pooled(items):
+    for conn, _ in items:
+        if not conn.is_connected():
+            continue
+        try:
+            conn.close()
+        except Exception:
+            logger.exception('Failed to close pooled connection')
+
+
+connection_pool = ConnectionPool()
+
+
+_int_types = tuple(t for t in six.integer_types if t is not bool)
+
+# classes of parameter values which are always mapped to the same SQL type
+_invariant_param_classes = frozenset(
+    [bool, float, six.text_type, six.binary_type, datetime.date, datetime.time, uuid.UUID, type(None)])
+
+
+def _param_template_key(value):
+    """ Returns key which identifies SQL type inferred for the value,
+    or ``None`` if statement with such value should not be cached
+    """
+    cls = type(value)
+    if cls in _invariant_param_classes:
+        return cls
+    elif cls in _int_types:
+        if -2 ** 31 <= value <= 2 ** 31 - 1:
+            return cls, 4
+        elif -2 ** 63 <= value <= 2 ** 63 - 1:
+            return cls, 8
+    elif cls is datetime.datetime:
+        return cls, value.tzinfo is not None
+    elif cls is Binary:
+        return cls, len(value) <= 8000
+    return None
+
+
+def _template_key(operation, params):
+    """ Returns key of :class:`_TemplateCache` for given statement and parameters,
+    or ``None`` if it can't be cached
+    """
+    if isinstance(params, (list, tuple)):
+        items = tuple(_param_template_key(value) for value in params)
+        if None in items:
+            return None
+        return operation, items
+    elif isinstance(params, dict):
+        items = []
+        for name, value in params.items():
+            item = _param_template_key(value)
+            if item is None:
+                return None
+            items.append((name, item))
+        return operation, tuple(items)
+    return None
+
+
+class _Template(object):
+    """ Statement with bound parameter placeholders, stored in :class:`_TemplateCache`
+
+    :param operation: Statement text with placeholders
+    :param declaration: Declaration of parameters
+    :param params: List of tuples of parameter name, index or key of parameter value,
+      SQL type and serializer
+    :param collation: Collation for which serializers were chosen
+    """
+    def __init__(self, operation, declaration, params, collation):
+        self.operation = operation
+        self.declaration = declaration
+        self.params = params
+        self.collation = collation
+
+    def bind(self, values):
+        """ Creates parameter columns for given values """
+        result = []
+        for name, ref, sql_type, serializer in self.params:
+            col = Column(name=name, type=sql_type, value=values[ref])
+            col.serializer = serializer
+            result.append(col)
+        return result
+
+
+class _TemplateCache(object):
+    """ Cache of statements with bound parameters
+
+    Cache is keyed by statement and types of parameter values, it allows to skip
+    formatting of statement, inference of parameter types and building of
+    parameters declaration when the same statement is executed repeatedly.
+
+    :param max_size: Maximum number of cached statements, least recently used are evicted
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, collation):
+        """ Returns cached :class:`_Template` or ``None``
+
+        Template is only valid for the collation its serializers were chosen for.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.collation is not collation:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[key] = entry
+        return entry
+
+    def put(self, key, template):
+        if len(self._entries) >= self._max_size:
+            self._entries.popitem(last=False)
+        self._entries[key] = template
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+class _BulkMetadataCache(object):
+    """ Cache of columns of tables discovered for ``INSERT BULK``, see :func:`Cursor.copy_to`
+
+    Cache is keyed by database, table and whether columns have real types.
+    Entries become stale when table is altered or dropped, so entry of a table
+    is dropped when bulk load into it fails, and it can be refreshed with
+    ``refresh_metadata`` keyword of :func:`Cursor.copy_to`.
+
+    :param max_size: Maximum number of cached tables, least recently used are evicted
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ Returns cached list of columns or ``None`` """
+        metadata = self._entries.pop(key, None)
+        if metadata is not None:
+            self._entries[key] = metadata
+        return metadata
+
+    def put(self, key, metadata):
+        if len(self._entries) >= self._max_size:
+            self._entries.popitem(last=False)
+        self._entries[key] = metadata
+
+    def discard(self, database, obj_name):
+        """ Forgets columns of given table in both typed and untyped modes """
+        for typed in (False, True):
+            self._entries.pop((database, obj_name, typed), None)
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+def _bind_operation(session, operation, params, template_cache=None):
+    """ Binds parameters to SQL statement
+
+    Parameters referenced in the statement using pyformat style are replaced
+    with ``@Pn`` or ``@name`` placeholders, ``None`` values are replaced with ``NULL``.
+
+    :param session: An instance of :class:`pytds.tds._TdsSession`
+    :param operation: SQL statement
+    :param params: Sequence or dict of parameters
+    :param template_cache: An instance of :class:`_TemplateCache` or ``None``
+    :returns: Tuple of statement text, list of parameters as :class:`Column` instances
+      and declaration of parameters
+    """
+    if not params:
+        return six.text_type(operation), [], u''
+    key = None
+    collation = session._tds.collation or raw_collation
+    if template_cache is not None:
+        key = _template_key(operation, params)
+        if key is not None:
+            template = template_cache.get(key, collation)
+            if template is not None:
+                return template.operation, template.bind(params), template.declaration
+    operation = six.text_type(operation)
+    named_params = {}
+    refs = {}
+    if isinstance(params, (list, tuple)):
+        names = []
+        pid = 1
+        for i, val in enumerate(params):
+            if val is None:
+                names.append('NULL')
+            else:
+                name = '@P{0}'.format(pid)
+                names.append(name)
+                named_params[name] = val
+                refs[name] = i
+                pid += 1
+        if len(names) == 1:
+            operation = operation % names[0]
+        else:
+            operation = operation % tuple(names)
+    elif isinstance(params, dict):
+        # prepend names with @
+        rename = {}
+        for name, value in params.items():
+            if value is None:
+                rename[name] = 'NULL'
+            else:
+                mssql_name = '@{0}'.format(name)
+                rename[name] = mssql_name
+                named_params[mssql_name] = value
+                refs[mssql_name] = name
+        operation = operation % rename
+    if not named_params:
+        return operation, [], u''
+    columns = session._convert_params(named_params)
+    declaration = _params_declaration(columns)
+    if key is not None:
+        type_factory = session._tds.type_factory
+        template_params = []
+        for col in columns:
+            col.serializer = col.choose_serializer(type_factory=type_factory, collation=collation)
+            template_params.append((col.column_name, refs[col.column_name], col.type, col.serializer))
+        template_cache.put(key, _Template(operation, declaration, template_params, collation))
+    return operation, columns, declaration
+
+
+def _params_declaration(params):
+    """ Returns declaration of parameters as used by ``sp_executesql`` and ``sp_prepare`` """
+    return u','.join(
+        u'{0} {1}'.format(p.column_name, p.type.get_declaration())
+        for p in params)
+
+
+def _submit_operation(session, operation, params, template_cache=None):
+    """ Sends SQL statement to the server
+
+    Statement with parameters is sent as a call of ``sp_executesql``,
+    statement without parameters is sent as a plain query.
+
+    :param session: An instance of :class:`pytds.tds._TdsSession`
+    :param operation: SQL statement
+    :param params: Sequence or dict of parameters
+    :param template_cache: An instance of :class:`_TemplateCache` or ``None``
+    """
+    operation, named_params, declaration = _bind_operation(session, operation, params, template_cache)
+    if named_params:
+        session.submit_rpc(
+            tds_base.SP_EXECUTESQL,
+            [session.make_param('', operation), session.make_param('', declaration)] + named_params,
+            0)
+    else:
+        session.submit_plain_query(operation)
+
+
+def _submit_operation_batch(session, operation, params_seq, template_cache=None):
+    """ Sends SQL statement to the server once for every set of parameters
+
+    All executions are sent in one request as a batch of ``sp_executesql`` calls,
+    response should be processed by :func:`pytds.tds._TdsSession.process_rpc_batch`.
+
+    :param session: An instance of :class:`pytds.tds._TdsSession`
+    :param operation: SQL statement
+    :param params_seq: List of sequences or dicts of parameters
+    :param template_cache: An instance of :class:`_TemplateCache` or ``None``
+    """
+    requests = []
+    for params in params_seq:
+        text, named_params, declaration = _bind_operation(session, operation, params, template_cache)
+        rpc_params = [session.make_param('', text)]
+        if named_params:
+            rpc_params.append(session.make_param('', declaration))
+            rpc_params.extend(named_params)
+        requests.append((tds_base.SP_EXECUTESQL, rpc_params, 0))
+    session.submit_rpc_batch(requests)
+
+
+# maximum number of parameters in a request, minus statement and declaration parameters of sp_executesql
+_max_insert_params = 2100 - 2
+# maximum number of rows in VALUES clause of INSERT
+_max_insert_rows = 1000
+_insert_values_re = re.compile(r'^\s*(insert\s+(?:into\s+)?\S.*?\s*\bvalues)\s*\(((?:[^()]|%\(\w+\)s)*)\)\s*;?\s*$',
+                               re.IGNORECASE | re.DOTALL)
+_named_placeholder_re = re.compile(r'^%\((\w+)\)s$')
+
+
+def _parse_insert_values(operation):
+    """ Recognizes simple single row INSERT statement where every value is a parameter placeholder
+
+    :returns: Tuple of statement text up to and including VALUES keyword and list of placeholders,
+      which contains ``None`` items for positional placeholders and parameter names for named ones,
+      or ``None`` if statement is not such INSERT
+    """
+    m = _insert_values_re.match(operation)
+    if not m:
+        return None
+    prefix, values = m.groups()
+    # don't touch statements which could hide something in string literals or comments,
+    # or which have parameters outside of VALUES
+    for token in ("'", ';', '--', '/*', '%s', '%('):
+        if token in prefix:
+            return None
+    placeholders = []
+    for value in values.split(','):
+        value = value.strip()
+        if value == '%s':
+            placeholders.append(None)
+        else:
+            m = _named_placeholder_re.match(value)
+            if not m:
+                return None
+            placeholders.append(m.group(1))
+    if len(set(p is None for p in placeholders)) != 1:
+        return None
+    return prefix, placeholders
+
+
+def _insert_value_kind(value):
+    """ Returns key of SQL type which is inferred for value, values of different
+    kinds are not mixed in one column of multi-row VALUES, since server would
+    convert them to a common type.  ``None`` is compatible with any kind, ``False``
+    is returned for values which can't be used in multi-row VALUES.
+    """
+    if value is None:
+        return None
+    if isinstance(value, decimal.Decimal):
+        return decimal.Decimal, value.as_tuple().exponent
+    key = _param_template_key(value)
+    if key is None:
+        return False
+    return key
+
 
-    def add(self, key, conn):
-        l = self._pool.setdefault(key, []).append(conn)
+def _insert_chunks(placeholders, params_seq):
+    """ Splits rows of INSERT parameters into chunks which can be inserted by one multi-row statement
 
-    def take(self, key):
-        l = self._pool.get(key, [])
-        if len(l) > 0:
-            return l.pop()
+    :returns: Iterator over lists of rows, every row is a list of values, or ``None``
+      if some row can't be inserted that way, in which case all rows should be inserted one by one
+    """
+    num_cols = len(placeholders)
+    max_rows = max(1, min(_max_insert_rows, _max_insert_params // num_cols))
+    named = placeholders[0] is not None
+    chunks = []
+    chunk = []
+    kinds = [None] * num_cols
+    for params in params_seq:
+        if named:
+            if not isinstance(params, dict):
+                return None
+            try:
+                row = [params[name] for name in placeholders]
+            except KeyError:
+                return None
         else:
+            if not isinstance(params, (list, tuple)) or len(params) != num_cols:
+                return None
+            row = list(params)
+        row_kinds = [_insert_value_kind(value) for value in row]
+        if False in row_kinds:
             return None
+        compatible = len(chunk) < max_rows
+        if compatible:
+            for kind, row_kind in zip(kinds, row_kinds):
+                if kind is not None and row_kind is not None and kind != row_kind:
+                    compatible = False
+                    break
+        if not compatible:
+            chunks.append(chunk)
+            chunk = []
+            kinds = [None] * num_cols
+        for i, row_kind in enumerate(row_kinds):
+            if row_kind is not None:
+                kinds[i] = row_kind
+        chunk.append(row)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _multirow_insert(prefix, num_cols, num_rows):
+    """ Builds text of multi-row INSERT statement with positional placeholders """
+    row = u'(' + u', '.join([u'%s'] * num_cols) + u')'
+    return u'{0} {1}'.format(prefix, u', '.join([row] * num_rows))
+
+
+class _StatementCache(object):
+    """ Cache of prepared statement handles of a connection
+
+    Statements are prepared with ``sp_prepare`` on first use and executed
+    with ``sp_execute`` afterwards, so only handle and parameter values are
+    sent.  When cache is full least recently used statement is unprepared.
+    Handles belong to the physical connection, :func:`invalidate` should be
+    called when connection is replaced or reset.
+
+    :param max_size: Maximum number of prepared statements
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._handles = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._handles)
 
+    def invalidate(self):
+        """ Forgets all handles without unpreparing them """
+        self._handles.clear()
 
-_connection_pool = _ConnectionPool()
+    def submit(self, session, operation, params, declaration):
+        """ Sends request which executes prepared statement, preparing it if needed
+
+        :param session: An instance of :class:`pytds.tds._TdsSession`
+        :param operation: SQL statement with bound parameters, see :func:`_bind_operation`
+        :param params: List of parameters as :class:`Column` instances
+        :param declaration: Declaration of parameters
+        """
+        key = (operation, declaration)
+        handle = self._handles.pop(key, None)
+        if handle is None:
+            while len(self._handles) >= self._max_size:
+                _, old_handle = self._handles.popitem(last=False)
+                session.submit_rpc(tds_base.SP_UNPREPARE, [session.make_param('', old_handle)], 0)
+                session.process_simple_request()
+            # options are 0, i.e. no RETURN_METADATA, since result set
+            # description sent in reply to sp_prepare is not used
+            session.submit_rpc(
+                tds_base.SP_PREPARE,
+                [session.make_param('', output(param_type='int')),
+                 session.make_param('', declaration),
+                 session.make_param('', operation),
+                 session.make_param('', 0)],
+                0)
+            session.process_simple_request()
+            handle = session.output_params[0].value
+        # reinsert to make it most recently used
+        self._handles[key] = handle
+        session.submit_rpc(tds_base.SP_EXECUTE, [session.make_param('', handle)] + params, 0)
 
 
 class Connection(object):
@@ -181,6 +837,12 @@ class Connection(object):
         self._tzinfo_factory = None
         self._key = None
         self._pooling = False
+        self._pooled = False
+        self._statement_cache = None
+        self._template_cache = None
+        self._rpc_batch_size = 1
+        self._fast_executemany = False
+        self._bulk_metadata = _BulkMetadataCache(64)
 
     @property
     def as_dict(self):
@@ -274,6 +936,29 @@ class Connection(object):
         """
         return self._conn.mars_enabled
 
+    def template_cache_stats(self):
+        """ Returns statistics of statement template cache
+
+        :returns: Dictionary with ``hits``, ``misses`` and ``size`` keys,
+          or ``None`` if the cache is disabled
+        """
+        cache = self._template_cache
+        if cache is None:
+            return None
+        return {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache)}
+
+    def metadata_cache_stats(self):
+        """ Returns statistics of result set column metadata cache
+
+        :returns: Dictionary with ``hits``, ``misses`` and ``size`` keys,
+          or ``None`` if the cache is disabled
+        """
+        self._assert_open()
+        cache = self._conn.metadata_cache
+        if cache is None:
+            return None
+        return {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache)}
+
     def _connect(self, host, port, instance, timeout):
         login = self._login
 
@@ -329,9 +1014,36 @@ class Connection(object):
             sock.close()
             raise
 
+    def _leave_pool(self, keep):
+        """ Returns connection to the pool or frees its place in the pool
+
+        :param keep: If false connection is closed
+        """
+        if not self._pooled:
+            return
+        self._pooled = False
+        item = None
+        if self._conn is not None:
+            item = (self._conn, self._main_cursor._session if self._main_cursor else None)
+        if keep:
+            connection_pool.release(self._key, item)
+        else:
+            connection_pool.discard(self._key, item)
+
     def _try_open(self, timeout):
+        if self._statement_cache is not None:
+            # handles belong to previous physical connection
+            self._statement_cache.invalidate()
+        if self._template_cache is not None:
+            self._template_cache.invalidate()
+        self._bulk_metadata.invalidate()
         if self._pooling:
-            res = _connection_pool.take(self._key)
+            self._leave_pool(keep=False)
+            pool_timeout = connection_pool.timeout
+            if pool_timeout is None:
+                pool_timeout = self._login.connect_timeout
+            res = connection_pool.acquire(self._key, timeout=pool_timeout)
+            self._pooled = True
             if res is not None:
                 self._conn, sess = res
                 if self._conn.mars_enabled:
@@ -345,15 +1057,21 @@ class Connection(object):
                         sess,
                         self._tzinfo_factory)
                 self._active_cursor = self._main_cursor = cursor
-                cursor.callproc('sp_reset_connection')
+                # connection is reset by the server together with the first request
+                sess.request_reset()
                 return
 
         login = self._login
         host, port, instance = login.servers[0]
-        self._connect(host=host, port=port, instance=instance, timeout=timeout)
+        try:
+            self._connect(host=host, port=port, instance=instance, timeout=timeout)
+        except:
+            self._leave_pool(keep=False)
+            raise
 
     def _open(self):
         import time
+        self._leave_pool(keep=False)
         self._conn = None
         self._dirty = False
         login = self._login
@@ -486,8 +1204,8 @@ class Connection(object):
         this case.
         """
         if self._conn:
-            if self._pooling:
-                _connection_pool.add(self._key, (self._conn, self._main_cursor._session))
+            if self._pooled:
+                self._leave_pool(keep=self._conn.is_connected())
             else:
                 self._conn.close()
             self._active_cursor = None
@@ -506,16 +1224,25 @@ class Connection(object):
             self._active_cursor = cursor
 
 
+# marks end of rows iterator, rows themselves may be any objects
+_no_more_rows = object()
+
+
 class Cursor(six.Iterator):
     """
     This class represents a database cursor, which is used to issue queries
     and fetch results from a database connection.
     """
+    #: Number of rows decoded at once by fetchall and iteration
+    _fetch_batch_size = 1000
+
     def __init__(self, conn, session, tzinfo_factory):
         self._conn = weakref.ref(conn)
         self.arraysize = 1
         self._session = session
         self._tzinfo_factory = tzinfo_factory
+        self._rows = deque()  # raw rows prefetched by iteration
+        self._row_factory = None
 
     def _assert_open(self):
         conn = self._conn
@@ -541,6 +1268,7 @@ class Cursor(six.Iterator):
         return self
 
     def _setup_row_factory(self):
+        self._rows.clear()
         self._row_factory = None
         conn = self._conn()
         if self._session.res_info:
@@ -548,6 +1276,7 @@ class Cursor(six.Iterator):
             self._row_factory = conn._row_strategy(column_names)
 
     def _callproc(self, procname, parameters):
+        self._rows.clear()
         self._ensure_transaction()
         results = list(parameters)
         parameters = self._session._convert_params(parameters)
@@ -673,50 +1402,23 @@ class Cursor(six.Iterator):
         if not conn._autocommit and not conn._conn.tds72_transaction:
             conn._main_cursor._begin_tran(isolation_level=conn._isolation_level)
 
+    def _submit_cached(self, cache, operation, params):
+        operation, named_params, declaration = _bind_operation(
+            self._session, operation, params, self._conn()._template_cache)
+        if named_params:
+            cache.submit(self._session, operation, named_params, declaration)
+        else:
+            self._session.submit_plain_query(operation)
+
     def _execute(self, operation, params):
+        self._rows.clear()
         self._ensure_transaction()
-        operation = six.text_type(operation)
-        if params:
-            named_params = {}
-            if isinstance(params, (list, tuple)):
-                names = []
-                pid = 1
-                for val in params:
-                    if val is None:
-                        names.append('NULL')
-                    else:
-                        name = '@P{0}'.format(pid)
-                        names.append(name)
-                        named_params[name] = val
-                        pid += 1
-                if len(names) == 1:
-                    operation = operation % names[0]
-                else:
-                    operation = operation % tuple(names)
-            elif isinstance(params, dict):
-                # prepend names with @
-                rename = {}
-                for name, value in params.items():
-                    if value is None:
-                        rename[name] = 'NULL'
-                    else:
-                        mssql_name = '@{0}'.format(name)
-                        rename[name] = mssql_name
-                        named_params[mssql_name] = value
-                operation = operation % rename
-            if named_params:
-                named_params = self._session._convert_params(named_params)
-                param_definition = u','.join(
-                    u'{0} {1}'.format(p.column_name, p.type.get_declaration())
-                    for p in named_params)
-                self._exec_with_retry(lambda: self._session.submit_rpc(
-                    tds_base.SP_EXECUTESQL,
-                    [self._session.make_param('', operation), self._session.make_param('', param_definition)] + named_params,
-                    0))
-            else:
-                self._exec_with_retry(lambda: self._session.submit_plain_query(operation))
+        conn = self._conn()
+        cache = conn._statement_cache
+        if cache is None:
+            self._exec_with_retry(lambda: _submit_operation(self._session, operation, params, conn._template_cache))
         else:
-            self._exec_with_retry(lambda: self._session.submit_plain_query(operation))
+            self._exec_with_retry(lambda: self._submit_cached(cache, operation, params))
         self._session.find_result_or_done()
         self._setup_row_factory()
 
@@ -750,6 +1452,27 @@ class Cursor(six.Iterator):
         conn._dirty = False
 
     def executemany(self, operation, params_seq):
+        """ Execute the query once for every set of parameters
+
+        If connection was opened with ``rpc_batch_size`` greater than 1,
+        parameter sets are sent in batches of that size, one round trip per batch.
+
+        :param operation: SQL statement
+        :type operation: str
+        :param params_seq: Sequence of sequences or dicts of parameters
+        """
+        conn = self._assert_open()
+        if conn._fast_executemany:
+            parsed = _parse_insert_values(operation)
+            if parsed is not None:
+                params_seq = list(params_seq)
+                chunks = _insert_chunks(parsed[1], params_seq)
+                if chunks is not None:
+                    self._executemany_inserts(parsed[0], len(parsed[1]), chunks)
+                    return
+        if conn._rpc_batch_size > 1 and conn._statement_cache is None:
+            self._executemany_batched(conn, operation, params_seq)
+            return
         counts = []
         for params in params_seq:
             self.execute(operation, params)
@@ -758,6 +1481,32 @@ class Cursor(six.Iterator):
         if counts:
             self._session.rows_affected = sum(counts)
 
+    def _executemany_inserts(self, prefix, num_cols, chunks):
+        counts = []
+        for chunk in chunks:
+            self.execute(_multirow_insert(prefix, num_cols, len(chunk)), [value for row in chunk for value in row])
+            if self._session.rows_affected != -1:
+                counts.append(self._session.rows_affected)
+        if counts:
+            self._session.rows_affected = sum(counts)
+
+    def _executemany_batched(self, conn, operation, params_seq):
+        conn._try_activate_cursor(self)
+        counts = []
+        params_iter = iter(params_seq)
+        while True:
+            batch = list(itertools.islice(params_iter, conn._rpc_batch_size))
+            if not batch:
+                break
+            self._rows.clear()
+            self._ensure_transaction()
+            self._exec_with_retry(
+                lambda: _submit_operation_batch(self._session, operation, batch, conn._template_cache))
+            counts.extend(count for count in self._session.process_rpc_batch() if count != -1)
+        if counts:
+            self._session.rows_affected = sum(counts)
+        self._setup_row_factory()
+
     def execute_scalar(self, query_string, params=None):
         """
         This method sends a query to the MS SQL Server to which this object
@@ -817,6 +1566,11 @@ class Cursor(six.Iterator):
             return None
 
     def set_stream(self, column_idx, stream):
+        """ Streams value of given column into provided stream instead of returning it
+
+        Since all rows would be written into the same stream, rows should be
+        fetched one by one using :func:`fetchone`.
+        """
         if len(self._session.res_info.columns) <= column_idx or column_idx < 0:
             raise ValueError('Invalid value for column_idx')
         self._session.res_info.columns[column_idx].serializer.set_chunk_handler(pytds.tds_types._StreamChunkedHandler(stream))
@@ -849,10 +1603,21 @@ class Cursor(six.Iterator):
     def fetchone(self):
         """ Fetches next row, or ``None`` if there are no more rows
         """
+        if self._rows:
+            return self._row_factory(self._rows.popleft())
         row = self._session.fetchone()
         if row:
             return self._row_factory(row)
 
+    def _fetch_rows(self, size):
+        """ Fetches up to size raw rows, taking prefetched rows first """
+        rows = []
+        while self._rows and len(rows) < size:
+            rows.append(self._rows.popleft())
+        if len(rows) < size:
+            rows.extend(self._session.fetch_rows(size - len(rows)))
+        return rows
+
     def fetchmany(self, size=None):
         """ Fetches next multiple rows
 
@@ -861,25 +1626,68 @@ class Cursor(six.Iterator):
         """
         if size is None:
             size = self.arraysize
-
-        rows = []
-        for _ in xrange(size):
-            row = self.fetchone()
-            if not row:
-                break
-            rows.append(row)
-        return rows
+        rows = self._fetch_rows(size)
+        factory = self._row_factory
+        return [factory(row) for row in rows]
 
     def fetchall(self):
         """ Fetches all remaining rows
         """
-        return list(row for row in self)
+        rows = []
+        while True:
+            batch = self._fetch_rows(self._fetch_batch_size)
+            factory = self._row_factory
+            rows.extend(factory(row) for row in batch)
+            if len(batch) < self._fetch_batch_size:
+                return rows
+
+    def fetch_columns(self, max_rows=None):
+        """ Fetches remaining rows in columnar form
+
+        Values are decoded straight into one container per column: values of
+        integer columns are stored in ``array.array('q')``, of floating point
+        columns in ``array.array('d')``, of bit columns in ``array.array('b')``,
+        values of other columns are stored in lists.
+        NULL values are stored as zeros (``None`` in lists) and are marked with 0
+        in a separate validity ``bytearray``.
+
+        :param max_rows: Maximum number of rows to fetch, by default fetches all remaining rows
+        :returns: List of :class:`ColumnData` named tuples ``(name, values, validity)``, one per column
+        """
+        pending = []
+        while self._rows and (max_rows is None or len(pending) < max_rows):
+            pending.append(self._rows.popleft())
+        return self._session.fetch_columns(max_rows, pending_rows=pending)
+
+    def fetch_numpy(self, batch_rows=65536, decimal_as_float=True):
+        """ Fetches remaining rows as NumPy record batches
+
+        Requires numpy.
+        Each batch is a :class:`numpy.ma.MaskedArray` with structured dtype
+        which has one field per column, NULL values are masked.
+        Integer, floating point and bit columns are stored as corresponding
+        NumPy types and are filled from raw column bytes,
+        DATETIME2 columns are stored as ``datetime64[us]``,
+        DECIMAL/NUMERIC columns are stored as ``float64`` or as objects if
+        `decimal_as_float` is False, other columns are stored as objects.
+
+        :param batch_rows: Maximum number of rows in a batch
+        :param decimal_as_float: Convert DECIMAL/NUMERIC columns to ``float64``
+        :returns: Generator of record batches
+        """
+        from . import tds_numpy  # optional dependency
+        pending = list(self._rows)
+        self._rows.clear()
+        return tds_numpy.fetch_batches(self._session, batch_rows,
+                                       decimal_as_float=decimal_as_float,
+                                       pending_rows=pending)
 
     def __next__(self):
-        row = self.fetchone()
-        if row is None:
-            raise StopIteration
-        return row
+        if not self._rows:
+            self._rows.extend(self._session.fetch_rows(self._fetch_batch_size))
+            if not self._rows:
+                raise StopIteration
+        return self._row_factory(self._rows.popleft())
 
     @staticmethod
     def setinputsizes(sizes=None):
@@ -898,7 +1706,8 @@ class Cursor(six.Iterator):
     def copy_to(self, file=None, table_or_view=None, sep='\t', columns=None,
                 check_constraints=False, fire_triggers=False, keep_nulls=False,
                 kb_per_batch=None, rows_per_batch=None, order=None, tablock=False,
-                schema=None, null_string=None, data=None):
+                schema=None, null_string=None, data=None, columns_data=None,
+                batch_rows=None, batch_kb=None, start_batch=0, progress=None, refresh_metadata=False):
         """ *Experimental*. Efficiently load data to database from file using ``BULK INSERT`` operation
 
         :param file: Source file-like object, should be in csv format. Specify
@@ -913,8 +1722,13 @@ class Cursor(six.Iterator):
         :keyword columns: List of Column objects or column names in target
           table to insert to. SQL Server will do some conversions, so these
           may not have to match the actual table definition exactly.
-          If not provided will insert into all columns assuming nvarchar(4000)
-          NULL for all columns.
+          If not provided will insert into all columns, when rows are given
+          with data types of columns are discovered from the table, when rows are
+          given with file nvarchar(4000) NULL is assumed for all columns.
+          Values of text, ntext and image columns are sent as varchar(max),
+          nvarchar(max) and varbinary(max).
+          Discovered columns are cached by the connection, cached columns of
+          a table are dropped if bulk load into it fails.
           If only the column name is provided, the type is assumed to be
           nvarchar(4000) NULL.
           If rows are given with file, you cannot specify non-string data
@@ -945,10 +1759,36 @@ class Cursor(six.Iterator):
           reading the CSV file. Has no meaning if using data instead of file.
         :keyword data: The data to insert as an iterable of rows, which are
           iterables of values. Specify either this or file, not both.
+        :keyword columns_data: The data to insert as a dictionary of column names to
+          column values, which are sequences like :class:`array.array`, NumPy arrays
+          or lists, or tuples of values and validity having 0 for NULL values and 1
+          otherwise, e.g. :class:`pytds.tds.ColumnData`.  Values of integer, float and bit columns
+          given as buffers are encoded in bulk, see :func:`pytds.tds._TdsSession.submit_bulk_columns`.
+          If columns are not specified only given columns of the table are inserted.
+          Specify this instead of file or data.
+        :keyword batch_rows: Number of rows after which current ``INSERT BULK`` operation is finished
+          and committed, and remaining rows are sent by a new one, unlike ``rows_per_batch`` this
+          actually splits the load.  Note that transaction of the connection is committed after every batch.
+        :type batch_rows: int
+        :keyword batch_kb: Same as ``batch_rows``, but limits size of ``INSERT BULK`` data stream in kilobytes,
+          can't be used with columns_data.
+        :type batch_kb: int
+        :keyword start_batch: Number of batches of ``batch_rows`` rows to skip, it allows to resume
+          interrupted load from the first batch which was not committed.  Can't be used with ``batch_kb``,
+          since batches limited by size have varying number of rows.
+        :type start_batch: int
+        :keyword progress: Function which is called after every committed batch with total
+          number of rows and bytes sent so far and elapsed time in seconds
+        :keyword refresh_metadata: Discover columns of the table again instead of using ones
+          cached by the connection, use it after table was altered
+        :type refresh_metadata: bool
         """
         conn = self._conn()
         rows = None
-        if data is None:
+        if columns_data is not None:
+            if file is not None or data is not None:
+                raise ValueError('Specify either columns_data or file or data, not several of them')
+        elif data is None:
             import csv
             reader = csv.reader(file, delimiter=sep)
 
@@ -974,33 +1814,148 @@ class Cursor(six.Iterator):
                 else:
                     metadata.append(Column(name=column, type=NVarCharType(size=4000), flags=Column.fNullable))
         else:
-            self.execute('select top 1 * from {} where 1<>1'.format(obj_name))
-            metadata = [Column(name=col[0], type=NVarCharType(size=4000), flags=Column.fNullable if col[6] else 0)
-                        for col in self.description]
-        col_defs = ','.join('{0} {1}'.format(tds_base.tds_quote_id(col.column_name), col.type.get_declaration())
-                            for col in metadata)
-        with_opts = []
-        if check_constraints:
-            with_opts.append('CHECK_CONSTRAINTS')
-        if fire_triggers:
-            with_opts.append('FIRE_TRIGGERS')
-        if keep_nulls:
-            with_opts.append('KEEP_NULLS')
-        if kb_per_batch:
-            with_opts.append('KILOBYTES_PER_BATCH = {0}'.format(kb_per_batch))
-        if rows_per_batch:
-            with_opts.append('ROWS_PER_BATCH = {0}'.format(rows_per_batch))
-        if order:
-            with_opts.append('ORDER({0})'.format(','.join(order)))
-        if tablock:
-            with_opts.append('TABLOCK')
-        with_part = ''
-        if with_opts:
-            with_part = 'WITH ({0})'.format(','.join(with_opts))
-        operation = 'INSERT BULK {0}({1}) {2}'.format(obj_name, col_defs, with_part)
-        self.execute(operation)
-        self._session.submit_bulk(metadata, rows)
-        self._session.process_simple_request()
+            database = conn._conn.env.database
+            metadata = self._get_bulk_metadata(obj_name, typed=file is None, refresh=refresh_metadata)
+        try:
+            if columns_data is not None:
+                if not columns:
+                    names = set(columns_data)
+                    metadata = [col for col in metadata if col.column_name in names]
+                missing = set(columns_data) - set(col.column_name for col in metadata)
+                if missing:
+                    raise ValueError('Unknown columns: {0}'.format(', '.join(sorted(missing))))
+                columns_values = [columns_data.get(col.column_name) for col in metadata]
+                if any(values is None for values in columns_values):
+                    raise ValueError('No data given for some of the columns')
+            col_defs = ','.join('{0} {1}'.format(tds_base.tds_quote_id(col.column_name), col.type.get_declaration())
+                                for col in metadata)
+            with_opts = []
+            if check_constraints:
+                with_opts.append('CHECK_CONSTRAINTS')
+            if fire_triggers:
+                with_opts.append('FIRE_TRIGGERS')
+            if keep_nulls:
+                with_opts.append('KEEP_NULLS')
+            if kb_per_batch:
+                with_opts.append('KILOBYTES_PER_BATCH = {0}'.format(kb_per_batch))
+            if rows_per_batch:
+                with_opts.append('ROWS_PER_BATCH = {0}'.format(rows_per_batch))
+            if order:
+                with_opts.append('ORDER({0})'.format(','.join(order)))
+            if tablock:
+                with_opts.append('TABLOCK')
+            with_part = ''
+            if with_opts:
+                with_part = 'WITH ({0})'.format(','.join(with_opts))
+            operation = 'INSERT BULK {0}({1}) {2}'.format(obj_name, col_defs, with_part)
+            if batch_rows is None and batch_kb is None:
+                if start_batch:
+                    raise ValueError('start_batch requires batch_rows')
+                start = time.time()
+                self.execute(operation)
+                if columns_data is not None:
+                    count = self._session.submit_bulk_columns(metadata, columns_values)
+                else:
+                    count = self._session.submit_bulk(metadata, rows)
+                self._session.process_simple_request()
+                if progress is not None:
+                    progress(count, self._session._writer.stream_bytes, time.time() - start)
+            elif columns_data is not None:
+                self._copy_column_batches(operation, metadata, columns_values, batch_rows, batch_kb, start_batch,
+                                          progress)
+            else:
+                self._copy_batches(operation, metadata, rows, batch_rows, batch_kb, start_batch, progress)
+        except Exception:
+            if not columns:
+                # discovered columns may be stale
+                conn._bulk_metadata.discard(database, obj_name)
+            raise
+
+    def _copy_batches(self, operation, metadata, rows, batch_rows, batch_kb, start_batch, progress):
+        if start_batch and not batch_rows:
+            raise ValueError('start_batch requires batch_rows')
+        if start_batch and batch_kb:
+            raise ValueError("start_batch can't be used with batch_kb")
+        conn = self._conn()
+        max_bytes = batch_kb * 1024 if batch_kb else None
+        start = time.time()
+        total_rows = 0
+        total_bytes = 0
+        rows = iter(rows)
+        if start_batch:
+            # skip rows which were loaded already
+            collections.deque(itertools.islice(rows, start_batch * batch_rows), maxlen=0)
+        while True:
+            first = next(rows, _no_more_rows)
+            if first is _no_more_rows:
+                break
+            self.execute(operation)
+            total_rows += self._session.submit_bulk(metadata, itertools.chain([first], rows),
+                                                    max_rows=batch_rows, max_bytes=max_bytes)
+            total_bytes += self._session._writer.stream_bytes
+            self._session.process_simple_request()
+            conn.commit()
+            if progress is not None:
+                progress(total_rows, total_bytes, time.time() - start)
+
+    def _copy_column_batches(self, operation, metadata, columns, batch_rows, batch_kb, start_batch, progress):
+        if batch_kb is not None or not batch_rows:
+            raise ValueError('Only batch_rows can be used to split columns_data')
+        conn = self._conn()
+        start = time.time()
+        total_rows = 0
+        total_bytes = 0
+        num_rows = len(_split_column(columns[0])[0]) if columns else 0
+        for begin in range(start_batch * batch_rows, num_rows, batch_rows):
+            end = min(begin + batch_rows, num_rows)
+            self.execute(operation)
+            self._session.submit_bulk_columns(metadata, _slice_bulk_columns(columns, begin, end))
+            total_rows += end - begin
+            total_bytes += self._session._writer.stream_bytes
+            self._session.process_simple_request()
+            conn.commit()
+            if progress is not None:
+                progress(total_rows, total_bytes, time.time() - start)
+
+    def _get_bulk_metadata(self, obj_name, typed, refresh=False):
+        """ Returns list of columns of a table for ``INSERT BULK``
+
+        :param obj_name: Quoted name of table or view
+        :param typed: If true columns have types of table's columns, otherwise nvarchar(4000)
+        :param refresh: If true columns cached by the connection are not used
+        """
+        conn = self._conn()
+        key = (conn._conn.env.database, obj_name, typed)
+        if not refresh:
+            metadata = conn._bulk_metadata.get(key)
+            if metadata is not None:
+                return metadata
+        self.execute('select top 1 * from {} where 1<>1'.format(obj_name))
+        metadata = []
+        for col in self._session.res_info.columns:
+            flags = col.flags & Column.fNullable
+            sql_type = sql_type_by_serializer(col.serializer) if typed else None
+            if sql_type is None:
+                metadata.append(Column(name=col.column_name, type=NVarCharType(size=4000), flags=flags))
+            elif isinstance(sql_type, (TextType, NTextType, ImageType)):
+                # serializers of legacy LOB types describe result columns, not bulk load
+                # columns, so values are sent as max types which server converts
+                if isinstance(sql_type, TextType):
+                    column = Column(name=col.column_name, type=VarCharMaxType(), flags=flags)
+                    column.serializer = VarCharMaxSerializer(collation=col.serializer._collation)
+                elif isinstance(sql_type, NTextType):
+                    column = Column(name=col.column_name, type=NVarCharMaxType(), flags=flags)
+                    column.serializer = NVarCharMaxSerializer(collation=col.serializer._collation)
+                else:
+                    column = Column(name=col.column_name, type=VarBinaryMaxType(), flags=flags)
+                metadata.append(column)
+            else:
+                column = Column(name=col.column_name, type=sql_type, flags=flags)
+                # serializer received from the server carries collation of the column
+                column.serializer = col.serializer
+                metadata.append(column)
+        conn._bulk_metadata.put(key, metadata)
+        return metadata
 
 
 class _MarsCursor(Cursor):
@@ -1139,72 +2094,26 @@ def _parse_connection_string(connstr):
     return res
 
 
-def connect(dsn=None, database=None, user=None, password=None, timeout=None,
-            login_timeout=15, as_dict=None,
-            appname=None, port=None, tds_version=tds_base.TDS74,
-            autocommit=False,
-            blocksize=4096, use_mars=False, auth=None, readonly=False,
-            load_balancer=None, use_tz=None, bytes_to_unicode=True,
-            row_strategy=None, failover_partner=None, server=None,
-            cafile=None, validate_host=True, enc_login_only=False,
-            disable_connect_retry=False,
-            pooling=False,
-            ):
-    """
-    Opens connection to the database
-
-    :keyword dsn: SQL server host and instance: <host>[\<instance>]
-    :type dsn: string
-    :keyword failover_partner: secondary database host, used if primary is not accessible
-    :type failover_partner: string
-    :keyword database: the database to initially connect to
-    :type database: string
-    :keyword user: database user to connect as
-    :type user: string
-    :keyword password: user's password
-    :type password: string
-    :keyword timeout: query timeout in seconds, default 0 (no timeout)
-    :type timeout: int
-    :keyword login_timeout: timeout for connection and login in seconds, default 15
-    :type login_timeout: int
-    :keyword as_dict: whether rows should be returned as dictionaries instead of tuples.
-    :type as_dict: boolean
-    :keyword appname: Set the application name to use for the connection
-    :type appname: string
-    :keyword port: the TCP port to use to connect to the server
-    :type port: int
-    :keyword tds_version: Maximum TDS version to use, should only be used for testing
-    :type tds_version: int
-    :keyword autocommit: Enable or disable database level autocommit
-    :type autocommit: bool
-    :keyword blocksize: Size of block for the TDS protocol, usually should not be used
-    :type blocksize: int
-    :keyword use_mars: Enable or disable MARS
-    :type use_mars: bool
-    :keyword auth: An instance of authentication method class, e.g. Ntlm or Sspi
-    :keyword readonly: Allows to enable read-only mode for connection, only supported by MSSQL 2012,
-      earlier versions will ignore this parameter
-    :type readonly: bool
-    :keyword load_balancer: An instance of load balancer class to use, if not provided will not use load balancer
-    :keyword use_tz: Provides timezone for naive database times, if not provided date and time will be returned
-      in naive format
-    :keyword bytes_to_unicode: If true single byte database strings will be converted to unicode Python strings,
-      otherwise will return strings as ``bytes`` without conversion.
-    :type bytes_to_unicode: bool
-    :keyword row_strategy: strategy used to create rows, determines type of returned rows, can be custom or one of:
-      :func:`tuple_row_strategy`, :func:`list_row_strategy`, :func:`dict_row_strategy`,
-      :func:`namedtuple_row_strategy`, :func:`recordtype_row_strategy`
-    :type row_strategy: function of list of column names returning row factory
-    :keyword cafile: Name of the file containing trusted CAs in PEM format, if provided will enable TLS
-    :type cafile: str
-    :keyword validate_host: Host name validation during TLS connection is enabled by default, if you disable it you
-      will be vulnerable to MitM type of attack.
-    :type validate_host: bool
-    :keyword enc_login_only: Allows you to scope TLS encryption only to an authentication portion.  This means that
-      anyone who can observe traffic on your network will be able to see all your SQL requests and potentially modify
-      them.
-    :type enc_login_only: bool
-    :returns: An instance of :class:`Connection`
+def _prepare_connection(conn, dsn=None, database=None, user=None, password=None, timeout=None,
+                        login_timeout=15, as_dict=None,
+                        appname=None, port=None, tds_version=tds_base.TDS74,
+                        autocommit=False,
+                        blocksize=4096, use_mars=False, auth=None, readonly=False,
+                        load_balancer=None, use_tz=None, bytes_to_unicode=True,
+                        row_strategy=None, failover_partner=None, server=None,
+                        cafile=None, validate_host=True, enc_login_only=False,
+                        disable_connect_retry=False,
+                        pooling=False,
+                        contiguous_reads=False,
+                        read_ahead=0,
+                        scatter_writes=False,
+                        statement_cache_size=0,
+                        template_cache_size=256,
+                        metadata_cache_size=64,
+                        rpc_batch_size=1,
+                        fast_executemany=False,
+                        ):
+    """ Configures not yet opened connection object using arguments of :func:`connect`
     """
     login = _TdsLogin()
     login.client_host_name = socket.gethostname()[:128]
@@ -1260,6 +2169,10 @@ def connect(dsn=None, database=None, user=None, password=None, timeout=None,
     login.readonly = readonly
     login.load_balancer = load_balancer
     login.bytes_to_unicode = bytes_to_unicode
+    login.contiguous_reads = contiguous_reads
+    login.read_ahead = read_ahead
+    login.scatter_writes = scatter_writes
+    login.metadata_cache_size = metadata_cache_size
 
     if server and dsn:
         raise ValueError("Both server and dsn shouldn't be specified")
@@ -1302,14 +2215,21 @@ def connect(dsn=None, database=None, user=None, password=None, timeout=None,
         login.auth,
         login.client_tz,
         autocommit,
+        login.contiguous_reads,
+        login.read_ahead,
+        login.scatter_writes,
+        login.metadata_cache_size,
     )
 
-    conn = Connection()
     conn._use_tz = use_tz
     conn._autocommit = autocommit
     conn._login = login
     conn._pooling = pooling
     conn._key = key
+    conn._statement_cache = _StatementCache(statement_cache_size) if statement_cache_size > 0 else None
+    conn._template_cache = _TemplateCache(template_cache_size) if template_cache_size > 0 else None
+    conn._rpc_batch_size = rpc_batch_size
+    conn._fast_executemany = fast_executemany
 
     assert row_strategy is None or as_dict is None,\
         'Both row_startegy and as_dict were specified, you should use either one or another'
@@ -1324,8 +2244,137 @@ def connect(dsn=None, database=None, user=None, password=None, timeout=None,
     conn._dirty = False
     from .tz import FixedOffsetTimezone
     conn._tzinfo_factory = None if use_tz is None else FixedOffsetTimezone
+
+
+def connect(dsn=None, database=None, user=None, password=None, timeout=None,
+            login_timeout=15, as_dict=None,
+            appname=None, port=None, tds_version=tds_base.TDS74,
+            autocommit=False,
+            blocksize=4096, use_mars=False, auth=None, readonly=False,
+            load_balancer=None, use_tz=None, bytes_to_unicode=True,
+            row_strategy=None, failover_partner=None, server=None,
+            cafile=None, validate_host=True, enc_login_only=False,
+            disable_connect_retry=False,
+            pooling=False,
+            contiguous_reads=False,
+            read_ahead=0,
+            scatter_writes=False,
+            statement_cache_size=0,
+            template_cache_size=256,
+            metadata_cache_size=64,
+            rpc_batch_size=1,
+            fast_executemany=False,
+            ):
+    """
+    Opens connection to the database
+
+    :keyword dsn: SQL server host and instance: <host>[\<instance>]
+    :type dsn: string
+    :keyword failover_partner: secondary database host, used if primary is not accessible
+    :type failover_partner: string
+    :keyword database: the database to initially connect to
+    :type database: string
+    :keyword user: database user to connect as
+    :type user: string
+    :keyword password: user's password
+    :type password: string
+    :keyword timeout: query timeout in seconds, default 0 (no timeout)
+    :type timeout: int
+    :keyword login_timeout: timeout for connection and login in seconds, default 15
+    :type login_timeout: int
+    :keyword as_dict: whether rows should be returned as dictionaries instead of tuples.
+    :type as_dict: boolean
+    :keyword appname: Set the application name to use for the connection
+    :type appname: string
+    :keyword port: the TCP port to use to connect to the server
+    :type port: int
+    :keyword tds_version: Maximum TDS version to use, should only be used for testing
+    :type tds_version: int
+    :keyword autocommit: Enable or disable database level autocommit
+    :type autocommit: bool
+    :keyword blocksize: Size of block for the TDS protocol, usually should not be used
+    :type blocksize: int
+    :keyword use_mars: Enable or disable MARS
+    :type use_mars: bool
+    :keyword auth: An instance of authentication method class, e.g. Ntlm or Sspi
+    :keyword readonly: Allows to enable read-only mode for connection, only supported by MSSQL 2012,
+      earlier versions will ignore this parameter
+    :type readonly: bool
+    :keyword load_balancer: An instance of load balancer class to use, if not provided will not use load balancer
+    :keyword use_tz: Provides timezone for naive database times, if not provided date and time will be returned
+      in naive format
+    :keyword bytes_to_unicode: If true single byte database strings will be converted to unicode Python strings,
+      otherwise will return strings as ``bytes`` without conversion.
+    :type bytes_to_unicode: bool
+    :keyword row_strategy: strategy used to create rows, determines type of returned rows, can be custom or one of:
+      :func:`tuple_row_strategy`, :func:`list_row_strategy`, :func:`dict_row_strategy`,
+      :func:`namedtuple_row_strategy`, :func:`recordtype_row_strategy`
+    :type row_strategy: function of list of column names returning row factory
+    :keyword cafile: Name of the file containing trusted CAs in PEM format, if provided will enable TLS
+    :type cafile: str
+    :keyword validate_host: Host name validation during TLS connection is enabled by default, if you disable it you
+      will be vulnerable to MitM type of attack.
+    :type validate_host: bool
+    :keyword enc_login_only: Allows you to scope TLS encryption only to an authentication portion.  This means that
+      anyone who can observe traffic on your network will be able to see all your SQL requests and potentially modify
+      them.
+    :type enc_login_only: bool
+    :keyword pooling: Take connection from ``pytds.connection_pool`` and return it there when it is closed,
+      see :class:`ConnectionPool`
+    :type pooling: bool
+    :keyword contiguous_reads: Keep payloads of consecutive TDS packets in one contiguous receive buffer, so that
+      values spanning packet boundaries are decoded in place instead of being joined from chunks.
+    :type contiguous_reads: bool
+    :keyword read_ahead: Size in bytes of read-ahead buffer, e.g. 262144, when set connection reads as much data as
+      is available from the socket into this buffer and splits it into TDS packets in memory, this reduces number of
+      system calls for large responses.  Default is 0 which disables read-ahead.
+    :type read_ahead: int
+    :keyword scatter_writes: Send large parameter and bulk payloads with ``socket.sendmsg`` straight from caller's
+      buffers, several packets per system call, instead of copying them into the packet buffer.  Only has effect
+      for plain TCP connections, encrypted and MARS connections use regular writes.
+    :type scatter_writes: bool
+    :keyword statement_cache_size: Number of parameterized statements which are prepared with ``sp_prepare`` and
+      then executed by handle with ``sp_execute``, least recently used statements are unprepared when the cache
+      is full.  Default is 0 which disables the cache, statements are sent with ``sp_executesql``.
+    :type statement_cache_size: int
+    :keyword template_cache_size: Number of parameterized statements for which formatted SQL, parameters
+      declaration and parameter serializers are cached, keyed by statement and types of parameter values.
+      Default is 256, 0 disables the cache.
+    :type template_cache_size: int
+    :keyword metadata_cache_size: Number of result set column metadata (COLMETADATA) streams which are remembered
+      per connection, when server sends metadata byte for byte equal to a remembered one, e.g. when same query is
+      executed repeatedly, its parsed columns and row decoder are reused instead of being parsed again.
+      Default is 64, 0 disables the cache.
+    :type metadata_cache_size: int
+    :keyword rpc_batch_size: Number of parameter sets which :func:`Cursor.executemany` sends to the server in one
+      request as a batch of RPC calls, this saves a network round trip per parameter set.  Within a batch server
+      executes remaining parameter sets even if one of them fails, error of first failure is raised after whole
+      batch is processed.  Default is 1 which executes parameter sets one by one.  Batching is not used when
+      ``statement_cache_size`` is set.
+    :type rpc_batch_size: int
+    :keyword fast_executemany: When enabled :func:`Cursor.executemany` rewrites simple single row
+      ``INSERT ... VALUES (%s, ...)`` statements, where every value is a parameter placeholder, into multi-row
+      ``INSERT ... VALUES`` statements, each inserting up to 1000 rows within the limit of 2100 parameters.
+      Other statements, and parameters which can't be inserted this way, are executed row by row.  Note that
+      triggers fire once per inserted chunk rather than once per row.  Default is False.
+    :type fast_executemany: bool
+    :returns: An instance of :class:`Connection`
+    """
+    conn = Connection()
+    _prepare_connection(conn, dsn=dsn, database=database, user=user, password=password, timeout=timeout,
+                        login_timeout=login_timeout, as_dict=as_dict, appname=appname, port=port,
+                        tds_version=tds_version, autocommit=autocommit, blocksize=blocksize, use_mars=use_mars,
+                        auth=auth, readonly=readonly, load_balancer=load_balancer, use_tz=use_tz,
+                        bytes_to_unicode=bytes_to_unicode, row_strategy=row_strategy,
+                        failover_partner=failover_partner, server=server, cafile=cafile,
+                        validate_host=validate_host, enc_login_only=enc_login_only,
+                        disable_connect_retry=disable_connect_retry, pooling=pooling,
+                        contiguous_reads=contiguous_reads, read_ahead=read_ahead, scatter_writes=scatter_writes,
+                        statement_cache_size=statement_cache_size, template_cache_size=template_cache_size,
+                        metadata_cache_size=metadata_cache_size,
+                        rpc_batch_size=rpc_batch_size, fast_executemany=fast_executemany)
     if disable_connect_retry:
-        conn._try_open(timeout=login.connect_timeout)
+        conn._try_open(timeout=conn._login.connect_timeout)
     else:
         conn._open()
     return conn
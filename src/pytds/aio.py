@@ -0,0 +1,928 @@
+"""
+Asynchronous connection and cursor for asyncio
+
+Requires Python 3.5 or newer.
+
+This is a driver over I/O free :class:`pytds.protocol.ProtocolSession`:
+requests built by the session are written into asyncio stream, received
+bytes are fed into the session and parsing is repeated when session
+needs more data.
+
+Example::
+
+    conn = await pytds.aio.connect('server', user='user', password='password')
+    async with conn:
+        async with conn.cursor() as cur:
+            await cur.execute('select * from table')
+            async for row in cur:
+                print(row)
+"""
+import asyncio
+import collections
+import functools
+import logging
+import socket
+import time
+
+import pytds
+from . import tds
+from . import tds_base
+from . import tds_types
+from . import tls
+from .protocol import NeedData, PacketBuffer, ProtocolSession
+from .tds_base import (
+    Error, InterfaceError, LoginError, OperationalError, NotSupportedError,
+    ClosedConnectionError, PreLoginEnc,
+)
+
+logger = logging.getLogger(__name__)
+
+# size of chunks read from the stream
+_BUFSIZE = 65536
+
+
+class _StreamTransport(object):
+    """ Moves data between asyncio stream and :class:`pytds.protocol.PacketBuffer`
+
+    After TLS handshake data is encrypted and decrypted with pyOpenSSL
+    connection working over memory BIO.
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self.buffer = PacketBuffer()
+        self._tls = None
+
+    def is_connected(self):
+        return self.buffer.is_connected()
+
+    def close(self):
+        self.buffer.close()
+        self._writer.close()
+
+    async def flush(self):
+        """ Sends data written into the buffer """
+        data = self.buffer.data_to_send()
+        if not data:
+            return
+        if self._tls is not None:
+            data = self._encrypt(data)
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def receive(self):
+        """ Receives next chunk of data into the buffer, can be cancelled """
+        data = await self._reader.read(_BUFSIZE)
+        if not data:
+            self.buffer.close()
+            raise ClosedConnectionError()
+        if self._tls is not None:
+            data = self._decrypt(data)
+        self.buffer.feed(data)
+
+    def _encrypt(self, data):
+        import OpenSSL.SSL
+        self._tls.sendall(data)
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._tls.bio_read(tls.BUFSIZE))
+            except OpenSSL.SSL.WantReadError:
+                return b''.join(chunks)
+
+    def _decrypt(self, data):
+        import OpenSSL.SSL
+        self._tls.bio_write(data)
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._tls.recv(tls.BUFSIZE))
+            except (OpenSSL.SSL.WantReadError, OpenSSL.SSL.ZeroReturnError):
+                return b''.join(chunks)
+
+    async def establish_tls(self, session, login):
+        """ Performs TLS handshake wrapped into PRELOGIN packets and switches
+        transport to encrypted mode
+        """
+        import OpenSSL.SSL
+        w = session._writer
+        r = session._reader
+        bhost = login.server_name.encode('ascii')
+        conn = OpenSSL.SSL.Connection(login.tls_ctx)
+        conn.set_tlsext_host_name(bhost)
+        # change connection to client mode
+        conn.set_connect_state()
+        logger.info('doing TLS handshake')
+        while True:
+            try:
+                conn.do_handshake()
+            except OpenSSL.SSL.WantReadError:
+                req = conn.bio_read(tls.BUFSIZE)
+                w.begin_packet(tds_base.PacketType.PRELOGIN)
+                w.write(req)
+                w.flush()
+                await self.flush()
+                while not self.buffer.has_packet():
+                    await self.receive()
+                conn.bio_write(r.read_whole_packet())
+            else:
+                break
+        logger.info('TLS handshake is complete')
+        if login.validate_host:
+            if not tls.validate_host(cert=conn.get_peer_certificate(), name=bhost):
+                raise Error("Certificate does not match host name '{}'".format(login.server_name))
+        self._tls = conn
+
+    def revert_to_clear(self):
+        """ Switches transport back to non-encrypted mode,
+        used when only login packet should be encrypted
+        """
+        self._tls.shutdown()
+        self._tls = None
+
+
+async def _run(session, fun, *args, timeout=None):
+    """ Calls processing function of the session, receiving more data and
+    calling it again while it lacks data
+
+    :param session: An instance of :class:`pytds.protocol.ProtocolSession`
+    :param fun: Processing function, see :func:`pytds.protocol.ProtocolSession.run`
+    :param timeout: Timeout for receiving each chunk of data in seconds
+    :returns: Result of the function
+    """
+    transport = session.conn.sock
+    while True:
+        try:
+            return session.run(fun, *args)
+        except NeedData:
+            pass
+        # function could have written a response, e.g. during authentication
+        await transport.flush()
+        try:
+            await asyncio.wait_for(transport.receive(), timeout)
+        except asyncio.TimeoutError:
+            if session.state == tds_base.TDS_READING:
+                session.set_state(tds_base.TDS_PENDING)
+            if not session.in_cancel:
+                session.put_cancel()
+                await transport.flush()
+            raise tds_base.TimeoutError('Timeout')
+
+
+async def _login(tds_sock, login, transport, tzinfo_factory):
+    """ Asynchronous version of :func:`pytds.tds._TdsSocket.login` """
+    tds_sock._login = login
+    tds_sock.bufsize = login.blocksize
+    tds_sock.query_timeout = login.query_timeout
+    tds_sock.scatter_writes = login.scatter_writes
+    tds_sock.metadata_cache = tds._MetadataCache(login.metadata_cache_size) if login.metadata_cache_size > 0 else None
+    sess = ProtocolSession(tds_sock, tzinfo_factory, transport.buffer)
+    tds_sock._main_session = sess
+    tds_sock.sock = transport
+    tds_sock.tds_version = login.tds_version
+    login.server_enc_flag = PreLoginEnc.ENCRYPT_NOT_SUP
+    if tds_base.IS_TDS71_PLUS(tds_sock):
+        sess.send_prelogin(login)
+        await _run(sess, sess.process_prelogin, login)
+        if sess.tls_requested:
+            await transport.establish_tls(sess, login)
+    sess.tds7_send_login(login)
+    await transport.flush()
+    if login.server_enc_flag == PreLoginEnc.ENCRYPT_OFF:
+        transport.revert_to_clear()
+    if not await _run(sess, sess.process_login_tokens):
+        sess.raise_db_exception()
+    if tds_sock.route is not None:
+        return tds_sock.route
+
+    # update block size if server returned different one
+    if sess._writer.bufsize != sess._reader.get_block_size():
+        sess._reader.set_block_size(sess._writer.bufsize)
+
+    tds_sock.type_factory = tds_types.SerializerFactory(tds_sock.tds_version)
+    tds_sock.type_inferrer = tds_types.TdsTypeInferrer(
+        type_factory=tds_sock.type_factory,
+        collation=tds_sock.collation,
+        bytes_to_unicode=login.bytes_to_unicode,
+        allow_tz=not tds_sock.use_tz
+    )
+    tds_sock._is_connected = True
+    if login.database and tds_sock.env.database != login.database:
+        sess.submit_plain_query('use ' + tds_base.tds_quote_id(login.database))
+        await transport.flush()
+        await _run(sess, sess.process_simple_request)
+    return None
+
+
+class Connection(object):
+    """ Asynchronous connection, this object should be created by calling :func:`connect`
+
+    Connection should not be used by several tasks concurrently.
+    """
+
+    def __init__(self):
+        self._closed = False
+        self._conn = None
+        self._isolation_level = 0
+        self._autocommit = True
+        self._row_strategy = pytds.tuple_row_strategy
+        self._login = None
+        self._use_tz = None
+        self._tzinfo_factory = None
+        self._key = None
+        self._pooling = False
+        self._dirty = False
+        self._pool = None
+
+    @property
+    def as_dict(self):
+        """
+        Instructs all cursors this connection creates to return results
+        as a dictionary rather than a tuple.
+        """
+        return self._row_strategy == pytds.dict_row_strategy
+
+    @as_dict.setter
+    def as_dict(self, value):
+        if value:
+            self._row_strategy = pytds.dict_row_strategy
+        else:
+            self._row_strategy = pytds.tuple_row_strategy
+
+    @property
+    def autocommit(self):
+        """
+        The current state of autocommit on the connection, use
+        :func:`set_autocommit` to change it.
+        """
+        return self._autocommit
+
+    async def set_autocommit(self, value):
+        """ Enables or disables autocommit """
+        if self._autocommit != value:
+            await self._assert_open()
+            sess = self._conn.main_session
+            if value:
+                if self._conn.tds72_transaction:
+                    await self._submit(sess.submit_rollback, False)
+                    await self._call(sess.process_simple_request)
+            else:
+                await self._submit(sess.submit_begin_tran, self._isolation_level)
+                await self._call(sess.process_simple_request)
+            self._autocommit = value
+
+    @property
+    def isolation_level(self):
+        """Isolation level for transactions,
+        for possible values see :ref:`isolation-level-constants`
+        """
+        return self._isolation_level
+
+    @isolation_level.setter
+    def isolation_level(self, level):
+        self._isolation_level = level
+
+    @property
+    def tds_version(self):
+        """
+        Version of tds protocol that is being used by this connection
+        """
+        return self._conn.tds_version
+
+    @property
+    def product_version(self):
+        """
+        Version of the MSSQL server
+        """
+        return self._conn.product_version
+
+    @property
+    def mars_enabled(self):
+        """ MARS is not supported by asynchronous connections
+        """
+        return False
+
+    async def _assert_open(self):
+        if self._closed:
+            raise Error('Connection closed')
+        if not self._conn or not self._conn.is_connected():
+            await self._open()
+
+    async def _connect(self, host, port, instance, timeout):
+        login = self._login
+        loop = asyncio.get_event_loop()
+        try:
+            login.server_name = host
+            login.instance_name = instance
+            port = await loop.run_in_executor(None, functools.partial(
+                pytds._resolve_instance_port,
+                host,
+                port,
+                instance,
+                timeout=timeout))
+            logger.info('Opening socket to %s:%d', host, port)
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except Exception as e:
+            raise LoginError("Cannot connect to server '{0}': {1}".format(host, e), e)
+
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 30)
+
+        transport = _StreamTransport(reader, writer)
+        conn = tds._TdsSocket(self._use_tz)
+        self._conn = conn
+        try:
+            try:
+                route = await asyncio.wait_for(_login(conn, login, transport, self._tzinfo_factory), timeout)
+            except asyncio.TimeoutError:
+                raise LoginError("Login to server '{0}' timed out".format(host))
+            if route is not None:
+                # rerouted to different server
+                transport.close()
+                await self._connect(host=route['server'],
+                                    port=route['port'],
+                                    instance=instance,
+                                    timeout=timeout)
+                return
+            if not self._autocommit:
+                sess = conn.main_session
+                await self._submit(sess.submit_begin_tran, self._isolation_level)
+                await self._call(sess.process_simple_request)
+        except:
+            transport.close()
+            raise
+
+    async def _try_open(self, timeout):
+        login = self._login
+        host, port, instance = login.servers[0]
+        await self._connect(host=host, port=port, instance=instance, timeout=timeout)
+
+    async def _open(self):
+        self._conn = None
+        self._dirty = False
+        login = self._login
+        connect_timeout = login.connect_timeout
+
+        # using the same retry algorithm as blocking connection
+        retry_time = 0.08 * connect_timeout
+        retry_delay = 0.2
+        last_error = None
+        end_time = time.time() + connect_timeout
+        while True:
+            for _ in range(len(login.servers)):
+                try:
+                    await self._try_open(timeout=retry_time)
+                    return
+                except OperationalError as e:
+                    last_error = e
+                    if self._conn is not None and len(self._conn.main_session.messages) <= 1:
+                        # don't retry if password is incorrect, this can cause account
+                        # to be locked
+                        if getattr(e, 'msg_no', None) in (
+                                18456,  # login failed
+                                18486,  # account is locked
+                                18487,  # password expired
+                                18488,  # password should be changed
+                                18452,  # login from untrusted domain
+                        ):
+                            raise
+
+                if time.time() > end_time:
+                    raise last_error
+                login.servers.rotate(-1)
+
+            await asyncio.sleep(retry_delay)
+            retry_time += 0.08 * connect_timeout
+            retry_delay = min(1, retry_delay * 2)
+
+    async def _call(self, fun, *args):
+        """ Runs parsing function of the session with query timeout """
+        try:
+            return await _run(self._conn.main_session, fun, *args, timeout=self._conn.query_timeout or None)
+        except tds_base.TimeoutError:
+            # request is cancelled, connection can be used further
+            raise
+        except (ClosedConnectionError, OSError):
+            self._conn.close()
+            raise
+
+    async def _cancel_if_pending(self):
+        sess = self._conn.main_session
+        if sess.state == tds_base.TDS_IDLE:
+            return
+        if not sess.in_cancel:
+            sess.put_cancel()
+        await self._call(sess.process_cancel)
+
+    async def _submit(self, fun, *args):
+        """ Builds request by calling submit function of the session and sends it """
+        await self._cancel_if_pending()
+        fun(*args)
+        try:
+            await self._conn.sock.flush()
+        except (ClosedConnectionError, OSError):
+            self._conn.close()
+            raise
+
+    async def _ensure_transaction(self):
+        if not self._autocommit and not self._conn.tds72_transaction:
+            sess = self._conn.main_session
+            await self._submit(sess.submit_begin_tran, self._isolation_level)
+            await self._call(sess.process_simple_request)
+
+    def cursor(self):
+        """
+        Return cursor object that can be used to make queries and fetch
+        results from the database.
+        """
+        if self._closed:
+            raise Error('Connection closed')
+        return Cursor(self)
+
+    async def commit(self):
+        """
+        Commit transaction which is currently in progress.
+        """
+        await self._assert_open()
+        if self._autocommit:
+            return
+        if not self._conn.tds72_transaction:
+            return
+        sess = self._conn.main_session
+        await self._submit(sess.submit_commit, True, self._isolation_level)
+        await self._call(sess.process_simple_request)
+        self._dirty = False
+
+    async def rollback(self):
+        """
+        Roll back transaction which is currently in progress.
+        """
+        if self._autocommit:
+            return
+        if not self._conn or not self._conn.is_connected():
+            return
+        if not self._conn.tds72_transaction:
+            return
+        sess = self._conn.main_session
+        try:
+            await self._submit(sess.submit_rollback, True, self._isolation_level)
+            await self._call(sess.process_simple_request)
+        except ClosedConnectionError:
+            pass
+        self._dirty = False
+
+    async def close(self):
+        """ Close connection to an MS SQL Server.
+
+        If connection was acquired from a :class:`Pool` it is returned
+        back to the pool.  It can be called more than once in a row.
+        """
+        if self._pool is not None:
+            await self._pool.release(self)
+            return
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+        self._closed = True
+
+    def _is_usable(self):
+        return (not self._closed and self._conn is not None and self._conn.is_connected() and
+                self._conn.main_session.state == tds_base.TDS_IDLE)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class Cursor(object):
+    """
+    Asynchronous cursor, created by :func:`Connection.cursor`
+    """
+    #: Number of rows decoded at once by fetchall and iteration
+    _fetch_batch_size = 1000
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.arraysize = 1
+        self._session = conn._conn.main_session if conn._conn else None
+        self._rows = collections.deque()
+        self._row_factory = None
+
+    async def _assert_open(self):
+        conn = self._conn
+        if conn is None:
+            raise InterfaceError('Cursor is closed')
+        await conn._assert_open()
+        self._session = conn._conn.main_session
+        return conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._rows:
+            self._rows.extend(await self._read_rows(self._fetch_batch_size))
+            if not self._rows:
+                raise StopAsyncIteration
+        return self._row_factory(self._rows.popleft())
+
+    @property
+    def connection(self):
+        """ Provides link back to :class:`Connection` of this cursor
+        """
+        return self._conn
+
+    @property
+    def spid(self):
+        """ MSSQL Server's SPID (session id)
+        """
+        return self._session._spid
+
+    def _setup_row_factory(self):
+        self._rows.clear()
+        self._row_factory = None
+        if self._session.res_info:
+            column_names = [col[0] for col in self._session.res_info.description]
+            self._row_factory = self._conn._row_strategy(column_names)
+
+    async def execute(self, operation, params=()):
+        """ Execute the query
+
+        :param operation: SQL statement
+        :type operation: str
+        """
+        conn = await self._assert_open()
+        self._rows.clear()
+        await conn._ensure_transaction()
+        conn._dirty = True
+        await conn._submit(pytds._submit_operation, self._session, operation, params, conn._template_cache)
+        await conn._call(self._session.find_result_or_done)
+        self._setup_row_factory()
+        return self
+
+    async def executemany(self, operation, params_seq):
+        counts = []
+        for params in params_seq:
+            await self.execute(operation, params)
+            if self._session.rows_affected != -1:
+                counts.append(self._session.rows_affected)
+        if counts:
+            self._session.rows_affected = sum(counts)
+
+    async def execute_scalar(self, query_string, params=None):
+        """
+        Executes query and returns first column of first row from result
+        """
+        await self.execute(query_string, params)
+        row = await self.fetchone()
+        if not row:
+            return None
+        return row[0]
+
+    async def callproc(self, procname, parameters=()):
+        """
+        Call a stored procedure with the given name.
+
+        :param procname: The name of the procedure to call
+        :type procname: str
+        :keyword parameters: The optional parameters for the procedure
+        :type parameters: sequence
+        """
+        conn = await self._assert_open()
+        self._rows.clear()
+        await conn._ensure_transaction()
+        conn._dirty = True
+        sess = self._session
+        results = list(parameters)
+        parameters = sess._convert_params(parameters)
+        await conn._submit(sess.submit_rpc, procname, parameters, 0)
+        sess.done_flags = 0
+        sess.return_value_index = 0
+        await conn._call(sess.process_rpc_results)
+        for key, param in sess.output_params.items():
+            results[key] = param.value
+        self._setup_row_factory()
+        return results
+
+    async def get_proc_outputs(self):
+        """
+        If stored procedure has result sets and OUTPUT parameters use this method
+        after you processed all result sets to get values of OUTPUT parameters.
+        :return: A list of output parameter values.
+        """
+        await self._conn._call(self._session.complete_rpc)
+        results = [None] * len(self._session.output_params.items())
+        for key, param in self._session.output_params.items():
+            results[key] = param.value
+        return results
+
+    async def get_proc_return_status(self):
+        """ Last stored proc result
+        """
+        if self._session is None:
+            return None
+        if not self._session.has_status:
+            await self._conn._call(self._session.find_return_status)
+        return self._session.ret_status if self._session.has_status else None
+
+    async def cancel(self):
+        """ Cancel current statement
+        """
+        conn = await self._assert_open()
+        await conn._cancel_if_pending()
+
+    def close(self):
+        """
+        Closes the cursor. The cursor is unusable from this point.
+        """
+        self._conn = None
+
+    async def nextset(self):
+        """ Move to next recordset in batch statement, all rows of current recordset are
+        discarded if present.
+
+        :returns: true if successful or ``None`` when there are no more recordsets
+        """
+        res = await self._conn._call(self._session.next_set)
+        self._setup_row_factory()
+        return res
+
+    @property
+    def rowcount(self):
+        """ Number of rows affected by previous statement
+
+        :returns: -1 if this information was not supplied by MSSQL server
+        """
+        if self._session is None:
+            return -1
+        return self._session.rows_affected
+
+    @property
+    def description(self):
+        """ Cursor description, see http://legacy.python.org/dev/peps/pep-0249/#description
+        """
+        if self._session is None:
+            return None
+        res = self._session.res_info
+        if res:
+            return res.description
+        else:
+            return None
+
+    @property
+    def messages(self):
+        """ Messages generated by server, see http://legacy.python.org/dev/peps/pep-0249/#cursor-messages
+        """
+        if self._session:
+            result = []
+            for msg in self._session.messages:
+                ex = tds._create_exception_by_message(msg)
+                result.append((type(ex), ex))
+            return result
+        else:
+            return None
+
+    async def _read_rows(self, size):
+        """ Reads up to size raw rows from the stream """
+        rows = []
+        if size > 0:
+            await self._conn._call(self._session.read_rows, size, rows)
+        return rows
+
+    async def _fetch_rows(self, size):
+        """ Fetches up to size raw rows, taking prefetched rows first """
+        rows = []
+        while self._rows and len(rows) < size:
+            rows.append(self._rows.popleft())
+        rows.extend(await self._read_rows(size - len(rows)))
+        return rows
+
+    async def fetchone(self):
+        """ Fetches next row, or ``None`` if there are no more rows
+        """
+        rows = await self._fetch_rows(1)
+        if rows:
+            return self._row_factory(rows[0])
+
+    async def fetchmany(self, size=None):
+        """ Fetches next multiple rows
+
+        :param size: Maximum number of rows to return, default value is cursor.arraysize
+        :returns: List of rows
+        """
+        if size is None:
+            size = self.arraysize
+        factory = self._row_factory
+        return [factory(row) for row in await self._fetch_rows(size)]
+
+    async def fetchall(self):
+        """ Fetches all remaining rows
+        """
+        factory = self._row_factory
+        rows = []
+        while True:
+            batch = await self._fetch_rows(self._fetch_batch_size)
+            rows.extend(factory(row) for row in batch)
+            if len(batch) < self._fetch_batch_size:
+                return rows
+
+
+async def connect(*args, **kwargs):
+    """
+    Opens asynchronous connection to the database
+
+    Accepts the same arguments as :func:`pytds.connect`, except that
+    MARS and ``statement_cache_size`` are not supported and ``pooling``
+    should not be used, use :func:`create_pool` instead.
+
+    :returns: An instance of :class:`Connection`
+    """
+    conn = Connection()
+    pytds._prepare_connection(conn, *args, **kwargs)
+    if conn._login.use_mars:
+        raise NotSupportedError('MARS is not supported by asynchronous connections')
+    if conn._pooling:
+        raise NotSupportedError('Use pytds.aio.create_pool for pooling of asynchronous connections')
+    if conn._statement_cache is not None:
+        raise NotSupportedError('Statement cache is not supported by asynchronous connections')
+    if kwargs.get('disable_connect_retry'):
+        await conn._try_open(timeout=conn._login.connect_timeout)
+    else:
+        await conn._open()
+    return conn
+
+
+class _PoolConnectionContext(object):
+    """ Result of :func:`Pool.acquire`, can be awaited or used
+    as asynchronous context manager
+    """
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    def __await__(self):
+        return self._pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self._conn = await self._pool._acquire()
+        return self._conn
+
+    async def __aexit__(self, *args):
+        conn, self._conn = self._conn, None
+        await self._pool.release(conn)
+
+
+class Pool(object):
+    """ Pool of asynchronous connections, should be created by calling :func:`create_pool`
+
+    Connections are acquired with :func:`acquire` and returned back with
+    :func:`release` or by closing them.  When pool has `maxsize` connections
+    in use acquiring waits until some connection is released.
+    """
+    def __init__(self, minsize, maxsize, connect_args, connect_kwargs):
+        if maxsize < 1 or minsize > maxsize:
+            raise ValueError('Invalid pool size')
+        self._minsize = minsize
+        self._maxsize = maxsize
+        self._connect_args = connect_args
+        self._connect_kwargs = connect_kwargs
+        self._free = collections.deque()
+        self._used = set()
+        self._connecting = 0
+        self._cond = asyncio.Condition()
+        self._closed = False
+
+    @property
+    def minsize(self):
+        return self._minsize
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def size(self):
+        """ Number of connections which are open or are being opened """
+        return len(self._free) + len(self._used) + self._connecting
+
+    @property
+    def freesize(self):
+        """ Number of idle connections """
+        return len(self._free)
+
+    async def _new_connection(self):
+        """ Opens connection for a slot which caller reserved by incrementing ``_connecting`` """
+        try:
+            conn = await connect(*self._connect_args, **self._connect_kwargs)
+        except BaseException:
+            self._connecting -= 1
+            # slot is free again, let a waiter use it
+            async with self._cond:
+                self._cond.notify()
+            raise
+        self._connecting -= 1
+        conn._pool = self
+        return conn
+
+    async def _fill_free(self):
+        while self.size < self._minsize:
+            self._connecting += 1
+            self._free.append(await self._new_connection())
+
+    def acquire(self):
+        """ Acquires connection from the pool
+
+        Can be awaited or used as ``async with pool.acquire() as conn:``.
+        """
+        return _PoolConnectionContext(self)
+
+    async def _acquire(self):
+        async with self._cond:
+            while True:
+                if self._closed:
+                    raise InterfaceError('Pool is closed')
+                while self._free:
+                    conn = self._free.popleft()
+                    if conn._is_usable():
+                        self._used.add(conn)
+                        # connection is reset by the server together with the first request
+                        conn._conn.main_session.request_reset()
+                        return conn
+                    _close_connection(conn)
+                if self.size < self._maxsize:
+                    # reserve the slot and connect without holding the lock,
+                    # so that other acquirers and releases are not blocked by login
+                    self._connecting += 1
+                    break
+                await self._cond.wait()
+        conn = await self._new_connection()
+        self._used.add(conn)
+        return conn
+
+    async def release(self, conn):
+        """ Returns connection back to the pool
+
+        Open transaction is rolled back, broken connections are closed.
+        """
+        if conn not in self._used:
+            return
+        self._used.discard(conn)
+        if not self._closed and conn._is_usable():
+            try:
+                await conn.rollback()
+            except Error:
+                logger.exception('Failed to rollback pooled connection')
+                _close_connection(conn)
+            else:
+                self._free.append(conn)
+        else:
+            _close_connection(conn)
+        async with self._cond:
+            self._cond.notify()
+
+    async def close(self):
+        """ Closes idle connections and prevents acquiring new ones,
+        connections which are in use are closed when released
+        """
+        self._closed = True
+        while self._free:
+            _close_connection(self._free.popleft())
+        async with self._cond:
+            self._cond.notify_all()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+def _close_connection(conn):
+    conn._pool = None
+    if conn._conn:
+        conn._conn.close()
+        conn._conn = None
+    conn._closed = True
+
+
+async def create_pool(*args, minsize=1, maxsize=10, **kwargs):
+    """ Creates pool of asynchronous connections
+
+    :keyword minsize: Number of connections which are opened upfront
+    :keyword maxsize: Maximum number of connections
+    Other arguments are the same as for :func:`connect`.
+    :returns: An instance of :class:`Pool`
+    """
+    pool = Pool(minsize, maxsize, args, kwargs)
+    await pool._fill_free()
+    return pool
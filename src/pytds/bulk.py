@@ -0,0 +1,221 @@
+"""
+Parallel bulk load over several connections
+
+:func:`parallel_copy` splits rows into chunks and distributes them among
+worker threads, every worker opens its own connection and loads chunks
+it takes with a single ``INSERT BULK`` operation, see :func:`pytds.Cursor.copy_to`.
+Network transfers of different workers overlap, and server processes
+incoming streams concurrently.  Transactions of workers are committed
+only after all of them have loaded their rows.
+
+Example::
+
+    stats = pytds.bulk.parallel_copy(
+        dict(server='server', database='db', user='user', password='password'),
+        'table', rows, workers=4)
+    for worker in stats:
+        print(worker.worker, worker.rows, worker.rows_per_second)
+"""
+import collections
+import logging
+import sys
+import threading
+import time
+
+import six
+from six.moves import queue
+
+import pytds
+
+logger = logging.getLogger(__name__)
+
+# how often blocked queue operations check whether load was aborted, seconds
+_poll_interval = 0.1
+
+
+class WorkerStats(collections.namedtuple('WorkerStats', ['worker', 'rows', 'elapsed'])):
+    """ Statistics of a worker of :func:`parallel_copy`
+
+    :param worker: Index of the worker
+    :param rows: Number of rows loaded by the worker
+    :param elapsed: Time in seconds from opening connection to commit
+    """
+    __slots__ = ()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class _Aborted(Exception):
+    """ Raised in worker when another worker failed """
+
+
+class _ParallelCopy(object):
+    def __init__(self, connect_kwargs, table, workers, chunk_rows, copy_kwargs):
+        self._connect_kwargs = connect_kwargs
+        self._table = table
+        self._workers = workers
+        self._chunk_rows = chunk_rows
+        self._copy_kwargs = copy_kwargs
+        self._queue = queue.Queue(maxsize=2 * workers)
+        self._abort = threading.Event()
+        self._cond = threading.Condition()
+        self._error = None
+        self._loaded = 0  # number of workers which loaded their rows
+        self._commit = None  # decision taken when loading is over, True to commit, False to roll back
+        self._stats = [WorkerStats(i, 0, 0.0) for i in range(workers)]
+
+    def _fail(self, exc_info):
+        with self._cond:
+            if self._error is None:
+                self._error = exc_info
+            if self._commit is None:
+                self._commit = False
+            self._cond.notify_all()
+        self._abort.set()
+
+    def _wait_decision(self):
+        """ Reports that worker loaded its rows and waits until all workers do
+
+        :returns: True if transaction of worker should be committed
+        """
+        with self._cond:
+            self._loaded += 1
+            self._cond.notify_all()
+            while self._commit is None:
+                self._cond.wait(_poll_interval)
+            return self._commit
+
+    def _decide(self):
+        """ Waits until all workers loaded their rows or one of them failed, and tells them to commit or roll back """
+        with self._cond:
+            while self._commit is None and self._loaded < self._workers:
+                self._cond.wait(_poll_interval)
+            if self._commit is None:
+                self._commit = True
+            self._cond.notify_all()
+
+    def _put(self, item):
+        while not self._abort.is_set():
+            try:
+                self._queue.put(item, timeout=_poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self):
+        while True:
+            if self._abort.is_set():
+                raise _Aborted()
+            try:
+                return self._queue.get(timeout=_poll_interval)
+            except queue.Empty:
+                pass
+
+    def _rows(self, counter):
+        while True:
+            chunk = self._get()
+            if chunk is None:
+                return
+            for row in chunk:
+                yield row
+            counter[0] += len(chunk)
+
+    def _run_worker(self, index):
+        counter = [0]
+        start = time.time()
+        conn = None
+        try:
+            # rows are committed only when all workers loaded theirs
+            conn = pytds.connect(**dict(self._connect_kwargs, autocommit=False))
+            with conn.cursor() as cur:
+                cur.copy_to(table_or_view=self._table, data=self._rows(counter), **self._copy_kwargs)
+            if not self._wait_decision():
+                conn.rollback()
+                return
+            conn.commit()
+            self._stats[index] = WorkerStats(index, counter[0], time.time() - start)
+            logger.info('Bulk load worker %d loaded %d rows in %.3f sec', index, counter[0], time.time() - start)
+        except _Aborted:
+            pass
+        except Exception:
+            logger.exception('Bulk load worker %d failed', index)
+            self._fail(sys.exc_info())
+        finally:
+            if conn is not None:
+                # transaction of failed or aborted worker is rolled back
+                conn.close()
+
+    def run(self, rows_iter):
+        threads = [threading.Thread(target=self._run_worker, args=(i,), name='pytds-bulk-{0}'.format(i))
+                   for i in range(self._workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            chunk = []
+            for row in rows_iter:
+                chunk.append(row)
+                if len(chunk) >= self._chunk_rows:
+                    if not self._put(chunk):
+                        break
+                    chunk = []
+            else:
+                if chunk:
+                    self._put(chunk)
+                for _ in threads:
+                    self._put(None)
+        except Exception:
+            self._fail(sys.exc_info())
+        finally:
+            self._decide()
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            six.reraise(*self._error)
+        return self._stats
+
+
+def parallel_copy(connect_kwargs, table, rows_iter, workers=4, chunk_rows=10000, **copy_kwargs):
+    """ Loads rows into a table with several concurrent ``INSERT BULK`` operations
+
+    Every worker uses its own connection, opened by :func:`pytds.connect`.
+    Workers wait for each other when their rows are loaded, and their
+    transactions are committed only if all of them succeeded.  If any worker
+    fails, or rows iterator raises, all workers are stopped and their
+    transactions are rolled back, then the first error is raised.
+    Commits of different connections are not atomic though, if a commit
+    itself fails, e.g. because connection is lost, transactions of other
+    workers may be committed already.
+
+    Rows are serialized by worker threads, so serialization of different
+    workers is not parallel in CPython, but it overlaps with network
+    transfers and server side processing.
+
+    :param connect_kwargs: Dictionary of keyword arguments for :func:`pytds.connect`,
+      connections are always opened with ``autocommit=False``
+    :param table: Destination table or view
+    :type table: str
+    :param rows_iter: Iterable of rows, which are sequences of values
+    :keyword workers: Number of worker connections
+    :type workers: int
+    :keyword chunk_rows: Number of rows which are given to a worker at once
+    :type chunk_rows: int
+    :keyword copy_kwargs: Other keyword arguments are passed to :func:`pytds.Cursor.copy_to`,
+      e.g. ``schema``, ``columns`` or ``tablock``, but not ``batch_rows`` or ``batch_kb``.  Note that bulk update locks taken with ``tablock``
+      are compatible with each other only for tables without indexes, otherwise workers
+      will wait for each other.
+    :returns: List of :class:`WorkerStats`, one per worker
+    """
+    if workers < 1:
+        raise ValueError('workers should be positive')
+    if 'file' in copy_kwargs or 'data' in copy_kwargs:
+        raise ValueError('Rows should be provided by rows_iter')
+    if connect_kwargs.get('autocommit'):
+        raise ValueError('autocommit is not supported, it commits rows before the load is over')
+    if copy_kwargs.get('batch_rows') or copy_kwargs.get('batch_kb'):
+        raise ValueError('batch_rows and batch_kb are not supported, they commit batches before the load is over')
+    copy = _ParallelCopy(connect_kwargs, table, workers, chunk_rows, copy_kwargs)
+    return copy.run(rows_iter)
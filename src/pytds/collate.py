@@ -266,10 +266,37 @@ class Collation(object):
         else:
             return lcid2charset(self.lcid)
 
+    @classmethod
+    def from_wire(cls, b):
+        """ Returns collation for given wire bytes
+
+        Collations are interned, so the same object is returned for the same bytes,
+        and its codec is only looked up once.
+
+        :param b: Bytes buffer of exactly :attr:`wire_size` bytes
+        """
+        b = bytes(b)
+        collation = _interned.get(b)
+        if collation is None:
+            if len(_interned) >= _max_interned:
+                _interned.clear()
+            collation = _interned[b] = cls.unpack(b)
+        return collation
+
     def get_codec(self):
-        return codecs.lookup(self.get_charset())
+        key = (self.sort_id, self.lcid)
+        codec = _codecs.get(key)
+        if codec is None:
+            codec = _codecs[key] = codecs.lookup(self.get_charset())
+        return codec
 
     # TODO: define __repr__ and __unicode__
 
 
+# collations by their wire bytes and codecs by sort id and lcid,
+# servers use few distinct collations, the limit guards against unbounded growth
+_max_interned = 1024
+_interned = {}
+_codecs = {}
+
 raw_collation = Collation(0, 0, 0, 0, 0, 0, 0, 0, 0)
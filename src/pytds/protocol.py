@@ -0,0 +1,376 @@
+"""
+I/O free core of TDS protocol
+
+:class:`ProtocolSession` builds requests into memory and parses responses
+from bytes which were fed into it, it never touches sockets.  This allows
+to drive protocol from event loops, to parse recorded responses offline,
+or to receive data in one thread and decode it in another.
+
+Requests are built by regular methods of :class:`pytds.tds._TdsSession`,
+e.g. :func:`submit_plain_query`, produced bytes are taken by
+:func:`ProtocolSession.data_to_send`.  Received bytes are passed to
+:func:`ProtocolSession.feed` and response is consumed either as
+a sequence of events returned by :func:`ProtocolSession.next_event`, or
+by calling regular processing methods through :func:`ProtocolSession.run`.
+
+When parser runs out of fed data it raises :class:`NeedData`, reader is
+rewound to the beginning of interrupted token, and parsing of this token
+is repeated after more data is fed.
+
+It is used by :mod:`pytds.aio`.  Blocking :class:`pytds.Connection` does
+not run on top of it, it reads from sockets with readers of :mod:`pytds.tds`,
+only token handlers of :class:`pytds.tds._TdsSession` are shared.
+
+Example of offline parsing::
+
+    sess = ProtocolSession()
+    sess.feed(recorded_response)
+    for event in sess.events():
+        print(event)
+"""
+import collections
+
+from . import tds
+from . import tds_base
+from . import tds_types
+
+
+class NeedData(Exception):
+    """ Raised when parser needs more data than was fed so far """
+
+
+#: COLMETADATA token was received, new result set begins
+ColumnsMetadata = collections.namedtuple('ColumnsMetadata', ['columns'])
+
+#: Batch of decoded rows of current result set, each row is a list of values
+Rows = collections.namedtuple('Rows', ['rows'])
+
+#: DONE, DONEPROC or DONEINPROC token, ``rows_affected`` is -1 if count is not valid
+Done = collections.namedtuple('Done', ['marker', 'status', 'rows_affected'])
+
+#: ENVCHANGE token, new value is applied to the session
+EnvChange = collections.namedtuple('EnvChange', ['type'])
+
+#: ERROR or INFO token, ``message`` is a dictionary as stored in session's messages
+Message = collections.namedtuple('Message', ['message'])
+
+#: RETURNSTATUS token
+ReturnStatus = collections.namedtuple('ReturnStatus', ['value'])
+
+#: LOGINACK token
+LoginAck = collections.namedtuple('LoginAck', ['tds_version', 'product_name', 'product_version'])
+
+#: Any other token, it was processed by the session
+Token = collections.namedtuple('Token', ['marker'])
+
+
+class PacketBuffer(object):
+    """ In-memory transport of :class:`ProtocolSession`
+
+    Keeps fed bytes and serves them to session's reader as complete TDS
+    packets, accumulates bytes written by session's writer.
+    """
+    def __init__(self):
+        self._received = bytearray()
+        self._pos = 0  # beginning of first packet which was not taken yet
+        self._outgoing = []
+        self._connected = True
+
+    def feed(self, data):
+        """ Appends received bytes """
+        if self._pos:
+            del self._received[:self._pos]
+            self._pos = 0
+        self._received += data
+
+    def has_packet(self):
+        """ Tells whether complete packet was received """
+        left = len(self._received) - self._pos
+        return (left >= tds._header.size and
+                left >= tds._header.unpack_from(self._received, self._pos)[2])
+
+    def read_packet(self):
+        """ Returns memoryview of next complete packet, it should be released by the caller
+
+        Raises :class:`NeedData` if there is no such packet.
+        """
+        pos = self._pos
+        left = len(self._received) - pos
+        if left < tds._header.size:
+            raise NeedData()
+        size = tds._header.unpack_from(self._received, pos)[2]
+        if size <= tds._header.size:
+            raise tds_base.InterfaceError('Invalid packet size {0}'.format(size))
+        if left < size:
+            raise NeedData()
+        self._pos = pos + size
+        return memoryview(self._received)[pos:pos + size]
+
+    def data_to_send(self):
+        """ Returns bytes written since previous call """
+        data = b''.join(self._outgoing)
+        self._outgoing = []
+        return data
+
+    def sendall(self, data, flags=0):
+        # writer passes memoryview, bytes() of memoryview is its repr on Python 2
+        self._outgoing.append(data.tobytes() if isinstance(data, memoryview) else bytes(data))
+
+    def is_connected(self):
+        return self._connected
+
+    def close(self):
+        self._connected = False
+
+
+class _RewindableReader(tds._TdsContiguousReader):
+    """ Reader which takes packets from :class:`PacketBuffer` and can be
+    rewound to a marked position
+
+    Data starting from the marked position is kept in the buffer, so it can
+    be parsed again after more packets are received.
+    """
+    def __init__(self, session):
+        super(_RewindableReader, self).__init__(session)
+        self._mark = None
+
+    def mark(self):
+        """ Remembers current position, normally beginning of a token """
+        self._mark = self._pos
+
+    def rewind(self):
+        """ Returns to the position remembered by :func:`mark` """
+        self._pos = self._mark
+
+    def marked_byte(self, offset):
+        """ Returns byte at given offset from the marked position """
+        return self._buf[self._mark + offset]
+
+    def _make_room(self, size):
+        keep = self._pos if self._mark is None else self._mark
+        left = self._size - keep
+        if left + size > len(self._buf):
+            buf = bytearray(max(left + size, 2 * len(self._buf)))
+            buf[:left] = self._bufview[keep:self._size]
+            self._buf = buf
+            self._bufview = memoryview(buf)
+        elif keep:
+            self._buf[:left] = self._buf[keep:self._size]
+        self._pos -= keep
+        if self._mark is not None:
+            self._mark -= keep
+        self._size = left
+
+    def _read_packet(self):
+        packet = self._transport.read_packet()
+        self.packets_read += 1
+        try:
+            self._type, self._status, size, self._session._spid, _ = tds._header.unpack_from(packet, 0)
+            size -= tds._header.size
+            if self._mark is None and self._pos >= self._size:
+                self._pos = self._size = 0
+            if self._size + size > len(self._buf):
+                self._make_room(size)
+            self._buf[self._size:self._size + size] = packet[tds._header.size:]
+            self._size += size
+        finally:
+            packet.release()
+
+
+_done_tokens = (tds_base.TDS_DONE_TOKEN, tds_base.TDS_DONEPROC_TOKEN, tds_base.TDS_DONEINPROC_TOKEN)
+
+
+class ProtocolSession(tds._TdsSession):
+    """ TDS session working over :class:`PacketBuffer`
+
+    Every token handled through :func:`get_token_id` is marked in the
+    reader, so processing functions can be restarted from the beginning
+    of interrupted token.
+
+    :param tds_sock: An instance of :class:`pytds.tds._TdsSocket`, new one is created if not provided
+    :param tzinfo_factory: Factory of timezone objects for decoded values
+    :param buffer: An instance of :class:`PacketBuffer`, new one is created if not provided
+    """
+    def __init__(self, tds_sock=None, tzinfo_factory=None, buffer=None):
+        if tds_sock is None:
+            tds_sock = tds._TdsSocket()
+        if buffer is None:
+            buffer = PacketBuffer()
+        super(ProtocolSession, self).__init__(tds_sock, buffer, tzinfo_factory)
+        self._reader = _RewindableReader(self)
+        self.tls_requested = False
+        self.login_succeed = False
+
+    @property
+    def buffer(self):
+        """ Underlying :class:`PacketBuffer` """
+        return self._transport
+
+    def feed(self, data):
+        """ Passes received bytes to the parser """
+        self._transport.feed(data)
+
+    def data_to_send(self):
+        """ Returns bytes of requests which were built since previous call """
+        return self._transport.data_to_send()
+
+    def establish_channel(self):
+        # handshake needs I/O, it should be done by the driver after PRELOGIN is processed
+        self.tls_requested = True
+
+    def get_token_id(self):
+        self.set_state(tds_base.TDS_READING)
+        self._reader.mark()
+        return self._reader.get_byte()
+
+    def process_login_tokens(self):
+        r = self._reader
+        while True:
+            r.mark()
+            marker = r.get_byte()
+            if marker == tds_base.TDS_LOGINACK_TOKEN:
+                self.login_succeed = True
+                self.process_loginack()
+            else:
+                self.process_token(marker)
+                if marker == tds_base.TDS_DONE_TOKEN:
+                    return self.login_succeed
+
+    def _reset_chunk_handlers(self):
+        # drop partially accumulated values of long columns, so they are not
+        # duplicated when their tokens are parsed again
+        if self.res_info is None:
+            return
+        for col in self.res_info.columns:
+            handler = getattr(col.serializer, '_chunk_handler', None)
+            if isinstance(handler, tds_types._DefaultChunkedHandler):
+                handler.stream.seek(0)
+                handler.stream.truncate()
+
+    def run(self, fun, *args):
+        """ Calls processing function
+
+        If function runs out of data :class:`NeedData` is raised and
+        the reader is rewound, function should be called again after more
+        data is fed.  Function should keep its progress only in the session,
+        e.g. it can be :func:`find_result_or_done` or :func:`process_simple_request`.
+
+        :returns: Result of the function
+        """
+        r = self._reader
+        r.mark()
+        try:
+            return fun(*args)
+        except NeedData:
+            r.rewind()
+            self._reset_chunk_handlers()
+            raise
+
+    def read_rows(self, count, rows):
+        """ Decodes rows of current result set and appends them to rows list
+        until it has count rows or result set is over
+
+        Can be called through :func:`run`.
+        """
+        if self.res_info is None:
+            raise tds_base.ProgrammingError("Previous statement didn't produce any results")
+
+        if self.skipped_to_status:
+            raise tds_base.ProgrammingError("Unable to fetch any rows after accessing return_status")
+
+        if not self.more_rows:
+            return
+        r = self._reader
+        info = self.res_info
+        decoder = info.row_decoder
+        num_cols = len(info.columns)
+        self.set_state(tds_base.TDS_READING)
+        while len(rows) < count:
+            r.mark()
+            marker = r.get_byte()
+            if marker == tds_base.TDS_ROW_TOKEN:
+                row = [None] * num_cols
+                decoder.read_row(r, row)
+            elif marker == tds_base.TDS_NBC_ROW_TOKEN:
+                row = [None] * num_cols
+                decoder.read_nbcrow(r, row)
+            elif marker in _done_tokens:
+                self.process_end(marker)
+                return
+            else:
+                self.process_token(marker)
+                continue
+            info.row_count += 1
+            rows.append(row)
+
+    def next_event(self, max_rows=1000):
+        """ Parses next event from fed data
+
+        Consecutive rows are returned as single :class:`Rows` event of
+        at most max_rows rows.  Errors reported by DONE tokens are raised
+        as exceptions, same as by blocking API.
+
+        :param max_rows: Maximum number of rows in :class:`Rows` event
+        :returns: Event or ``None`` if more data should be fed
+        """
+        r = self._reader
+        rows = []
+        if self.state == tds_base.TDS_PENDING:
+            self.set_state(tds_base.TDS_READING)
+        try:
+            while True:
+                r.mark()
+                marker = r.get_byte()
+                if marker in (tds_base.TDS_ROW_TOKEN, tds_base.TDS_NBC_ROW_TOKEN):
+                    info = self.res_info
+                    if info is None:
+                        self.bad_stream('Got row without preceding COLMETADATA')
+                    row = [None] * len(info.columns)
+                    if marker == tds_base.TDS_ROW_TOKEN:
+                        info.row_decoder.read_row(r, row)
+                    else:
+                        info.row_decoder.read_nbcrow(r, row)
+                    info.row_count += 1
+                    rows.append(row)
+                    if len(rows) >= max_rows:
+                        return Rows(rows)
+                elif rows:
+                    r.rewind()
+                    return Rows(rows)
+                else:
+                    return self._process_event(marker)
+        except NeedData:
+            r.rewind()
+            self._reset_chunk_handlers()
+            if rows:
+                return Rows(rows)
+            return None
+
+    def events(self, max_rows=1000):
+        """ Iterates over events which can be parsed from fed data
+
+        :param max_rows: Maximum number of rows in :class:`Rows` event
+        """
+        while True:
+            event = self.next_event(max_rows)
+            if event is None:
+                return
+            yield event
+
+    def _process_event(self, marker):
+        if marker == tds_base.TDS_LOGINACK_TOKEN:
+            self.process_loginack()
+            conn = self.conn
+            return LoginAck(conn.tds_version, conn.product_name, conn.product_version)
+        self.process_token(marker)
+        if marker == tds_base.TDS7_RESULT_TOKEN:
+            return ColumnsMetadata(self.res_info.columns)
+        elif marker in _done_tokens:
+            return Done(marker, self.done_flags, self.rows_affected)
+        elif marker == tds_base.TDS_ENVCHANGE_TOKEN:
+            return EnvChange(self._reader.marked_byte(3))
+        elif marker in (tds_base.TDS_ERROR_TOKEN, tds_base.TDS_INFO_TOKEN):
+            return Message(self.messages[-1])
+        elif marker == tds_base.TDS_RETURNSTATUS_TOKEN:
+            return ReturnStatus(self.ret_status)
+        return Token(marker)
@@ -1,10 +1,13 @@
+import array
 import codecs
+import collections
 import contextlib
 import logging
 import datetime
 import six
 import socket
 import struct
+import sys
 
 from .collate import ucs2_codec, Collation, lcid2charset, raw_collation
 from . import tds_base
@@ -110,14 +113,73 @@ class _TdsReader(object):
         self._transport = session._transport
         self._type = None
         self._status = None
+        self._staging = None  # read-ahead buffer, None when read-ahead is disabled
+        self._staging_view = None
+        self._staging_pos = 0
+        self._staging_end = 0
+        self.packets_read = 0  # number of packets received, tells whether buffer was refilled
 
     def set_block_size(self, size):
         self._buf = bytearray(b'\x00' * size)
         self._bufview = memoryview(self._buf)
 
+    def set_read_ahead(self, size):
+        """ Enables or disables read-ahead mode
+
+        In read-ahead mode transport is read in large chunks into a staging
+        buffer and TDS packets are cut out of this buffer, this saves
+        system calls when reading large responses.
+
+        :param size: Size of the staging buffer in bytes, 0 disables read-ahead
+        """
+        if self._staging_pos < self._staging_end:
+            raise tds_base.InterfaceError('Cannot change read-ahead mode while there is buffered data')
+        if size:
+            self._staging = bytearray(size)
+            self._staging_view = memoryview(self._staging)
+        else:
+            self._staging = self._staging_view = None
+        self._staging_pos = self._staging_end = 0
+
+    def _recv_into(self, view, size):
+        """ Receives up to size bytes into view, going through staging buffer in read-ahead mode
+
+        :returns: Number of bytes received, 0 means connection was closed
+        """
+        if self._staging is None:
+            return self._transport.recv_into(view, size)
+        pos = self._staging_pos
+        available = self._staging_end - pos
+        if not available:
+            if size >= len(self._staging):
+                return self._transport.recv_into(view, size)
+            available = self._transport.recv_into(self._staging_view, len(self._staging))
+            if not available:
+                return 0
+            pos = 0
+            self._staging_end = available
+        if size > available:
+            size = available
+        view[:size] = self._staging_view[pos:pos + size]
+        self._staging_pos = pos + size
+        return size
+
     def get_block_size(self):
         return len(self._buf)
 
+    def buffered(self):
+        """ Returns unread data which is already received, without consuming it
+
+        Data ends at the end of current packet, or of all received packets for contiguous readers.
+
+        :returns: Tuple of buffer, offset of first unread byte and offset of end of data
+        """
+        return self._buf, self._pos, self._size
+
+    def skip(self, size):
+        """ Consumes size bytes of data returned by :func:`buffered` """
+        self._pos += size
+
     @property
     def session(self):
         """ Link to :class:`_TdsSession` object
@@ -162,6 +224,11 @@ class _TdsReader(object):
         :param struc: A struct.Struct instance
         :returns: Result of unpacking
         """
+        offset = self._pos
+        if self._size - offset >= struc.size:
+            # fast path, structure is entirely within current packet
+            self._pos = offset + struc.size
+            return struc.unpack_from(self._buf, offset)
         buf, offset = readall_fast(self, struc.size)
         return struc.unpack_from(buf, offset)
 
@@ -197,10 +264,17 @@ class _TdsReader(object):
         """ Reads 64bit signed integer from the stream """
         return self.unpack(_int8_le)[0]
 
+    def readall(self, size):
+        """ Reads exactly size bytes from the stream
+
+        :param size: Number of bytes to read
+        :returns: Bytes buffer of exactly given size
+        """
+        return readall(self, size)
+
     def read_ucs2(self, num_chars):
         """ Reads num_chars UCS2 string from the stream """
-        buf = readall(self, num_chars * 2)
-        return ucs2_codec.decode(buf)[0]
+        return self.read_str(num_chars * 2, ucs2_codec)
 
     def read_str(self, size, codec):
         """ Reads byte string from the stream and decodes it
@@ -209,12 +283,24 @@ class _TdsReader(object):
         :param codec: Instance of codec to decode string
         :returns: Unicode string
         """
-        return codec.decode(readall(self, size))[0]
+        offset = self._pos
+        if self._size - offset >= size:
+            # fast path, string is entirely within current packet
+            self._pos = offset + size
+            return codec.decode(self._bufview[offset:offset + size])[0]
+        return codec.decode(self.readall(size))[0]
 
     def get_collation(self):
-        """ Reads :class:`Collation` object from stream """
-        buf = readall(self, Collation.wire_size)
-        return Collation.unpack(buf)
+        """ Reads :class:`Collation` object from stream
+
+        Returned objects are shared, see :func:`Collation.from_wire`
+        """
+        size = Collation.wire_size
+        offset = self._pos
+        if self._size - offset >= size:
+            self._pos = offset + size
+            return Collation.from_wire(self._buf[offset:offset + size])
+        return Collation.from_wire(self.readall(size))
 
     def _read_packet(self):
         """ Reads next TDS packet from the underlying transport
@@ -227,7 +313,7 @@ class _TdsReader(object):
         try:
             pos = 0
             while pos < _header.size:
-                received = self._transport.recv_into(self._bufview[pos:_header.size-pos])
+                received = self._recv_into(self._bufview[pos:_header.size], _header.size - pos)
                 if received == 0:
                     raise tds_base.ClosedConnectionError()
                 pos += received
@@ -235,10 +321,11 @@ class _TdsReader(object):
             self._session.put_cancel()
             raise
         self._pos = _header.size
+        self.packets_read += 1
         self._type, self._status, self._size, self._session._spid, _ = _header.unpack_from(self._bufview, 0)
         self._have = pos
         while pos < self._size:
-            received = self._transport.recv_into(self._bufview[pos:], self._size - pos)
+            received = self._recv_into(self._bufview[pos:], self._size - pos)
             if received == 0:
                 raise tds_base.ClosedConnectionError()
             pos += received
@@ -251,7 +338,116 @@ class _TdsReader(object):
         of the packet.
         """
         self._read_packet()
-        return readall(self, self._size - _header.size)
+        return self.readall(self._size - _header.size)
+
+
+class _TdsContiguousReader(_TdsReader):
+    """ TDS stream reader which keeps payloads of consecutive packets
+    back to back in a single buffer
+
+    Packet headers are received into a separate small buffer, so values
+    which span packet boundaries can be unpacked and decoded straight from
+    the receive buffer instead of being joined from per-packet chunks.
+    The buffer grows when a single value does not fit into it.
+    """
+    def __init__(self, session):
+        super(_TdsContiguousReader, self).__init__(session)
+        self._hdr = bytearray(_header.size)
+        self._hdrview = memoryview(self._hdr)
+        self._block_size = len(self._buf)
+        self._pos = 0  # position of first unread byte in the buffer
+        self._size = 0  # end of buffered payload
+
+    def set_block_size(self, size):
+        self._block_size = size
+        if size > len(self._buf):
+            self._make_room(size)
+
+    def get_block_size(self):
+        return self._block_size
+
+    def _make_room(self, size):
+        """ Moves unread data to the beginning of the buffer and grows the buffer
+        if it can't fit additional size bytes
+        """
+        left = self._size - self._pos
+        if left + size > len(self._buf):
+            buf = bytearray(max(left + size, 2 * len(self._buf)))
+            buf[:left] = self._bufview[self._pos:self._size]
+            self._buf = buf
+            self._bufview = memoryview(buf)
+        elif self._pos:
+            self._buf[:left] = self._buf[self._pos:self._size]
+        self._pos = 0
+        self._size = left
+
+    def _fill(self, size):
+        """ Receives packets until at least size unread bytes are buffered """
+        while self._size - self._pos < size:
+            self._read_packet()
+
+    def unpack(self, struc):
+        size = struc.size
+        if self._size - self._pos < size:
+            self._fill(size)
+        offset = self._pos
+        self._pos = offset + size
+        return struc.unpack_from(self._buf, offset)
+
+    def readall(self, size):
+        if self._size - self._pos < size:
+            self._fill(size)
+        offset = self._pos
+        self._pos = offset + size
+        return self._bufview[offset:offset + size].tobytes()
+
+    def read_str(self, size, codec):
+        if self._size - self._pos < size:
+            self._fill(size)
+        offset = self._pos
+        self._pos = offset + size
+        return codec.decode(self._bufview[offset:offset + size])[0]
+
+    def _read_packet(self):
+        """ Reads next TDS packet from the underlying transport and appends
+        its payload to the buffered data
+
+        If timeout is happened during reading of packet's header will
+        cancel current request.
+        """
+        try:
+            pos = 0
+            while pos < _header.size:
+                received = self._recv_into(self._hdrview[pos:], _header.size - pos)
+                if received == 0:
+                    raise tds_base.ClosedConnectionError()
+                pos += received
+        except tds_base.TimeoutError:
+            self._session.put_cancel()
+            raise
+        self.packets_read += 1
+        self._type, self._status, size, self._session._spid, _ = _header.unpack_from(self._hdr, 0)
+        size -= _header.size
+        if self._pos >= self._size:
+            self._pos = self._size = 0
+        if self._size + size > len(self._buf):
+            self._make_room(size)
+        pos = self._size
+        end = pos + size
+        while pos < end:
+            received = self._recv_into(self._bufview[pos:end], end - pos)
+            if received == 0:
+                raise tds_base.ClosedConnectionError()
+            pos += received
+        self._size = end
+
+    def read_whole_packet(self):
+        self._read_packet()
+        return self.readall(self._size - self._pos)
+
+
+# types of requests which can carry RESETCONNECTION flag
+_resettable_packet_types = (tds_base.PacketType.QUERY, tds_base.PacketType.RPC, tds_base.PacketType.TRANS)
 
 
 class _TdsWriter(object):
@@ -268,6 +464,10 @@ class _TdsWriter(object):
         self._buf = bytearray(bufsize)
         self._packet_no = 0
         self._type = 0
+        self._scatter_writes = False
+        self._pending_reset = 0  # reset flag for the next request
+        self._first_status = 0  # extra status bits of the first packet of current stream
+        self._stream_bytes = 0  # payload bytes of current stream which were sent already
 
     @property
     def session(self):
@@ -296,6 +496,36 @@ class _TdsWriter(object):
         """
         self._type = packet_type
         self._pos = 8
+        self._stream_bytes = 0
+        if self._pending_reset and packet_type in _resettable_packet_types:
+            self._first_status = self._pending_reset
+            self._pending_reset = 0
+        else:
+            self._first_status = 0
+
+    def request_reset(self, keep_transaction=False):
+        """ Sets RESETCONNECTION flag in the first packet of next request
+
+        Server resets the connection before processing the request, this saves
+        round trip of calling ``sp_reset_connection``.
+
+        :param keep_transaction: Use RESETCONNECTIONSKIPTRAN flag which does not
+          roll back active transaction
+        """
+        if keep_transaction:
+            self._pending_reset = tds_base.PacketStatus.RESETCONNECTIONSKIPTRAN
+        else:
+            self._pending_reset = tds_base.PacketStatus.RESETCONNECTION
+
+    @property
+    def stream_bytes(self):
+        """ Number of payload bytes written into current packet stream, including buffered ones """
+        return self._stream_bytes + self._pos - _header.size
+
+    @property
+    def reset_pending(self):
+        """ Tells whether reset was requested but request was not sent yet """
+        return self._pending_reset != 0
 
     def pack(self, struc, *args):
         """ Packs and writes structure into stream """
@@ -341,11 +571,18 @@ class _TdsWriter(object):
         """ Writes :class:`Collation` structure into the stream """
         self.write(collation.pack())
 
+    def _can_scatter(self):
+        # only plain sockets support sendmsg, TLS and MARS transports don't
+        return self._scatter_writes and hasattr(self._transport, 'sendmsg')
+
     def write(self, data):
         """ Writes given bytes buffer into the stream
 
         Function returns only when entire buffer is written
         """
+        if len(data) > len(self._buf) and self._can_scatter():
+            self._write_scattered(data)
+            return
         data_off = 0
         while data_off < len(data):
             left = len(self._buf) - self._pos
@@ -377,6 +614,52 @@ class _TdsWriter(object):
         """ Closes current packet stream """
         return self._write_packet(final=True)
 
+    # maximum number of packets sent with single sendmsg call
+    _max_packets_per_send = 64
+
+    def _write_scattered(self, data):
+        """ Writes large buffer into the stream using scatter/gather I/O
+
+        Packet headers are sent together with slices of data without copying
+        data into internal buffer, several packets are sent per system call.
+        Tail of data stays in internal buffer because it can end up in the
+        final packet of the stream.
+        """
+        view = memoryview(data)
+        packet_size = len(self._buf)
+        payload_size = packet_size - _header.size
+        buffered = self._pos - _header.size
+        # first packet consists of already buffered data followed by beginning of data
+        off = packet_size - self._pos
+        _header.pack_into(self._buf, 0, self._type, self._first_status, packet_size, 0, self._packet_no)
+        self._first_status = 0
+        self._packet_no = (self._packet_no + 1) % 256
+        buffers = [memoryview(self._buf)[:self._pos], view[:off]]
+        while len(view) - off > payload_size:
+            if len(buffers) >= 2 * self._max_packets_per_send:
+                self._sendmsg(buffers)
+                buffers = []
+            buffers.append(_header.pack(self._type, 0, packet_size, 0, self._packet_no))
+            self._packet_no = (self._packet_no + 1) % 256
+            buffers.append(view[off:off + payload_size])
+            off += payload_size
+        self._sendmsg(buffers)
+        rest = len(view) - off
+        self._buf[_header.size:_header.size + rest] = view[off:]
+        self._pos = _header.size + rest
+        self._stream_bytes += buffered + len(view) - rest
+
+    def _sendmsg(self, buffers):
+        """ Sends all buffers using sendmsg, handling partial sends """
+        idx = 0
+        while idx < len(buffers):
+            sent = self._transport.sendmsg(buffers[idx:])
+            while idx < len(buffers) and sent >= len(buffers[idx]):
+                sent -= len(buffers[idx])
+                idx += 1
+            if sent:
+                buffers[idx] = memoryview(buffers[idx])[sent:]
+
     def _write_packet(self, final):
         """ Writes single TDS packet into underlying transport.
 
@@ -384,10 +667,16 @@ class _TdsWriter(object):
 
         :param final: True means this is the final packet in substream.
         """
-        status = 1 if final else 0
+        status = tds_base.PacketStatus.EOM if final else 0
+        status |= self._first_status
+        self._first_status = 0
         _header.pack_into(self._buf, 0, self._type, status, self._pos, 0, self._packet_no)
         self._packet_no = (self._packet_no + 1) % 256
-        self._transport.sendall(self._buf[:self._pos])
+        if self._can_scatter():
+            self._transport.sendall(memoryview(self._buf)[:self._pos])
+        else:
+            self._transport.sendall(self._buf[:self._pos])
+        self._stream_bytes += self._pos - _header.size
         self._pos = 8
 
 
@@ -430,10 +719,16 @@ class _TdsSession(object):
         self.ret_status = None
         self.skipped_to_status = False
         self._transport = transport
-        self._reader = _TdsReader(self)
+        if tds.contiguous_reads:
+            self._reader = _TdsContiguousReader(self)
+        else:
+            self._reader = _TdsReader(self)
         self._reader._transport = transport
+        if tds.read_ahead:
+            self._reader.set_read_ahead(tds.read_ahead)
         self._writer = _TdsWriter(self, tds.bufsize)
         self._writer._transport = transport
+        self._writer._scatter_writes = tds.scatter_writes
         self.in_buf_max = 0
         self.state = tds_base.TDS_IDLE
         self._tds = tds
@@ -457,6 +752,17 @@ class _TdsSession(object):
         if logging_enabled:
             logger.info('[%d] %s', self._spid, msg)
 
+    @property
+    def tzinfo_factory(self):
+        """ Factory of timezone objects for decoded values, it is called with offset in minutes """
+        return self._tzinfo_factory
+
+    @tzinfo_factory.setter
+    def tzinfo_factory(self, tzinfo_factory):
+        self._tzinfo_factory = tzinfo_factory
+        # timezone of decoded values of types without offset, created once instead of per value
+        self.utc_tzinfo = None if tzinfo_factory is None else tzinfo_factory(0)
+
     def __repr__(self):
         fmt = "<_TdsSession state={} tds={} messages={} rows_affected={} use_tz={} spid={} in_cancel={}>"
         res = fmt.format(repr(self.state), repr(self._tds), repr(self.messages),
@@ -508,6 +814,14 @@ class _TdsSession(object):
         """
         self.log_response_message('got COLMETADATA')
         r = self._reader
+        cache = self._tds.metadata_cache
+        if cache is not None:
+            buf, start, end = r.buffered()
+            entry = cache.match(buf, start, end)
+            if entry is not None:
+                r.skip(len(entry.raw))
+                return self._begin_result(entry.columns, entry.description, entry.row_decoder)
+            packets_read = r.packets_read
 
         # read number of columns and allocate the columns structure
 
@@ -518,23 +832,15 @@ class _TdsSession(object):
         if num_cols == -1:
             return
 
-        self.param_info = None
-        self.has_status = False
-        self.ret_status = None
-        self.skipped_to_status = False
-        self.rows_affected = tds_base.TDS_NO_COUNT
-        self.more_rows = True
-        self.row = [None] * num_cols
-        self.res_info = info = _Results()
-
         #
         # loop through the columns populating COLINFO struct from
         # server response
         #
+        columns = []
         header_tuple = []
         for col in range(num_cols):
             curcol = tds_base.Column()
-            info.columns.append(curcol)
+            columns.append(curcol)
             self.get_type_info(curcol)
 
             curcol.column_name = r.read_ucs2(r.get_byte())
@@ -549,7 +855,26 @@ class _TdsSession(object):
                  precision,
                  scale,
                  curcol.flags & tds_base.Column.fNullable))
-        info.description = tuple(header_tuple)
+        description = tuple(header_tuple)
+        row_decoder = _RowDecoder(columns)
+        if cache is not None and r.packets_read == packets_read:
+            # token was entirely in the buffer, so its raw bytes are known
+            _, pos, _ = r.buffered()
+            cache.put(_MetadataEntry(bytes(buf[start:pos]), columns, description, row_decoder))
+        return self._begin_result(columns, description, row_decoder)
+
+    def _begin_result(self, columns, description, row_decoder):
+        self.param_info = None
+        self.has_status = False
+        self.ret_status = None
+        self.skipped_to_status = False
+        self.rows_affected = tds_base.TDS_NO_COUNT
+        self.more_rows = True
+        self.row = [None] * len(columns)
+        self.res_info = info = _Results()
+        info.columns = columns
+        info.description = description
+        info.row_decoder = row_decoder
         return info
 
     def process_param(self):
@@ -632,11 +957,9 @@ class _TdsSession(object):
         Stream format url: http://msdn.microsoft.com/en-us/library/dd357254.aspx
         """
         self.log_response_message("got ROW message")
-        r = self._reader
         info = self.res_info
+        info.row_decoder.read_row(self._reader, self.row)
         info.row_count += 1
-        for i, curcol in enumerate(info.columns):
-            curcol.value = self.row[i] = curcol.serializer.read(r)
 
     def process_nbcrow(self):
         """ Reads and handles NBCROW stream.
@@ -646,23 +969,13 @@ class _TdsSession(object):
         Stream format url: http://msdn.microsoft.com/en-us/library/dd304783.aspx
         """
         self.log_response_message("got NBCROW message")
-        r = self._reader
         info = self.res_info
         if not info:
             self.bad_stream('got row without info')
         assert len(info.columns) > 0
+        info.row_decoder.read_nbcrow(self._reader, self.row)
         info.row_count += 1
 
-        # reading bitarray for nulls, 1 represent null values for
-        # corresponding fields
-        nbc = readall(r, (len(info.columns) + 7) // 8)
-        for i, curcol in enumerate(info.columns):
-            if tds_base.my_ord(nbc[i // 8]) & (1 << (i % 8)):
-                value = None
-            else:
-                value = curcol.serializer.read(r)
-            self.row[i] = value
-
     def process_orderby(self):
         """ Reads and processes ORDER stream
 
@@ -688,17 +1001,17 @@ class _TdsSession(object):
             tds_base.TDS_DONEINPROC_TOKEN: 'DONEINPROC',
             tds_base.TDS_DONEPROC_TOKEN: 'DONEPROC',
         }
-        self.end_marker = marker
-        self.more_rows = False
         r = self._reader
         status = r.get_usmallint()
         r.get_usmallint()  # cur_cmd
+        rows_affected = r.get_int8() if tds_base.IS_TDS72_PLUS(self) else r.get_int()
+        self.end_marker = marker
+        self.more_rows = False
         more_results = status & tds_base.TDS_DONE_MORE_RESULTS != 0
         was_cancelled = status & tds_base.TDS_DONE_CANCELLED != 0
         done_count_valid = status & tds_base.TDS_DONE_COUNT != 0
         if self.res_info:
             self.res_info.more_results = more_results
-        rows_affected = r.get_int8() if tds_base.IS_TDS72_PLUS(self) else r.get_int()
         self.log_response_message("got {} message, more_res={}, cancelled={}, rows_affected={}".format(
             code_to_str[marker], more_results, was_cancelled, rows_affected))
         if was_cancelled or (not more_results and not self.in_cancel):
@@ -790,6 +1103,9 @@ class _TdsSession(object):
             }
             # OLDVALUE = 0x00, 0x00
             r.get_usmallint()
+        elif type_id == tds_base.TDS_ENV_RESET_COMPLETION_ACK:
+            logger.info('connection was reset')
+            skipall(r, size - 1)
         else:
             logger.warning("unknown env type: {0}, skipping".format(type_id))
             # discard byte values, not still supported
@@ -805,7 +1121,7 @@ class _TdsSession(object):
         pdu_size = r.get_smallint()
         if not self.authentication:
             raise tds_base.Error('Got unexpected token')
-        packet = self.authentication.handle_next(readall(r, pdu_size))
+        packet = self.authentication.handle_next(r.readall(pdu_size))
         if packet:
             w.write(packet)
             w.flush()
@@ -959,6 +1275,15 @@ class _TdsSession(object):
                 params.append(self.make_param('', parameter))
             return params
 
+    def request_reset(self, keep_transaction=False):
+        """ Makes server reset the connection before processing next request,
+        see :func:`_TdsWriter.request_reset`
+        """
+        self._writer.request_reset(keep_transaction)
+        if not keep_transaction:
+            # transaction will be rolled back by the reset
+            self.conn.tds72_transaction = 0
+
     def cancel_if_pending(self):
         """ Cancels current pending request.
 
@@ -989,47 +1314,79 @@ class _TdsSession(object):
         self.output_params = {}
         self.cancel_if_pending()
         self.res_info = None
+        with self.querying_context(tds_base.PacketType.RPC):
+            if tds_base.IS_TDS72_PLUS(self):
+                self._start_query()
+            self._write_rpc(rpc_name, params, flags)
+
+    def submit_rpc_batch(self, requests):
+        """ Sends several RPC requests in one request stream.
+
+        Requests are separated by batch flag and executed by the server one
+        after another, response should be processed by :func:`process_rpc_batch`.
+        Server continues to execute remaining requests if one of them fails.
+
+        This call will transition session into pending state.
+
+        :param requests: Sequence of tuples of RPC name, parameters and flags, see :func:`submit_rpc`
+        """
+        logger.info('Sending batch of %d RPCs', len(requests))
+        self.messages = []
+        self.output_params = {}
+        self.cancel_if_pending()
+        self.res_info = None
         w = self._writer
+        batch_flag = 0xff if tds_base.IS_TDS72_PLUS(self) else 0x80
         with self.querying_context(tds_base.PacketType.RPC):
             if tds_base.IS_TDS72_PLUS(self):
                 self._start_query()
-            if tds_base.IS_TDS71_PLUS(self) and isinstance(rpc_name, tds_base.InternalProc):
-                w.put_smallint(-1)
-                w.put_smallint(rpc_name.proc_id)
-            else:
-                if isinstance(rpc_name, tds_base.InternalProc):
-                    rpc_name = rpc_name.name
-                w.put_smallint(len(rpc_name))
-                w.write_ucs2(rpc_name)
+            for i, (rpc_name, params, flags) in enumerate(requests):
+                if i:
+                    w.put_byte(batch_flag)
+                self._write_rpc(rpc_name, params, flags)
+
+    def _write_rpc(self, rpc_name, params, flags):
+        w = self._writer
+        if tds_base.IS_TDS71_PLUS(self) and isinstance(rpc_name, tds_base.InternalProc):
+            w.put_smallint(-1)
+            w.put_smallint(rpc_name.proc_id)
+        else:
+            if isinstance(rpc_name, tds_base.InternalProc):
+                rpc_name = rpc_name.name
+            w.put_smallint(len(rpc_name))
+            w.write_ucs2(rpc_name)
+        #
+        # TODO support flags
+        # bit 0 (1 as flag) in TDS7/TDS5 is "recompile"
+        # bit 1 (2 as flag) in TDS7+ is "no metadata" bit this will prevent sending of column infos
+        #
+        w.put_usmallint(flags)
+        self._out_params_indexes = []
+        for i, param in enumerate(params):
+            if param.flags & tds_base.fByRefValue:
+                self._out_params_indexes.append(i)
+            w.put_byte(len(param.column_name))
+            w.write_ucs2(param.column_name)
             #
-            # TODO support flags
-            # bit 0 (1 as flag) in TDS7/TDS5 is "recompile"
-            # bit 1 (2 as flag) in TDS7+ is "no metadata" bit this will prevent sending of column infos
+            # TODO support other flags (use defaul null/no metadata)
+            # bit 1 (2 as flag) in TDS7+ is "default value" bit
+            # (what's the meaning of "default value" ?)
             #
-            w.put_usmallint(flags)
-            self._out_params_indexes = []
-            for i, param in enumerate(params):
-                if param.flags & tds_base.fByRefValue:
-                    self._out_params_indexes.append(i)
-                w.put_byte(len(param.column_name))
-                w.write_ucs2(param.column_name)
-                #
-                # TODO support other flags (use defaul null/no metadata)
-                # bit 1 (2 as flag) in TDS7+ is "default value" bit
-                # (what's the meaning of "default value" ?)
-                #
-                w.put_byte(param.flags)
+            w.put_byte(param.flags)
 
-                # TYPE_INFO structure: https://msdn.microsoft.com/en-us/library/dd358284.aspx
+            # TYPE_INFO structure: https://msdn.microsoft.com/en-us/library/dd358284.aspx
+            # serializer can be chosen in advance, e.g. by template cache
+            serializer = param.serializer
+            if serializer is None:
                 serializer = param.choose_serializer(
                     type_factory=self._tds.type_factory,
                     collation=self._tds.collation or raw_collation
                 )
-                type_id = serializer.type
-                w.put_byte(type_id)
-                serializer.write_info(w)
+            type_id = serializer.type
+            w.put_byte(type_id)
+            serializer.write_info(w)
 
-                serializer.write(w, param.value)
+            serializer.write(w, param.value)
 
     def submit_plain_query(self, operation):
         """ Sends a plain query to server.
@@ -1052,52 +1409,137 @@ class _TdsSession(object):
                 self._start_query()
             w.write_ucs2(operation)
 
-    def submit_bulk(self, metadata, rows):
+    def submit_bulk(self, metadata, rows, max_rows=None, max_bytes=None):
         """ Sends insert bulk command.
 
         Spec: http://msdn.microsoft.com/en-us/library/dd358082.aspx
 
+        When limits are given, sending stops after row which reaches any of them,
+        rest of rows stays in the iterator.
+
         :param metadata: A list of :class:`Column` instances.
         :param rows: A collection of rows, each row is a collection of values.
-        :return:
+        :param max_rows: Maximum number of rows to send
+        :param max_bytes: Size of stream in bytes after which no more rows are sent
+        :return: Number of sent rows
         """
         logger.info('Sending INSERT BULK')
-        num_cols = len(metadata)
+        with self.querying_context(tds_base.PacketType.BULK):
+            serializers = self._write_bulk_metadata(metadata)
+            count = self._write_bulk_rows(serializers, rows, max_rows, max_bytes)
+            self._write_bulk_done()
+        return count
+
+    def submit_bulk_columns(self, metadata, columns):
+        """ Sends insert bulk command taking values column by column.
+
+        Columns of nullable integer, float and bit types are encoded in bulk:
+        values of rows which have no NULLs are copied into rows being sent
+        straight from column buffers, such as :class:`array.array` or NumPy arrays,
+        without creating Python objects for individual values.  Little-endian
+        buffers of matching item type are copied as is, other values are packed first.
+        If some column has a different type all values are encoded one by one.
+
+        :param metadata: A list of :class:`Column` instances.
+        :param columns: A list with item for every column in metadata, item is either sequence of values,
+          or tuple of sequence of values and validity, where validity has 0 for NULL values and 1 otherwise,
+          e.g. :class:`ColumnData`.  In sequence of values None also means NULL.
+        :return: Number of sent rows
+        """
+        logger.info('Sending INSERT BULK')
+        with self.querying_context(tds_base.PacketType.BULK):
+            serializers = self._write_bulk_metadata(metadata)
+            buffers = _bulk_column_buffers(serializers, columns)
+            if buffers is None:
+                count = self._write_bulk_rows(serializers, _bulk_columns_rows(columns))
+            else:
+                self._write_bulk_buffers(serializers, buffers)
+                count = buffers[0].num_rows if buffers else 0
+            self._write_bulk_done()
+        return count
+
+    def _write_bulk_metadata(self, metadata):
         w = self._writer
         serializers = []
-        with self.querying_context(tds_base.PacketType.BULK):
-            w.put_byte(tds_base.TDS7_RESULT_TOKEN)
-            w.put_usmallint(num_cols)
-            for col in metadata:
-                if tds_base.IS_TDS72_PLUS(self):
-                    w.put_uint(col.column_usertype)
-                else:
-                    w.put_usmallint(col.column_usertype)
-                w.put_usmallint(col.flags)
+        w.put_byte(tds_base.TDS7_RESULT_TOKEN)
+        w.put_usmallint(len(metadata))
+        for col in metadata:
+            if tds_base.IS_TDS72_PLUS(self):
+                w.put_uint(col.column_usertype)
+            else:
+                w.put_usmallint(col.column_usertype)
+            w.put_usmallint(col.flags)
+            serializer = col.serializer
+            if serializer is None:
                 serializer = col.choose_serializer(
                     type_factory=self._tds.type_factory,
                     collation=self._tds.collation,
                 )
-                type_id = serializer.type
-                w.put_byte(type_id)
-                serializers.append(serializer)
-                serializer.write_info(w)
-                w.put_byte(len(col.column_name))
-                w.write_ucs2(col.column_name)
-            for row in rows:
+            type_id = serializer.type
+            w.put_byte(type_id)
+            serializers.append(serializer)
+            serializer.write_info(w)
+            w.put_byte(len(col.column_name))
+            w.write_ucs2(col.column_name)
+        return serializers
+
+    def _write_bulk_rows(self, serializers, rows, max_rows=None, max_bytes=None):
+        w = self._writer
+        count = 0
+        for row in rows:
+            w.put_byte(tds_base.TDS_ROW_TOKEN)
+            for i, serializer in enumerate(serializers):
+                serializer.write(w, row[i])
+            count += 1
+            if (max_rows is not None and count >= max_rows) or (max_bytes is not None and w.stream_bytes >= max_bytes):
+                break
+        return count
+
+    def _write_bulk_buffers(self, serializers, buffers):
+        w = self._writer
+        num_rows = buffers[0].num_rows if buffers else 0
+        nulls = set()
+        for buf in buffers:
+            nulls.update(buf.null_rows())
+        nulls = sorted(nulls)
+        nulls.append(num_rows)
+        # values of each row have length byte followed by value
+        stride = 1 + sum(1 + buf.width for buf in buffers)
+        token = six.int2byte(tds_base.TDS_ROW_TOKEN)
+        begin = 0
+        for null_row in nulls:
+            # rows without NULLs are encoded in chunks by strided copies from column buffers
+            for start in range(begin, null_row, _bulk_chunk_rows):
+                end = min(start + _bulk_chunk_rows, null_row)
+                count = end - start
+                chunk = bytearray(count * stride)
+                chunk[0::stride] = token * count
+                offset = 1
+                for buf in buffers:
+                    width = buf.width
+                    chunk[offset::stride] = six.int2byte(width) * count
+                    data = buf.data[start * width:end * width]
+                    for i in range(width):
+                        chunk[offset + 1 + i::stride] = data[i::width]
+                    offset += 1 + width
+                w.write(chunk)
+            if null_row < num_rows:
                 w.put_byte(tds_base.TDS_ROW_TOKEN)
-                for i, col in enumerate(metadata):
-                    serializers[i].write(w, row[i])
-
-            # https://msdn.microsoft.com/en-us/library/dd340421.aspx
-            w.put_byte(tds_base.TDS_DONE_TOKEN)
-            w.put_usmallint(tds_base.TDS_DONE_FINAL)
-            w.put_usmallint(0)  # curcmd
-            # row count
-            if tds_base.IS_TDS72_PLUS(self):
-                w.put_int8(0)
-            else:
-                w.put_int(0)
+                for serializer, buf in zip(serializers, buffers):
+                    serializer.write(w, buf.value(null_row))
+            begin = null_row + 1
+
+    def _write_bulk_done(self):
+        w = self._writer
+        # https://msdn.microsoft.com/en-us/library/dd340421.aspx
+        w.put_byte(tds_base.TDS_DONE_TOKEN)
+        w.put_usmallint(tds_base.TDS_DONE_FINAL)
+        w.put_usmallint(0)  # curcmd
+        # row count
+        if tds_base.IS_TDS72_PLUS(self):
+            w.put_int8(0)
+        else:
+            w.put_int(0)
 
     def put_cancel(self):
         """ Sends a cancel request to the server.
@@ -1333,10 +1775,10 @@ class _TdsSession(object):
                 raise self.bad_stream('Server returned unexpected ENCRYPT_ON value')
             else:
                 # encrypt login packet only
-                tls.establish_channel(self)
+                self.establish_channel()
         elif crypt_flag == PreLoginEnc.ENCRYPT_ON:
             # encrypt entire connection
-            tls.establish_channel(self)
+            self.establish_channel()
         elif crypt_flag == PreLoginEnc.ENCRYPT_REQ:
             if login.enc_flag == PreLoginEnc.ENCRYPT_NOT_SUP:
                 # connection terminated by server and client
@@ -1344,7 +1786,7 @@ class _TdsSession(object):
                                      'enable encryption and try connecting again')
             else:
                 # encrypt entire connection
-                tls.establish_channel(self)
+                self.establish_channel()
         elif crypt_flag == PreLoginEnc.ENCRYPT_NOT_SUP:
             if login.enc_flag == PreLoginEnc.ENCRYPT_ON:
                 # connection terminated by server and client
@@ -1353,6 +1795,10 @@ class _TdsSession(object):
         else:
             self.bad_stream('Unexpected value of enc_flag returned by server: {}'.format(crypt_flag))
 
+    def establish_channel(self):
+        """ Performs TLS handshake and switches session to encrypted channel """
+        tls.establish_channel(self)
+
     def tds7_send_login(self, login):
         # https://msdn.microsoft.com/en-us/library/dd304019.aspx
         option_flag2 = login.option_flag2
@@ -1496,34 +1942,41 @@ class _TdsSession(object):
         tds_base.TDS74: tds_base.TDS74,
         }
 
+    def process_loginack(self):
+        """ Reads and processes LOGINACK stream
+
+        Stream format url: https://msdn.microsoft.com/en-us/library/dd340651.aspx
+        """
+        r = self._reader
+        size = r.get_smallint()
+        r.get_byte()  # interface
+        version = r.get_uint_be()
+        self.conn.tds_version = self._SERVER_TO_CLIENT_MAPPING.get(version, version)
+        if not tds_base.IS_TDS7_PLUS(self):
+            self.bad_stream('Only TDS 7.0 and higher are supported')
+        # get server product name
+        # ignore product name length, some servers seem to set it incorrectly
+        r.get_byte()
+        size -= 10
+        self.conn.product_name = r.read_ucs2(size // 2)
+        product_version = r.get_uint_be()
+        logger.info('Got LOGINACK tds_ver=%x srv_name=%s srv_ver=%x',
+                    self.conn.tds_version, self.conn.product_name, product_version)
+        # MSSQL 6.5 and 7.0 seem to return strange values for this
+        # using TDS 4.2, something like 5F 06 32 FF for 6.50
+        self.conn.product_version = product_version
+        if self.authentication:
+            self.authentication.close()
+            self.authentication = None
+
     def process_login_tokens(self):
         r = self._reader
         succeed = False
         while True:
             marker = r.get_byte()
             if marker == tds_base.TDS_LOGINACK_TOKEN:
-                # https://msdn.microsoft.com/en-us/library/dd340651.aspx
                 succeed = True
-                size = r.get_smallint()
-                r.get_byte()  # interface
-                version = r.get_uint_be()
-                self.conn.tds_version = self._SERVER_TO_CLIENT_MAPPING.get(version, version)
-                if not tds_base.IS_TDS7_PLUS(self):
-                    self.bad_stream('Only TDS 7.0 and higher are supported')
-                # get server product name
-                # ignore product name length, some servers seem to set it incorrectly
-                r.get_byte()
-                size -= 10
-                self.conn.product_name = r.read_ucs2(size // 2)
-                product_version = r.get_uint_be()
-                logger.info('Got LOGINACK tds_ver=%x srv_name=%s srv_ver=%x',
-                            self.conn.tds_version, self.conn.product_name, product_version)
-                # MSSQL 6.5 and 7.0 seem to return strange values for this
-                # using TDS 4.2, something like 5F 06 32 FF for 6.50
-                self.conn.product_version = product_version
-                if self.authentication:
-                    self.authentication.close()
-                    self.authentication = None
+                self.process_loginack()
             else:
                 self.process_token(marker)
                 if marker == tds_base.TDS_DONE_TOKEN:
@@ -1583,6 +2036,157 @@ class _TdsSession(object):
 
         return self.row
 
+    def fetch_rows(self, count):
+        """ Fetches up to count rows of current result set
+
+        Unlike :func:`fetchone` it decodes rows in a tight loop while next
+        token is ROW or NBCROW, without going through token dispatch and
+        state transitions for every row.
+
+        :param count: Maximum number of rows to fetch
+        :returns: List of rows, each row is a new list of values; list is
+          shorter than count when result set is exhausted
+        """
+        if self.res_info is None:
+            raise tds_base.ProgrammingError("Previous statement didn't produce any results")
+
+        if self.skipped_to_status:
+            raise tds_base.ProgrammingError("Unable to fetch any rows after accessing return_status")
+
+        rows = []
+        if not self.more_rows or count <= 0:
+            return rows
+        r = self._reader
+        info = self.res_info
+        decoder = info.row_decoder
+        num_cols = len(info.columns)
+        self.set_state(tds_base.TDS_READING)
+        try:
+            while True:
+                try:
+                    marker = r.get_byte()
+                except tds_base.TimeoutError:
+                    self.set_state(tds_base.TDS_PENDING)
+                    raise
+                except:
+                    self._tds.close()
+                    raise
+                if marker == tds_base.TDS_ROW_TOKEN:
+                    row = [None] * num_cols
+                    decoder.read_row(r, row)
+                elif marker == tds_base.TDS_NBC_ROW_TOKEN:
+                    row = [None] * num_cols
+                    decoder.read_nbcrow(r, row)
+                elif marker in (tds_base.TDS_DONE_TOKEN, tds_base.TDS_DONEPROC_TOKEN, tds_base.TDS_DONEINPROC_TOKEN):
+                    self.process_end(marker)
+                    break
+                else:
+                    self.process_token(marker)
+                    continue
+                rows.append(row)
+                if len(rows) >= count:
+                    break
+        finally:
+            info.row_count += len(rows)
+        return rows
+
+    def fetch_columns(self, max_rows=None, pending_rows=()):
+        """ Fetches rows of current result set into per-column containers
+
+        Values of integer columns are stored in ``array.array('q')``, of
+        floating point columns in ``array.array('d')``, of bit columns in
+        ``array.array('b')``, values of other columns are stored in lists.
+        NULL values are stored as zeros (or ``None`` in lists) and marked
+        with 0 in column's validity ``bytearray``.
+
+        :param max_rows: Maximum number of rows to fetch, ``None`` fetches all remaining rows
+        :param pending_rows: Rows which were already fetched from the stream, they are
+          put before rows read from the stream
+        :returns: List of :class:`ColumnData`
+        """
+        if self.res_info is None:
+            raise tds_base.ProgrammingError("Previous statement didn't produce any results")
+
+        if self.skipped_to_status:
+            raise tds_base.ProgrammingError("Unable to fetch any rows after accessing return_status")
+
+        info = self.res_info
+        result = []
+        appenders = []
+        for col in info.columns:
+            typecode = _column_array_typecode(col.serializer)
+            if typecode is None:
+                values = []
+                null_value = None
+            else:
+                values = array.array(typecode)
+                null_value = 0
+            validity = bytearray()
+            result.append(ColumnData(col.column_name, values, validity))
+            appenders.append((values.append, validity.append, null_value))
+
+        def append_row(row):
+            for value, (append, append_validity, null_value) in zip(row, appenders):
+                if value is None:
+                    append(null_value)
+                    append_validity(0)
+                else:
+                    append(value)
+                    append_validity(1)
+
+        count = 0
+        for row in pending_rows:
+            if max_rows is not None and count >= max_rows:
+                break
+            append_row(row)
+            count += 1
+        if not self.more_rows or (max_rows is not None and count >= max_rows):
+            return result
+        r = self._reader
+        decoder = info.row_decoder
+        row = [None] * len(info.columns)
+        self.set_state(tds_base.TDS_READING)
+        while True:
+            marker = self.next_row_token()
+            if marker == tds_base.TDS_ROW_TOKEN:
+                decoder.read_row(r, row)
+            elif marker == tds_base.TDS_NBC_ROW_TOKEN:
+                decoder.read_nbcrow(r, row)
+            else:
+                break
+            append_row(row)
+            info.row_count += 1
+            count += 1
+            if max_rows is not None and count >= max_rows:
+                break
+        return result
+
+    def next_row_token(self):
+        """ Processes tokens until ROW or NBCROW token or end of result set
+
+        Session should be in TDS_READING state, reader is left positioned
+        at the beginning of row's data.
+
+        :returns: TDS_ROW_TOKEN or TDS_NBC_ROW_TOKEN, or None when result set is over
+        """
+        r = self._reader
+        while True:
+            try:
+                marker = r.get_byte()
+            except tds_base.TimeoutError:
+                self.set_state(tds_base.TDS_PENDING)
+                raise
+            except:
+                self._tds.close()
+                raise
+            if marker == tds_base.TDS_ROW_TOKEN or marker == tds_base.TDS_NBC_ROW_TOKEN:
+                return marker
+            elif marker in (tds_base.TDS_DONE_TOKEN, tds_base.TDS_DONEPROC_TOKEN, tds_base.TDS_DONEINPROC_TOKEN):
+                self.process_end(marker)
+                return None
+            else:
+                self.process_token(marker)
+
     def next_row(self):
         if not self.more_rows:
             return False
@@ -1617,6 +2221,14 @@ class _TdsSession(object):
     def process_rpc(self):
         self.done_flags = 0
         self.return_value_index = 0
+        return self.process_rpc_results()
+
+    def process_rpc_results(self):
+        """ Processes tokens of RPC response until first result set or end of response
+
+        Unlike :func:`process_rpc` it does not reset state of the response,
+        so it can be used to resume processing.
+        """
         while True:
             marker = self.get_token_id()
             if marker == tds_base.TDS7_RESULT_TOKEN:
@@ -1631,6 +2243,42 @@ class _TdsSession(object):
             else:
                 self.process_token(marker)
 
+    def process_rpc_batch(self):
+        """ Processes response of requests sent by :func:`submit_rpc_batch`
+
+        Result sets produced by requests are skipped.
+
+        Whole response is consumed even if some requests failed, after that
+        error of the first failed request is raised.
+
+        :returns: List of row counts, one per request, count is -1 if request did not report it.
+          For every request first reported count is taken, same as by :func:`find_result_or_done`.
+        """
+        counts = []
+        count = -1
+        error = None
+        while True:
+            marker = self.get_token_id()
+            if marker in (tds_base.TDS_DONE_TOKEN, tds_base.TDS_DONEPROC_TOKEN, tds_base.TDS_DONEINPROC_TOKEN):
+                try:
+                    self.process_end(marker)
+                except tds_base.DatabaseError as e:
+                    if error is None:
+                        error = e
+                if count == -1:
+                    count = self.rows_affected
+                if marker != tds_base.TDS_DONEINPROC_TOKEN:
+                    # end of current request
+                    counts.append(count)
+                    count = -1
+                    if not self.done_flags & tds_base.TDS_DONE_MORE_RESULTS:
+                        break
+            else:
+                self.process_token(marker)
+        if error is not None:
+            raise error
+        return counts
+
     def complete_rpc(self):
         # go through all result sets
         while self.next_set():
@@ -1679,11 +2327,15 @@ class _TdsSocket(object):
         self.use_tz = use_tz
         self.type_factory = tds_types.SerializerFactory(self.tds_version)
         self.type_inferrer = None
+        self.metadata_cache = _MetadataCache(64)
         self.query_timeout = 0
         self._smp_manager = None
         self._main_session = None
         self._login = None
         self.route = None
+        self.contiguous_reads = False
+        self.read_ahead = 0
+        self.scatter_writes = False
 
     def __repr__(self):
         fmt = "<_TdsSocket tran={} mars={} tds_version={} use_tz={}>"
@@ -1694,6 +2346,9 @@ class _TdsSocket(object):
         self._login = login
         self.bufsize = login.blocksize
         self.query_timeout = login.query_timeout
+        self.contiguous_reads = login.contiguous_reads
+        self.scatter_writes = login.scatter_writes
+        self.metadata_cache = _MetadataCache(login.metadata_cache_size) if login.metadata_cache_size > 0 else None
         self._main_session = _TdsSession(self, sock, tzinfo_factory)
         self.sock = sock
         self.tds_version = login.tds_version
@@ -1727,6 +2382,10 @@ class _TdsSocket(object):
                 self,
                 self._smp_manager.create_session(),
                 tzinfo_factory)
+        # read-ahead is enabled only after login, when transport would not be
+        # switched between TLS and clear channels anymore
+        self.read_ahead = login.read_ahead
+        self._main_session._reader.set_read_ahead(self.read_ahead)
         self._is_connected = True
         q = []
         if login.database and self.env.database != login.database:
@@ -1768,6 +2427,329 @@ class _Results(object):
     def __init__(self):
             self.columns = []
             self.row_count = 0
+            self.row_decoder = None
+
+
+#: Parsed COLMETADATA token, ``raw`` are bytes of the token without token type
+_MetadataEntry = collections.namedtuple('_MetadataEntry', ['raw', 'columns', 'description', 'row_decoder'])
+
+
+class _MetadataCache(object):
+    """ Cache of parsed COLMETADATA tokens of a connection
+
+    When a token is entirely buffered by the reader its bytes are compared
+    with cached tokens, on a match columns, description and row decoder built
+    for the first occurrence of the token are reused instead of parsing it
+    and creating new serializers.  Cached tokens are indexed by a short prefix,
+    which is always part of a token: number of columns, user type and flags
+    of the first column.
+
+    Results with columns whose serializers keep reading state, e.g. chunk
+    handlers of MAX and TEXT columns, are not cached.
+
+    :param max_size: Maximum number of cached tokens, cache is cleared when it is full
+    """
+    _prefix_size = 8
+    _max_per_prefix = 8
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self._size
+
+    def match(self, buf, start, end):
+        """ Returns :class:`_MetadataEntry` which matches bytes of buffer at start or ``None`` """
+        entries = self._entries.get(bytes(buf[start:start + self._prefix_size]))
+        if entries is not None:
+            for entry in entries:
+                size = len(entry.raw)
+                if size <= end - start and buf[start:start + size] == entry.raw:
+                    self.hits += 1
+                    return entry
+        self.misses += 1
+        return None
+
+    def put(self, entry):
+        if len(entry.raw) < self._prefix_size:
+            return
+        for col in entry.columns:
+            if hasattr(col.serializer, '_chunk_handler'):
+                return
+        if self._size >= self._max_size:
+            self._entries.clear()
+            self._size = 0
+        entries = self._entries.setdefault(entry.raw[:self._prefix_size], [])
+        if len(entries) >= self._max_per_prefix:
+            entries.pop(0)
+            self._size -= 1
+        entries.append(entry)
+        self._size += 1
+
+
+#: Values of a single column returned by :func:`pytds.Cursor.fetch_columns`,
+#: validity is a bytearray which has 0 for NULL values and 1 otherwise
+ColumnData = collections.namedtuple('ColumnData', ['name', 'values', 'validity'])
+
+# typecodes of arrays used to store values of fixed size columns
+_column_array_typecodes = (
+    ((tds_types.IntNSerializer, tds_types.BigIntSerializer, tds_types.IntSerializer,
+      tds_types.SmallIntSerializer, tds_types.TinyIntSerializer), 'q'),
+    ((tds_types.FloatNSerializer, tds_types.FloatSerializer, tds_types.RealSerializer), 'd'),
+    ((tds_types.BitNSerializer, tds_types.BitSerializer), 'b'),
+)
+
+
+def _column_array_typecode(serializer):
+    """ Returns typecode of array.array which can store values of column
+    with given serializer, or None if values should be stored in a list
+    """
+    for classes, typecode in _column_array_typecodes:
+        if isinstance(serializer, classes):
+            return typecode
+    return None
+
+
+# wire formats of fixed size types which can be read as a part of combined
+# struct, and functions converting unpacked values into Python values
+_fixed_size_formats = {
+    tds_types.BitSerializer: ('B', bool),
+    tds_types.TinyIntSerializer: ('B', None),
+    tds_types.SmallIntSerializer: ('h', None),
+    tds_types.IntSerializer: ('l', None),
+    tds_types.BigIntSerializer: ('q', None),
+    tds_types.RealSerializer: ('f', None),
+    tds_types.FloatSerializer: ('d', None),
+}
+
+
+# number of rows encoded at once by :func:`_TdsSession.submit_bulk_columns`
+_bulk_chunk_rows = 8192
+
+_little_endian = sys.byteorder == 'little'
+
+# translation table which maps all nonzero bytes to 1
+_nonzero_to_one = b'\x00' + b'\x01' * 255
+
+_signed_int_formats = frozenset('bhilqn')
+
+
+def _bulk_value_format(serializer):
+    """ Returns struct format of values of column which can be encoded
+    by :func:`_TdsSession.submit_bulk_columns` in bulk, or None
+    """
+    if isinstance(serializer, tds_types.IntNSerializer):
+        return {1: 'B', 2: 'h', 4: 'i', 8: 'q'}[serializer.size]
+    elif isinstance(serializer, tds_types.FloatNSerializer):
+        return {4: 'f', 8: 'd'}[serializer.size]
+    elif isinstance(serializer, tds_types.BitNSerializer):
+        return '?'
+    return None
+
+
+def _can_copy_buffer(view, fmt):
+    """ Tells whether items of memoryview have the same binary representation as little-endian values
+    of given struct format
+    """
+    item_format = view.format.lstrip('@=<')
+    if not _little_endian or len(item_format) != 1 or view.ndim != 1:
+        return False
+    if view.itemsize != struct.calcsize('<' + fmt):
+        return False
+    if fmt == '?':
+        return True
+    elif fmt in 'fd':
+        return item_format in 'fd'
+    elif fmt == 'B':
+        return item_format == 'B'
+    else:
+        return item_format in _signed_int_formats
+
+
+class _BulkColumnBuffer(object):
+    """ Values of a column as little-endian binary data
+
+    :param data: Bytes of values
+    :param fmt: Struct format of a value
+    :param validity: Bytes which have 0 for NULL values and 1 otherwise, or None if there are no NULLs
+    """
+    def __init__(self, data, fmt, validity):
+        self.data = data
+        self.width = struct.calcsize('<' + fmt)
+        self.num_rows = len(data) // self.width
+        self._struct = struct.Struct('<' + fmt)
+        self._validity = validity
+
+    def null_rows(self):
+        validity = self._validity
+        if validity is None:
+            return
+        pos = validity.find(b'\x00')
+        while pos != -1:
+            yield pos
+            pos = validity.find(b'\x00', pos + 1)
+
+    def value(self, row):
+        if self._validity is not None and self._validity[row:row + 1] == b'\x00':
+            return None
+        return self._struct.unpack_from(self.data, row * self.width)[0]
+
+
+def _split_column(column):
+    if isinstance(column, ColumnData):
+        return column.values, column.validity
+    elif isinstance(column, tuple):
+        values, validity = column
+        return values, validity
+    return column, None
+
+
+def _bulk_column_buffers(serializers, columns):
+    """ Converts columns given to :func:`_TdsSession.submit_bulk_columns` into list
+    of :class:`_BulkColumnBuffer`, or returns None if some column can't be encoded in bulk
+    """
+    if len(serializers) != len(columns):
+        raise ValueError('Number of columns does not match metadata')
+    formats = [_bulk_value_format(serializer) for serializer in serializers]
+    if None in formats:
+        return None
+    buffers = []
+    num_rows = None
+    for fmt, column in zip(formats, columns):
+        values, validity = _split_column(column)
+        if num_rows is None:
+            num_rows = len(values)
+        elif len(values) != num_rows:
+            raise ValueError('All columns should have the same number of values')
+        try:
+            view = memoryview(values)
+        except TypeError:
+            view = None
+        if view is not None and _can_copy_buffer(view, fmt):
+            data = view.tobytes()
+            if fmt == '?':
+                data = data.translate(_nonzero_to_one)
+        else:
+            values = list(values)
+            if validity is None and None in values:
+                validity = bytearray(0 if value is None else 1 for value in values)
+                values = [0 if value is None else value for value in values]
+            elif validity is not None:
+                values = [0 if value is None else value for value in values]
+            data = struct.pack('<{0}{1}'.format(num_rows, fmt), *values)
+        if validity is not None:
+            validity = bytes(bytearray(validity)).translate(_nonzero_to_one)
+            if len(validity) != num_rows:
+                raise ValueError('Validity should have one item per value')
+        buffers.append(_BulkColumnBuffer(data, fmt, validity))
+    return buffers
+
+
+def _slice_bulk_columns(columns, start, end):
+    """ Returns rows from start to end of columns given to :func:`_TdsSession.submit_bulk_columns` """
+    result = []
+    for column in columns:
+        if isinstance(column, ColumnData):
+            result.append(ColumnData(column.name, column.values[start:end], column.validity[start:end]))
+        elif isinstance(column, tuple):
+            values, validity = column
+            result.append((values[start:end], validity[start:end]))
+        else:
+            result.append(column[start:end])
+    return result
+
+
+def _bulk_columns_rows(columns):
+    """ Iterates over rows of columns given to :func:`_TdsSession.submit_bulk_columns` """
+    iterables = []
+    for column in columns:
+        values, validity = _split_column(column)
+        if validity is None:
+            iterables.append(values)
+        else:
+            iterables.append(None if not valid else value
+                             for value, valid in six.moves.zip(values, bytearray(validity)))
+    return six.moves.zip(*iterables)
+
+
+class _RowDecoder(object):
+    """ Decoder of ROW and NBCROW streams compiled for a particular list of columns
+
+    Runs of consecutive fixed size columns are read with a single combined
+    struct, other columns are read by their serializers.
+    NBCROW null bitmap is converted into an integer mask and tested against
+    precomputed masks of columns and runs.
+    """
+    # limit for size of combined struct, so it never spans more than two packets
+    max_run_size = 256
+
+    def __init__(self, columns):
+        self._nbc_size = (len(columns) + 7) // 8
+        self._converters = []
+        steps = []
+        run = None
+        for i, col in enumerate(columns):
+            fixed = _fixed_size_formats.get(type(col.serializer))
+            if fixed is None:
+                steps.append((i, 1, None, col.serializer, 1 << i, None))
+                run = None
+                continue
+            fmt, converter = fixed
+            if converter is not None:
+                self._converters.append((i, converter))
+            if run is None or struct.calcsize('<' + run[1] + fmt) > self.max_run_size:
+                run = [i, '', []]
+                steps.append(run)
+            run[1] += fmt
+            run[2].append((i, 1 << i, struct.Struct('<' + fmt)))
+        self._steps = []
+        for step in steps:
+            if isinstance(step, list):
+                first, fmt, cols = step
+                mask = 0
+                for _, bit, _ in cols:
+                    mask |= bit
+                step = (first, len(cols), struct.Struct('<' + fmt), None, mask, tuple(cols))
+            self._steps.append(step)
+
+    def read_row(self, r, row):
+        """ Reads values of ROW stream into row list """
+        for first, count, struc, serializer, _, _ in self._steps:
+            if struc is None:
+                row[first] = serializer.read(r)
+            else:
+                row[first:first + count] = r.unpack(struc)
+        for i, converter in self._converters:
+            row[i] = converter(row[i])
+
+    def read_nbcrow(self, r, row):
+        """ Reads values of NBCROW stream into row list """
+        # bitarray for nulls, 1 represent null values for corresponding fields
+        mask = 0
+        for i, b in enumerate(bytearray(r.readall(self._nbc_size))):
+            if b:
+                mask |= b << (i * 8)
+        if not mask:
+            return self.read_row(r, row)
+        for first, count, struc, serializer, step_mask, cols in self._steps:
+            if not mask & step_mask:
+                if struc is None:
+                    row[first] = serializer.read(r)
+                else:
+                    row[first:first + count] = r.unpack(struc)
+            elif struc is None:
+                row[first] = None
+            else:
+                # some of the run's columns are NULL, read it column by column
+                for i, bit, col_struc in cols:
+                    row[i] = None if mask & bit else r.unpack(col_struc)[0]
+        for i, converter in self._converters:
+            if row[i] is not None:
+                row[i] = converter(row[i])
 
 
 def _parse_instances(msg):
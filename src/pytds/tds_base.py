@@ -34,6 +34,14 @@ class PacketType:
     PRELOGIN = 18
 
 
+# https://msdn.microsoft.com/en-us/library/dd358342.aspx
+class PacketStatus:
+    EOM = 0x01  # end of message
+    IGNORE = 0x02
+    RESETCONNECTION = 0x08
+    RESETCONNECTIONSKIPTRAN = 0x10
+
+
 # mssql login options flags
 # option_flag1_values
 TDS_BYTE_ORDER_X86 = 0
@@ -491,6 +499,7 @@ class InternalProc(object):
 SP_EXECUTESQL = InternalProc(TDS_SP_EXECUTESQL, 'sp_executesql')
 SP_PREPARE = InternalProc(TDS_SP_PREPARE, 'sp_prepare')
 SP_EXECUTE = InternalProc(TDS_SP_EXECUTE, 'sp_execute')
+SP_UNPREPARE = InternalProc(TDS_SP_UNPREPARE, 'sp_unprepare')
 
 
 def skipall(stm, size):
@@ -0,0 +1,407 @@
+"""
+Reading of result sets into NumPy record arrays
+
+This module requires numpy, it is imported by :meth:`pytds.Cursor.fetch_numpy`
+only when this method is used.
+"""
+import struct
+
+import numpy
+
+from . import tds_base
+from . import tds_types
+
+# days between 0001-01-01 and 1970-01-01
+_EPOCH_DAYS = 719162
+
+# struct format and numpy dtype of fixed size types which are copied
+# into batch as raw little-endian bytes
+_raw_formats = {
+    tds_types.BitSerializer: ('?', '?'),
+    tds_types.TinyIntSerializer: ('B', 'u1'),
+    tds_types.SmallIntSerializer: ('h', '<i2'),
+    tds_types.IntSerializer: ('l', '<i4'),
+    tds_types.BigIntSerializer: ('q', '<i8'),
+    tds_types.RealSerializer: ('f', '<f4'),
+    tds_types.FloatSerializer: ('d', '<f8'),
+}
+
+
+def _raw_format(serializer):
+    """ Returns (struct format, numpy dtype) for serializers of values which
+    can be copied as raw bytes, or None
+    """
+    if isinstance(serializer, tds_types.BaseTypeSerializerN):
+        if type(serializer) in (tds_types.IntNSerializer, tds_types.FloatNSerializer, tds_types.BitNSerializer):
+            return _raw_formats[type(serializer.subtypes[serializer.size])]
+        return None
+    return _raw_formats.get(type(serializer))
+
+
+def _field_names(columns):
+    """ Makes unique field names which numpy accepts from column names """
+    names = []
+    used = set()
+    for i, col in enumerate(columns):
+        name = col.column_name or 'col{}'.format(i)
+        while name in used:
+            name = '{}_{}'.format(name, i)
+        used.add(name)
+        names.append(str(name))
+    return names
+
+
+class _FixedRun(object):
+    """ Run of consecutive not nullable fixed size columns
+
+    Bytes of the whole run are copied from the stream with a single read,
+    they are interpreted by numpy when batch is finished.
+    """
+    def __init__(self, fields):
+        # fields is a list of (name, struct format, dtype, column bit)
+        self.names = [name for name, _, _, _ in fields]
+        self._struct = struct.Struct('<' + ''.join(fmt for _, fmt, _, _ in fields))
+        self._col_structs = [(struct.Struct('<' + fmt), bit) for _, fmt, _, bit in fields]
+        self._dtype = numpy.dtype([(name, dtype) for name, _, dtype, _ in fields])
+        self.mask = 0
+        for _, _, _, bit in fields:
+            self.mask |= bit
+        self.clear()
+
+    def clear(self):
+        self._data = bytearray()
+        self._nulls = None
+
+    def read(self, r):
+        self._data += r.readall(self._struct.size)
+
+    def read_nbc(self, r, mask):
+        if not mask & self.mask:
+            self._data += r.readall(self._struct.size)
+            return
+        # some of the run's columns are NULL, read it column by column
+        if self._nulls is None:
+            self._nulls = []
+        row_idx = len(self._data) // self._struct.size
+        for col_idx, (col_struct, bit) in enumerate(self._col_structs):
+            if mask & bit:
+                self._data += b'\x00' * col_struct.size
+                self._nulls.append((row_idx, col_idx))
+            else:
+                self._data += r.readall(col_struct.size)
+
+    def add_values(self, values):
+        nulls = [i for i, value in enumerate(values) if value is None]
+        if nulls:
+            if self._nulls is None:
+                self._nulls = []
+            row_idx = len(self._data) // self._struct.size
+            self._nulls.extend((row_idx, i) for i in nulls)
+            values = [0 if value is None else value for value in values]
+        self._data += self._struct.pack(*values)
+
+    def finish(self, nrows):
+        data = numpy.frombuffer(bytes(self._data), dtype=self._dtype)
+        masks = [numpy.zeros(nrows, dtype='?') for _ in self.names]
+        for row_idx, col_idx in self._nulls or ():
+            masks[col_idx][row_idx] = True
+        return [(name, data[name], mask) for name, mask in zip(self.names, masks)]
+
+
+class _RawNField(object):
+    """ Nullable fixed size column (IntN, FloatN, BitN), values are copied
+    as raw bytes, NULLs are stored as zeros
+    """
+    def __init__(self, name, serializer, fmt, dtype, bit):
+        self.names = [name]
+        self._serializer = serializer
+        self._struct = struct.Struct('<' + fmt)
+        self._zero = b'\x00' * self._struct.size
+        self._dtype = numpy.dtype(dtype)
+        self.mask = bit
+        self.clear()
+
+    def clear(self):
+        self._data = bytearray()
+        self._nulls = bytearray()
+
+    def read(self, r):
+        size = r.get_byte()
+        if size == 0:
+            self.set_null()
+        elif size == self._struct.size:
+            self._data += r.readall(size)
+            self._nulls.append(0)
+        else:
+            subtype = self._serializer.subtypes.get(size)
+            if subtype is None:
+                r.session.bad_stream('Invalid size {0} of type {1}'.format(size, self._serializer.type))
+            self.add_values([subtype.read(r)])
+
+    def read_nbc(self, r, mask):
+        if mask & self.mask:
+            self.set_null()
+        else:
+            self.read(r)
+
+    def set_null(self):
+        self._data += self._zero
+        self._nulls.append(1)
+
+    def add_values(self, values):
+        value, = values
+        if value is None:
+            self.set_null()
+        else:
+            self._data += self._struct.pack(value)
+            self._nulls.append(0)
+
+    def finish(self, nrows):
+        data = numpy.frombuffer(bytes(self._data), dtype=self._dtype)
+        mask = numpy.frombuffer(bytes(self._nulls), dtype='?')
+        return [(self.names[0], data, mask)]
+
+
+class _DateTime2Field(object):
+    """ DATETIME2 column, raw time and date bytes are collected and
+    converted into datetime64[us] values in bulk
+    """
+    def __init__(self, name, serializer, bit):
+        self.names = [name]
+        self._serializer = serializer
+        self._precision = serializer.precision
+        self._size = serializer.size
+        self._zero = b'\x00' * self._size
+        self.mask = bit
+        self.clear()
+
+    def clear(self):
+        self._data = bytearray()
+        self._nulls = bytearray()
+
+    def read(self, r):
+        size = r.get_byte()
+        if size == 0:
+            self.set_null()
+        elif size == self._size:
+            self._data += r.readall(size)
+            self._nulls.append(0)
+        else:
+            r.session.bad_stream('Invalid DATETIME2 size {0}'.format(size))
+
+    def read_nbc(self, r, mask):
+        if mask & self.mask:
+            self.set_null()
+        else:
+            self.read(r)
+
+    def set_null(self):
+        self._data += self._zero
+        self._nulls.append(1)
+
+    def add_values(self, values):
+        value, = values
+        if value is None:
+            self.set_null()
+            return
+        self._data += self._serializer.encode(value.replace(tzinfo=None))
+        self._nulls.append(0)
+
+    def finish(self, nrows):
+        raw = numpy.frombuffer(bytes(self._data), dtype='u1').reshape(nrows, self._size)
+        time_size = self._size - 3
+        ticks = numpy.zeros(nrows, dtype='<u8')
+        for i in range(time_size):
+            ticks |= raw[:, i].astype('<u8') << (8 * i)
+        days = numpy.zeros(nrows, dtype='<i8')
+        for i in range(3):
+            days |= raw[:, time_size + i].astype('<i8') << (8 * i)
+        if self._precision > 6:
+            usecs = ticks // (10 ** (self._precision - 6))
+        else:
+            usecs = ticks * (10 ** (6 - self._precision))
+        values = (days - _EPOCH_DAYS) * 86400000000 + usecs.astype('<i8')
+        mask = numpy.frombuffer(bytes(self._nulls), dtype='?')
+        return [(self.names[0], values.astype('datetime64[us]'), mask)]
+
+
+class _ObjectField(object):
+    """ Column which is read by its serializer into Python objects
+
+    If dtype is given values are converted to it when batch is finished,
+    NULLs are replaced with ``null_value`` in that case.
+    """
+    def __init__(self, name, serializer, bit, dtype=None, null_value=None):
+        self.names = [name]
+        self._serializer = serializer
+        self._dtype = dtype
+        self._null_value = null_value
+        self.mask = bit
+        self.clear()
+
+    def clear(self):
+        self._values = []
+
+    def read(self, r):
+        self._values.append(self._serializer.read(r))
+
+    def read_nbc(self, r, mask):
+        if mask & self.mask:
+            self._values.append(None)
+        else:
+            self._values.append(self._serializer.read(r))
+
+    def add_values(self, values):
+        self._values.extend(values)
+
+    def finish(self, nrows):
+        mask = numpy.array([value is None for value in self._values], dtype='?')
+        if self._dtype is None:
+            data = numpy.empty(nrows, dtype=object)
+            data[:] = self._values
+        else:
+            null_value = self._null_value
+            data = numpy.array([null_value if value is None else value for value in self._values],
+                               dtype=self._dtype)
+        return [(self.names[0], data, mask)]
+
+
+class RecordBatchBuilder(object):
+    """ Accumulates rows of a result set and produces record batches from them
+
+    :param columns: Columns of the result set
+    :param decimal_as_float: If True DECIMAL/NUMERIC columns are converted
+      into float64, otherwise they are stored as objects
+    """
+    # limit for size of a run, so it never spans more than two packets
+    max_run_size = 256
+
+    def __init__(self, columns, decimal_as_float=True):
+        self._nbc_size = (len(columns) + 7) // 8
+        self._names = _field_names(columns)
+        self._fields = []
+        self._slices = []
+        run = None
+        run_size = 0
+        for i, (name, col) in enumerate(zip(self._names, columns)):
+            serializer = col.serializer
+            bit = 1 << i
+            if type(serializer) in _raw_formats:
+                fmt, dtype = _raw_formats[type(serializer)]
+                size = struct.calcsize('<' + fmt)
+                if run is None or run_size + size > self.max_run_size:
+                    run = []
+                    run_size = 0
+                    self._fields.append(run)
+                run.append((name, fmt, dtype, bit))
+                run_size += size
+                continue
+            run = None
+            raw = _raw_format(serializer)
+            if raw is not None:
+                fmt, dtype = raw
+                field = _RawNField(name, serializer, fmt, dtype, bit)
+            elif isinstance(serializer, tds_types.DateTime2Serializer):
+                field = _DateTime2Field(name, serializer, bit)
+            elif isinstance(serializer, tds_types.MsDecimalSerializer) and decimal_as_float:
+                field = _ObjectField(name, serializer, bit, dtype='<f8', null_value=float('nan'))
+            else:
+                field = _ObjectField(name, serializer, bit)
+            self._fields.append(field)
+        self._fields = [_FixedRun(field) if isinstance(field, list) else field
+                        for field in self._fields]
+        start = 0
+        for field in self._fields:
+            self._slices.append((start, start + len(field.names)))
+            start += len(field.names)
+        self.rows = 0
+
+    def read_row(self, r):
+        """ Reads values of ROW stream into the batch """
+        for field in self._fields:
+            field.read(r)
+        self.rows += 1
+
+    def read_nbcrow(self, r):
+        """ Reads values of NBCROW stream into the batch """
+        mask = 0
+        for i, b in enumerate(bytearray(r.readall(self._nbc_size))):
+            if b:
+                mask |= b << (i * 8)
+        if not mask:
+            for field in self._fields:
+                field.read(r)
+        else:
+            for field in self._fields:
+                field.read_nbc(r, mask)
+        self.rows += 1
+
+    def add_row(self, row):
+        """ Adds row of already decoded Python values into the batch """
+        for field, (start, end) in zip(self._fields, self._slices):
+            field.add_values(row[start:end])
+        self.rows += 1
+
+    def finish(self):
+        """ Returns accumulated rows as :class:`numpy.ma.MaskedArray`
+        with structured dtype and resets the builder
+        """
+        columns = {}
+        for field in self._fields:
+            for name, data, mask in field.finish(self.rows):
+                columns[name] = (data, mask)
+            field.clear()
+        dtype = numpy.dtype([(name, columns[name][0].dtype) for name in self._names])
+        data = numpy.empty(self.rows, dtype=dtype)
+        mask = numpy.empty(self.rows, dtype=[(name, '?') for name in self._names])
+        for name in self._names:
+            data[name] = columns[name][0]
+            mask[name] = columns[name][1]
+        self.rows = 0
+        return numpy.ma.MaskedArray(data, mask=mask)
+
+
+def fetch_batches(session, batch_rows, decimal_as_float=True, pending_rows=()):
+    """ Returns generator which yields remaining rows of session's current
+    result set as record batches
+
+    :param session: An instance of :class:`pytds.tds._TdsSession`
+    :param batch_rows: Maximum number of rows in a batch
+    :param decimal_as_float: Convert DECIMAL/NUMERIC columns into float64
+    :param pending_rows: Rows which were already fetched from the stream as
+      Python values, they come first and share batches with rows read from the stream
+    """
+    if session.res_info is None:
+        raise tds_base.ProgrammingError("Previous statement didn't produce any results")
+    if session.skipped_to_status:
+        raise tds_base.ProgrammingError("Unable to fetch any rows after accessing return_status")
+    if batch_rows < 1:
+        raise ValueError('batch_rows should be positive')
+    builder = RecordBatchBuilder(session.res_info.columns, decimal_as_float=decimal_as_float)
+    return _generate_batches(session, builder, batch_rows, pending_rows)
+
+
+def _generate_batches(session, builder, batch_rows, pending_rows):
+    info = session.res_info
+    for row in pending_rows:
+        builder.add_row(row)
+        if builder.rows >= batch_rows:
+            yield builder.finish()
+    # last batch of pending rows is filled up with rows from the stream
+    r = session._reader
+    while session.more_rows and session.res_info is info:
+        session.set_state(tds_base.TDS_READING)
+        while builder.rows < batch_rows:
+            marker = session.next_row_token()
+            if marker == tds_base.TDS_ROW_TOKEN:
+                builder.read_row(r)
+            elif marker == tds_base.TDS_NBC_ROW_TOKEN:
+                builder.read_nbcrow(r)
+            else:
+                break
+            info.row_count += 1
+        if builder.rows:
+            yield builder.finish()
+    if builder.rows:
+        # stream had no more rows
+        yield builder.finish()
@@ -19,19 +19,98 @@ _flt8_struct = struct.Struct('d')
 _utc = tz.utc
 
 
-def _applytz(dt, tzinfo):
-    if not tzinfo:
-        return dt
-    dt = dt.replace(tzinfo=tzinfo)
-    return dt
+if six.PY3:
+    def _decode_num(buf):
+        """ Decodes little-endian integer from buffer
 
+        Buffer can be of any size
+        """
+        return int.from_bytes(buf, 'little')
+else:
+    def _decode_num(buf):
+        """ Decodes little-endian integer from buffer
 
-def _decode_num(buf):
-    """ Decodes little-endian integer from buffer
+        Buffer can be of any size
+        """
+        return functools.reduce(lambda acc, val: acc * 256 + tds_base.my_ord(val), reversed(buf), 0)
 
-    Buffer can be of any size
-    """
-    return functools.reduce(lambda acc, val: acc * 256 + tds_base.my_ord(val), reversed(buf), 0)
+
+if six.PY3:
+    def _encode_num(value, size):
+        """ Encodes non-negative integer as little-endian bytes of given size """
+        return value.to_bytes(size, 'little')
+else:
+    def _encode_num(value, size):
+        """ Encodes non-negative integer as little-endian bytes of given size """
+        if value >> (8 * size):
+            raise OverflowError('int too big to convert')
+        return bytes(bytearray((value >> (8 * i)) & 0xff for i in range(size)))
+
+
+# Fast decoding of fixed width types.  Python values are built straight
+# from integers read from the wire, without intermediate SQL value objects
+# like Date, Time or DateTime2.
+
+# days from 0001-01-01 to 1900-01-01, base date of DATETIME and SMALLDATETIME
+_days_to_1900 = 693595
+
+_microseconds_per_day = 86400 * 1000000
+
+# (year, month, day) of recently decoded dates by number of days since 0001-01-01,
+# cleared when it grows over the limit, which covers about 180 years of distinct dates
+_dates_by_days = {}
+_max_dates_by_days = 65536
+
+# context and divisors of unscaled DECIMAL values by scale
+_decimal_context = decimal.Context(prec=38)
+_decimal_divisors = [decimal.Decimal(10 ** scale) for scale in range(39)]
+
+_money_divisor = decimal.Decimal(10000)
+
+# timezones of DATETIMEOFFSET values by offset in minutes
+_offset_timezones = {}
+
+
+def _date_parts(days):
+    parts = _dates_by_days.get(days)
+    if parts is None:
+        if len(_dates_by_days) >= _max_dates_by_days:
+            _dates_by_days.clear()
+        date = datetime.date.fromordinal(days + 1)
+        parts = _dates_by_days[days] = (date.year, date.month, date.day)
+    return parts
+
+
+def _decode_datetime(days, microseconds, tzinfo=None):
+    """ Returns datetime which is given number of days and microseconds after 0001-01-01 00:00 """
+    year, month, day = _date_parts(days)
+    seconds, microseconds = divmod(microseconds, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return datetime.datetime(year, month, day, hours, minutes, seconds, microseconds, tzinfo)
+
+
+def _decode_time(microseconds, tzinfo=None):
+    """ Returns time which is given number of microseconds after midnight """
+    seconds, microseconds = divmod(microseconds, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return datetime.time(hours, minutes, seconds, microseconds, tzinfo)
+
+
+def _decode_decimal(positive, value, scale):
+    """ Returns Decimal from sign and unscaled absolute value """
+    val = decimal.Decimal(value)
+    if not positive:
+        val = val.copy_negate()
+    return _decimal_context.divide(val, _decimal_divisors[scale])
+
+
+def _offset_timezone(offset):
+    timezone = _offset_timezones.get(offset)
+    if timezone is None:
+        timezone = _offset_timezones[offset] = tz.FixedOffsetTimezone(offset)
+    return timezone
 
 
 class PlpReader(object):
@@ -689,7 +768,7 @@ class VarChar70Serializer(BaseTypeSerializer):
         if r._session._tds._login.bytes_to_unicode:
             return r.read_str(size, self._codec)
         else:
-            return tds_base.readall(r, size)
+            return r.readall(size)
 
 
 class VarChar71Serializer(VarChar70Serializer):
@@ -781,7 +860,7 @@ class NVarChar70Serializer(BaseTypeSerializer):
     @classmethod
     def from_stream(cls, r):
         size = r.get_usmallint()
-        return cls(size / 2)
+        return cls(size // 2)
 
     def write_info(self, w):
         w.put_usmallint(self.size * 2)
@@ -809,7 +888,7 @@ class NVarChar71Serializer(NVarChar70Serializer):
     def from_stream(cls, r):
         size = r.get_usmallint()
         collation = r.get_collation()
-        return cls(size / 2, collation)
+        return cls(size // 2, collation)
 
     def write_info(self, w):
         super(NVarChar71Serializer, self).write_info(w)
@@ -823,7 +902,7 @@ class NVarChar72Serializer(NVarChar71Serializer):
         collation = r.get_collation()
         if size == 0xffff:
             return NVarCharMaxSerializer(collation=collation)
-        return cls(size / 2, collation=collation)
+        return cls(size // 2, collation=collation)
 
 
 class NVarCharMaxSerializer(NVarChar72Serializer):
@@ -956,8 +1035,8 @@ class Text70Serializer(BaseTypeSerializer):
         size = r.get_byte()
         if size == 0:
             return None
-        tds_base.readall(r, size)  # textptr
-        tds_base.readall(r, 8)  # timestamp
+        r.readall(size)  # textptr
+        r.readall(8)  # timestamp
         colsize = r.get_int()
         if self._chunk_handler is None:
             if r._session._tds._login.bytes_to_unicode:
@@ -1033,8 +1112,8 @@ class NText70Serializer(BaseTypeSerializer):
         textptr_size = r.get_byte()
         if textptr_size == 0:
             return None
-        tds_base.readall(r, textptr_size)  # textptr
-        tds_base.readall(r, 8)  # timestamp
+        r.readall(textptr_size)  # textptr
+        r.readall(8)  # timestamp
         colsize = r.get_int()
         for chunk in tds_base.iterdecode(read_chunks(r, colsize), ucs2_codec):
             self._chunk_handler.add_chunk(chunk)
@@ -1125,7 +1204,7 @@ class VarBinarySerializer(BaseTypeSerializer):
         size = r.get_usmallint()
         if size == 0xffff:
             return None
-        return tds_base.readall(r, size)
+        return r.readall(size)
 
 
 class VarBinarySerializer72(VarBinarySerializer):
@@ -1245,8 +1324,8 @@ class Image70Serializer(BaseTypeSerializer):
     def read(self, r):
         size = r.get_byte()
         if size == 16:  # Jeff's hack
-            tds_base.readall(r, 16)  # textptr
-            tds_base.readall(r, 8)  # timestamp
+            r.readall(16)  # textptr
+            r.readall(8)  # timestamp
             colsize = r.get_int()
             for chunk in read_chunks(r, colsize):
                 self._chunk_handler.add_chunk(chunk)
@@ -1354,16 +1433,11 @@ class SmallDateTimeSerializer(BasePrimitiveTypeSerializer, BaseDateTimeSerialize
             if not w.session.use_tz:
                 raise tds_base.DataError('Timezone-aware datetime is used without specifying use_tz')
             val = val.astimezone(w.session.use_tz).replace(tzinfo=None)
-        dt = SmallDateTime.from_pydatetime(val)
-        w.pack(self._struct, dt.days, dt.minutes)
+        w.pack(self._struct, val.toordinal() - 1 - _days_to_1900, val.hour * 60 + val.minute)
 
     def read(self, r):
         days, minutes = r.unpack(self._struct)
-        dt = SmallDateTime(days=days, minutes=minutes)
-        tzinfo = None
-        if r.session.tzinfo_factory is not None:
-            tzinfo = r.session.tzinfo_factory(0)
-        return dt.to_pydatetime().replace(tzinfo=tzinfo)
+        return _decode_datetime(days + _days_to_1900, minutes * 60000000, r.session.utc_tzinfo)
 
 SmallDateTimeSerializer.instance = SmallDateTimeSerializer()
 
@@ -1420,22 +1494,24 @@ class DateTimeSerializer(BasePrimitiveTypeSerializer, BaseDateTimeSerializer):
 
     def read(self, r):
         days, t = r.unpack(self._struct)
-        tzinfo = None
-        if r.session.tzinfo_factory is not None:
-            tzinfo = r.session.tzinfo_factory(0)
-        return _applytz(self.decode(days, t), tzinfo)
+        return self.decode(days, t, r.session.utc_tzinfo)
 
     @classmethod
     def encode(cls, value):
         if type(value) == datetime.date:
             value = datetime.datetime.combine(value, datetime.time(0, 0, 0))
-        dt = DateTime.from_pydatetime(value)
-        return cls._struct.pack(dt.days, dt.time_part)
+        if not (DateTime.MIN_PYDATETIME <= value <= DateTime.MAX_PYDATETIME):
+            raise tds_base.DataError('Datetime is out of range')
+        # same rounding of milliseconds to 1/300 second ticks as in DateTime.from_pydatetime
+        time_part = ((value.hour * 60 * 60 + value.minute * 60 + value.second) * 300 +
+                     int(round(value.microsecond // 1000 * 3 / 10.0)))
+        return cls._struct.pack(value.toordinal() - 1 - _days_to_1900, time_part)
 
     @classmethod
-    def decode(cls, days, time_part):
-        dt = DateTime(days=days, time_part=time_part)
-        return dt.to_pydatetime()
+    def decode(cls, days, time_part, tzinfo=None):
+        # same rounding of 1/300 second ticks as in DateTime.to_pydatetime
+        microseconds = time_part // 300 * 1000000 + int(round(time_part % 300 * 10 / 3.0)) * 1000
+        return _decode_datetime(days + _days_to_1900, microseconds, tzinfo)
 
 DateTimeSerializer.instance = DateTimeSerializer()
 
@@ -1660,13 +1736,25 @@ class BaseDateTime73Serializer(BaseTypeSerializer):
         7: 5,
     }
 
+    # multipliers of wire time values which give microseconds when divided by 10, by precision
+    _time_multipliers = [10 ** (7 - prec) for prec in range(8)]
+
+    # divisors of nanoseconds which give wire time values, by precision
+    _time_divisors = [10 ** (9 - prec) for prec in range(8)]
+
+    @classmethod
+    def _time_ticks(cls, value, prec):
+        """ Returns wire value of time of day of time or datetime object, same as :func:`_write_time` """
+        seconds = value.hour * 60 * 60 + value.minute * 60 + value.second
+        return (seconds * 1000000 + value.microsecond) * 1000 // cls._time_divisors[prec]
+
     def _write_time(self, w, t, prec):
         val = t.nsec // (10 ** (9 - prec))
         w.write(struct.pack('<Q', val)[:self._precision_to_len[prec]])
 
     @staticmethod
     def _read_time(r, size, prec):
-        time_buf = tds_base.readall(r, size)
+        time_buf = r.readall(size)
         val = _decode_num(time_buf)
         val *= 10 ** (7 - prec)
         nanoseconds = val * 100
@@ -1680,7 +1768,7 @@ class BaseDateTime73Serializer(BaseTypeSerializer):
 
     @staticmethod
     def _read_date(r):
-        days = _decode_num(tds_base.readall(r, 3))
+        days = _decode_num(r.readall(3))
         return Date(days=days)
 
 
@@ -1701,16 +1789,16 @@ class MsDateSerializer(BasePrimitiveTypeSerializer, BaseDateTime73Serializer):
             w.put_byte(0)
         else:
             w.put_byte(3)
-            self._write_date(w, Date.from_pydate(value))
+            w.write(_encode_num(value.toordinal() - 1, 3))
 
     def read_fixed(self, r):
-        return self._read_date(r).to_pydate()
+        return datetime.date.fromordinal(_decode_num(r.readall(3)) + 1)
 
     def read(self, r):
         size = r.get_byte()
         if size == 0:
             return None
-        return self._read_date(r).to_pydate()
+        return self.read_fixed(r)
 
 
 class MsTimeSerializer(BaseDateTime73Serializer):
@@ -1741,14 +1829,11 @@ class MsTimeSerializer(BaseDateTime73Serializer):
                     raise tds_base.DataError('Timezone-aware datetime is used without specifying use_tz')
                 value = value.astimezone(w.session.use_tz).replace(tzinfo=None)
             w.put_byte(self.size)
-            self._write_time(w, Time.from_pytime(value), self._typ.precision)
+            w.write(_encode_num(self._time_ticks(value, self._typ.precision), self.size))
 
     def read_fixed(self, r, size):
-        res = self._read_time(r, size, self._typ.precision).to_pytime()
-        if r.session.tzinfo_factory is not None:
-            tzinfo = r.session.tzinfo_factory(0)
-            res = res.replace(tzinfo=tzinfo)
-        return res
+        ticks = _decode_num(r.readall(size)) * self._time_multipliers[self._typ.precision]
+        return _decode_time(ticks // 10, r.session.utc_tzinfo)
 
     def read(self, r):
         size = r.get_byte()
@@ -1782,18 +1867,19 @@ class DateTime2Serializer(BaseDateTime73Serializer):
                     raise tds_base.DataError('Timezone-aware datetime is used without specifying use_tz')
                 value = value.astimezone(w.session.use_tz).replace(tzinfo=None)
             w.put_byte(self.size)
-            self._write_time(w, Time.from_pytime(value), self._typ.precision)
-            self._write_date(w, Date.from_pydate(value))
+            w.write(self.encode(value))
+
+    def encode(self, value):
+        """ Encodes naive datetime into time and date parts of the wire format, without size byte """
+        ticks = self._time_ticks(value, self._typ.precision)
+        return _encode_num(ticks | ((value.toordinal() - 1) << ((self.size - 3) * 8)), self.size)
 
     def read_fixed(self, r, size):
-        time = self._read_time(r, size - 3, self._typ.precision)
-        date = self._read_date(r)
-        dt = DateTime2(date=date, time=time)
-        res = dt.to_pydatetime()
-        if r.session.tzinfo_factory is not None:
-            tzinfo = r.session.tzinfo_factory(0)
-            res = res.replace(tzinfo=tzinfo)
-        return res
+        # time part is followed by 3 bytes of date, both are little-endian
+        value = _decode_num(r.readall(size))
+        shift = (size - 3) * 8
+        ticks = (value & ((1 << shift) - 1)) * self._time_multipliers[self._typ.precision]
+        return _decode_datetime(value >> shift, ticks // 10, r.session.utc_tzinfo)
 
     def read(self, r):
         size = r.get_byte()
@@ -1826,16 +1912,21 @@ class DateTimeOffsetSerializer(BaseDateTime73Serializer):
             value = value.astimezone(_utc).replace(tzinfo=None)
 
             w.put_byte(self.size)
-            self._write_time(w, Time.from_pytime(value), self._typ.precision)
-            self._write_date(w, Date.from_pydate(value))
+            ticks = self._time_ticks(value, self._typ.precision)
+            w.write(_encode_num(ticks | ((value.toordinal() - 1) << ((self.size - 5) * 8)), self.size - 2))
             w.put_smallint(int(tds_base.total_seconds(utcoffset)) // 60)
 
+    _offset_struct = struct.Struct('<h')
+
     def read_fixed(self, r, size):
-        time = self._read_time(r, size - 5, self._typ.precision)
-        date = self._read_date(r)
-        offset = r.get_smallint()
-        dt = DateTimeOffset(date=date, time=time, offset=offset)
-        return dt.to_pydatetime()
+        # UTC time and date like in DATETIME2, followed by offset in minutes
+        buf = r.readall(size)
+        value = _decode_num(buf[:size - 2])
+        offset, = self._offset_struct.unpack_from(buf, size - 2)
+        shift = (size - 5) * 8
+        ticks = (value & ((1 << shift) - 1)) * self._time_multipliers[self._typ.precision]
+        days, microseconds = divmod(ticks // 10 + offset * 60000000, _microseconds_per_day)
+        return _decode_datetime((value >> shift) + days, microseconds, _offset_timezone(offset))
 
     def read(self, r):
         size = r.get_byte()
@@ -1862,6 +1953,7 @@ class MsDecimalSerializer(BaseTypeSerializer):
     ]
 
     _info_struct = struct.Struct('BBB')
+    _sign_struct = struct.Struct('BB')
 
     def __init__(self, precision=18, scale=0):
         super(MsDecimalSerializer, self).__init__(precision=precision,
@@ -1887,42 +1979,29 @@ class MsDecimalSerializer(BaseTypeSerializer):
         w.pack(self._info_struct, self.size, self.precision, self.scale)
 
     def write(self, w, value):
-        with decimal.localcontext() as context:
-            context.prec = 38
-            if value is None:
-                w.put_byte(0)
-                return
-            if not isinstance(value, decimal.Decimal):
-                value = decimal.Decimal(value)
-            value = value.normalize()
-            scale = self.scale
-            size = self.size
-            w.put_byte(size)
-            val = value
-            positive = 1 if val > 0 else 0
-            w.put_byte(positive)  # sign
-            if not positive:
-                val *= -1
-            size -= 1
-            val *= 10 ** scale
-            for i in range(size):
-                w.put_byte(int(val % 256))
-                val //= 256
-            assert val == 0
+        if value is None:
+            w.put_byte(0)
+            return
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(value)
+        ctx = _decimal_context
+        value = value.normalize(ctx)
+        positive = 1 if value > 0 else 0
+        if not positive:
+            value = value.copy_negate()
+        # digits beyond the scale are truncated
+        magnitude = int(ctx.multiply(value, _decimal_divisors[self.scale]))
+        size = self.size
+        if magnitude >> ((size - 1) * 8):
+            raise tds_base.DataError('Decimal value is out of range')
+        w.write(self._sign_struct.pack(size, positive) + _encode_num(magnitude, size - 1))
 
     def _decode(self, positive, buf):
-        val = _decode_num(buf)
-        val = decimal.Decimal(val)
-        with decimal.localcontext() as ctx:
-            ctx.prec = 38
-            if not positive:
-                val *= -1
-            val /= 10 ** self._scale
-        return val
+        return _decode_decimal(positive, _decode_num(buf), self._scale)
 
     def read_fixed(self, r, size):
         positive = r.get_byte()
-        buf = tds_base.readall(r, size - 1)
+        buf = r.readall(size - 1)
         return self._decode(positive, buf)
 
     def read(self, r):
@@ -1937,7 +2016,7 @@ class Money4Serializer(BasePrimitiveTypeSerializer):
     declaration = 'SMALLMONEY'
 
     def read(self, r):
-        return decimal.Decimal(r.get_int()) / 10000
+        return decimal.Decimal(r.get_int()) / _money_divisor
 
     def write(self, w, val):
         val = int(val * 10000)
@@ -1954,8 +2033,7 @@ class Money8Serializer(BasePrimitiveTypeSerializer):
 
     def read(self, r):
         hi, lo = r.unpack(self._struct)
-        val = hi * (2 ** 32) + lo
-        return decimal.Decimal(val) / 10000
+        return decimal.Decimal((hi << 32) + lo) / _money_divisor
 
     def write(self, w, val):
         val *= 10000
@@ -2002,7 +2080,7 @@ class MsUniqueSerializer(BaseTypeSerializer):
 
     @staticmethod
     def read_fixed(r, size):
-        return uuid.UUID(bytes_le=tds_base.readall(r, size))
+        return uuid.UUID(bytes_le=r.readall(size))
 
     def read(self, r):
         size = r.get_byte()
@@ -2033,7 +2111,7 @@ def _variant_read_decimal(r, size):
 
 def _variant_read_binary(r, size):
     r.get_usmallint()
-    return tds_base.readall(r, size)
+    return r.readall(size)
 
 
 class VariantSerializer(BaseTypeSerializer):
@@ -2376,6 +2454,150 @@ def sql_type_by_declaration(declaration):
     return _declarations_parser.parse(declaration)
 
 
+def sql_type_by_serializer(serializer):
+    """ Returns SQL type which corresponds to serializer, e.g. received in COLMETADATA
+
+    Fixed and variable length character and binary types are both mapped
+    to variable length types.
+
+    :param serializer: An instance of :class:`BaseTypeSerializer`
+    :returns: An instance of SQL type or ``None`` if type can't be determined, e.g. for CLR types
+    """
+    s = serializer
+    if isinstance(s, (BitSerializer, BitNSerializer)):
+        return BitType()
+    elif isinstance(s, TinyIntSerializer):
+        return TinyIntType()
+    elif isinstance(s, SmallIntSerializer):
+        return SmallIntType()
+    elif isinstance(s, IntSerializer):
+        return IntType()
+    elif isinstance(s, BigIntSerializer):
+        return BigIntType()
+    elif isinstance(s, IntNSerializer):
+        return IntNSerializer.type_by_size[s.size]
+    elif isinstance(s, RealSerializer):
+        return RealType()
+    elif isinstance(s, FloatSerializer):
+        return FloatType()
+    elif isinstance(s, FloatNSerializer):
+        return RealType() if s.size == 4 else FloatType()
+    elif isinstance(s, Money4Serializer):
+        return SmallMoneyType()
+    elif isinstance(s, Money8Serializer):
+        return MoneyType()
+    elif isinstance(s, MoneyNSerializer):
+        return SmallMoneyType() if s.size == 4 else MoneyType()
+    elif isinstance(s, MsDecimalSerializer):
+        return DecimalType(precision=s.precision, scale=s.scale)
+    elif isinstance(s, VarCharMaxSerializer):
+        return VarCharMaxType()
+    elif isinstance(s, VarChar70Serializer):
+        return VarCharType(size=s.size)
+    elif isinstance(s, XmlSerializer):
+        return XmlType()
+    elif isinstance(s, NVarCharMaxSerializer):
+        return NVarCharMaxType()
+    elif isinstance(s, NVarChar70Serializer):
+        return NVarCharType(size=int(s.size))
+    elif isinstance(s, Text70Serializer):
+        return TextType()
+    elif isinstance(s, NText70Serializer):
+        return NTextType()
+    elif isinstance(s, VarBinarySerializerMax):
+        return VarBinaryMaxType()
+    elif isinstance(s, VarBinarySerializer):
+        return VarBinaryType(size=s.size)
+    elif isinstance(s, Image70Serializer):
+        return ImageType()
+    elif isinstance(s, SmallDateTimeSerializer):
+        return SmallDateTimeType()
+    elif isinstance(s, DateTimeSerializer):
+        return DateTimeType()
+    elif isinstance(s, DateTimeNSerializer):
+        return SmallDateTimeType() if s.size == 4 else DateTimeType()
+    elif isinstance(s, (MsDateSerializer, MsTimeSerializer, DateTime2Serializer, DateTimeOffsetSerializer)):
+        return s._typ
+    elif isinstance(s, MsUniqueSerializer):
+        return UniqueIdentifierType()
+    elif isinstance(s, VariantSerializer):
+        return VariantType()
+    return None
+
+
+class _MemoCache(object):
+    """ Bounded cache of inferred types or serializers shared by all connections
+
+    Cached objects are not modified after construction, so they can be used
+    by many connections and threads at once.  Keys include everything result
+    depends on, e.g. TDS version and collation, so connections with the same
+    settings share entries.  When cache is full it is cleared, this needs no
+    locking and entries are cheap to build again.  Hit and miss counters are
+    not locked either, with several threads they are approximate.
+
+    :param max_size: Maximum number of entries
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(self._entries) >= self._max_size:
+            self._entries.clear()
+        self._entries[key] = value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+_inferred_types = _MemoCache(1024)
+_serializers = _MemoCache(1024)
+
+
+def type_cache_stats():
+    """ Returns statistics of caches of inferred types and serializers
+
+    Caches are shared by all connections, with several threads numbers of
+    hits and misses are approximate since counters are updated without locking.
+
+    :returns: Dictionary with ``types`` and ``serializers`` keys, each value is
+      a dictionary with ``hits``, ``misses`` and ``size`` keys
+    """
+    return {'types': _inferred_types.stats(), 'serializers': _serializers.stats()}
+
+
+_collated_types = frozenset([
+    CharType, VarCharType, VarCharMaxType, NCharType, NVarCharType, NVarCharMaxType, TextType, NTextType,
+])
+
+
+def _serializer_key(sql_type, collation, tds_ver):
+    """ Returns key of serializer in cache or ``None`` if serializer should not be cached """
+    cls = sql_type.__class__
+    if cls is TableType:
+        # table types carry mutable list of columns
+        return None
+    # attribute names are part of the key, and they are sorted since order of
+    # instance dictionary is not guaranteed on older Python versions
+    key = (tds_ver, cls) + tuple(sorted(sql_type.__dict__.items()))
+    if cls in _collated_types:
+        key += (None if collation is None else collation.pack(),)
+    return key
+
+
 class SerializerFactory(object):
     """
     Factory class for TDS data types
@@ -2447,6 +2669,21 @@ class SerializerFactory(object):
         return self.serializer_by_type(sql_type=sql_type, collation=connection.collation)
 
     def serializer_by_type(self, sql_type, collation=raw_collation):
+        """ Returns serializer for SQL type, serializers are memoized
+
+        :param sql_type: An instance of SQL type
+        :param collation: Collation of character types
+        """
+        key = _serializer_key(sql_type, collation, self._tds_ver)
+        if key is None:
+            return self._create_serializer(sql_type, collation)
+        serializer = _serializers.get(key)
+        if serializer is None:
+            serializer = self._create_serializer(sql_type, collation)
+            _serializers.put(key, serializer)
+        return serializer
+
+    def _create_serializer(self, sql_type, collation):
         typ = sql_type
         if isinstance(typ, BitType):
             return BitNSerializer(typ)
@@ -2591,11 +2828,44 @@ class DeclarationsParser(object):
 _declarations_parser = DeclarationsParser()
 
 
+def _no_bucket(value):
+    return None
+
+
+def _int_bucket(value):
+    if -2 ** 31 <= value <= 2 ** 31 - 1:
+        return 0
+    elif -2 ** 63 <= value <= 2 ** 63 - 1:
+        return 1
+    elif -10 ** 38 + 1 <= value <= 10 ** 38 - 1:
+        return 2
+    return 3
+
+
+# Maps exact classes of values to functions returning part of value which
+# affects inferred type, values of other classes are not memoized
+_inference_buckets = {
+    bool: _no_bucket,
+    float: _no_bucket,
+    six.binary_type: _no_bucket,
+    six.text_type: _no_bucket,
+    datetime.date: _no_bucket,
+    datetime.time: _no_bucket,
+    uuid.UUID: _no_bucket,
+    Binary: lambda value: len(value) <= 8000,
+    datetime.datetime: lambda value: bool(value.tzinfo),
+}
+for _int_class in six.integer_types:
+    _inference_buckets[_int_class] = _int_bucket
+
+
 class TdsTypeInferrer(object):
     def __init__(self, type_factory, collation=None, bytes_to_unicode=False, allow_tz=False):
         """
         Class used to do TDS type inference
 
+        Inferred types are memoized in a cache shared by inferrers with the same settings.
+
         :param type_factory: Instance of TypeFactory
         :param collation: Collation to use for strings
         :param bytes_to_unicode: Treat bytes type as unicode string
@@ -2605,6 +2875,7 @@ class TdsTypeInferrer(object):
         self._collation = collation
         self._bytes_to_unicode = bytes_to_unicode
         self._allow_tz = allow_tz
+        self._settings = (type_factory._tds_ver, bytes_to_unicode, allow_tz)
 
     def from_value(self, value):
         """ Function infers TDS type from Python value.
@@ -2613,9 +2884,16 @@ class TdsTypeInferrer(object):
         :return: An instance of subclass of :class:`BaseType`
         """
         if value is None:
-            sql_type = NVarCharType(size=1)
-        else:
-            sql_type = self._from_class_value(value, type(value))
+            return NVarCharType(size=1)
+        value_type = type(value)
+        bucket = _inference_buckets.get(value_type)
+        if bucket is None:
+            return self._from_class_value(value, value_type)
+        key = (self._settings, value_type, bucket(value))
+        sql_type = _inferred_types.get(key)
+        if sql_type is None:
+            sql_type = self._from_class_value(value, value_type)
+            _inferred_types.put(key, sql_type)
         return sql_type
 
     def from_class(self, cls):
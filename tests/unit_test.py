@@ -1,4 +1,5 @@
 # vim: set fileencoding=utf8 :
+import array
 import binascii
 import datetime
 import decimal
@@ -1392,3 +1393,1376 @@ def test_tds_session_raise_db_exception():
     with pytest.raises(pytds.Error) as ex:
         sess.raise_db_exception()
     assert "Request failed, server didn't send error message" == str(ex.value)
+
+
+def _split_into_packets(payload, packet_size):
+    packets = []
+    chunk_size = packet_size - 8
+    for pos in range(0, len(payload), chunk_size):
+        chunk = payload[pos:pos + chunk_size]
+        status = 1 if pos + chunk_size >= len(payload) else 0
+        packets.append(struct.pack('>BBHHBx', 4, status, len(chunk) + 8, 0, 0) + chunk)
+    return packets
+
+
+@pytest.mark.parametrize('contiguous_reads', [False, True])
+def test_reader_values_spanning_packets(contiguous_reads):
+    text = u'значение, которое не помещается в один пакет'
+    blob = bytes(bytearray(range(256))) * 20
+    payload = (struct.pack('<iq', -5, 1 << 40) +
+               text.encode('utf-16le') +
+               blob +
+               raw_collation.pack() +
+               struct.pack('<H', 7))
+    tds = _TdsSocket()
+    tds.contiguous_reads = contiguous_reads
+    sess = _TdsSession(tds, _FakeSock(_split_into_packets(payload, 31)), None)
+    r = sess._reader
+    assert isinstance(r, pytds.tds._TdsContiguousReader) == contiguous_reads
+    assert r.get_int() == -5
+    assert r.get_int8() == 1 << 40
+    assert r.read_ucs2(len(text)) == text
+    assert r.readall(len(blob)) == blob
+    assert r.get_collation().pack() == raw_collation.pack()
+    assert r.get_usmallint() == 7
+    assert r.packet_type == 4
+
+
+def test_contiguous_reader_whole_packet():
+    tds = _TdsSocket()
+    tds.contiguous_reads = True
+    packets = _split_into_packets(b'\x01\x02\x03\x04\x05', 10) + _split_into_packets(b'abc', 4096)
+    sess = _TdsSession(tds, _FakeSock(packets), None)
+    r = sess._reader
+    assert r.read_whole_packet() == b'\x01\x02'
+    assert r.readall(3) == b'\x03\x04\x05'
+    assert r.read_whole_packet() == b'abc'
+    with pytest.raises(pytds.ClosedConnectionError):
+        r.get_byte()
+
+
+def test_contiguous_reader_readall():
+    tds = _TdsSocket()
+    tds.contiguous_reads = True
+    blob = bytes(bytearray(range(256)))
+    sess = _TdsSession(tds, _FakeSock(_split_into_packets(blob, 100)), None)
+    r = sess._reader
+    # within a packet, spanning packets and up to the end
+    for start, end in ((0, 10), (10, 210), (210, 256)):
+        value = r.readall(end - start)
+        assert type(value) is bytes
+        assert value == blob[start:end]
+
+
+class _CountingSock(_FakeSock):
+    def __init__(self, packets):
+        super(_CountingSock, self).__init__(packets)
+        self.recv_calls = 0
+
+    def recv_into(self, buffer, size=0):
+        self.recv_calls += 1
+        return super(_CountingSock, self).recv_into(buffer, size)
+
+
+@pytest.mark.parametrize('contiguous_reads', [False, True])
+def test_reader_read_ahead(contiguous_reads):
+    blob = bytes(bytearray(range(256))) * 40
+    tds = _TdsSocket()
+    tds.contiguous_reads = contiguous_reads
+    tds.read_ahead = 64 * 1024
+    sock = _CountingSock([b''.join(_split_into_packets(blob, 512))])
+    sess = _TdsSession(tds, sock, None)
+    r = sess._reader
+    assert r.readall(len(blob)) == blob
+    assert sock.recv_calls == 1
+    with pytest.raises(pytds.ClosedConnectionError):
+        r.get_byte()
+
+
+def test_reader_read_ahead_timeout_sends_cancel():
+    class TimeoutSock(_FakeSock):
+        def recv_into(self, buffer, size=0):
+            raise socket.timeout()
+
+    tds = _TdsSocket()
+    tds.read_ahead = 64 * 1024
+    sock = TimeoutSock([])
+    sess = _TdsSession(tds, sock, None)
+    with pytest.raises(pytds.TimeoutError):
+        sess._reader.get_byte()
+    assert sess.in_cancel
+    assert sock._sent[:1] == b'\x06'  # CANCEL packet
+
+
+def _write_stream(scatter_writes, chunks):
+    client, server = socket.socketpair()
+    received = []
+
+    def reader():
+        while True:
+            buf = server.recv(65536)
+            if not buf:
+                break
+            received.append(buf)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        tds = _TdsSocket()
+        tds.scatter_writes = scatter_writes
+        w = _TdsSession(tds, client, None)._writer
+        w._max_packets_per_send = 3
+        w.begin_packet(pytds.tds_base.PacketType.BULK)
+        for chunk in chunks:
+            w.write(chunk)
+        w.flush()
+    finally:
+        client.close()
+        thread.join()
+        server.close()
+    return b''.join(received)
+
+
+@pytest.mark.skipif(not hasattr(socket.socket, 'sendmsg'), reason='sendmsg is not supported')
+def test_scatter_writes():
+    chunks = [b'abc', bytes(bytearray(range(256))) * 100, b'x' * 4095, b'y' * 4096, b'z' * 4097, b'end']
+    data = _write_stream(True, chunks)
+    assert data == _write_stream(False, chunks)
+    payload = b''
+    pos = 0
+    packet_no = 0
+    while pos < len(data):
+        packet_type, status, size, _, num = struct.unpack_from('>BBHHBx', data, pos)
+        assert packet_type == pytds.tds_base.PacketType.BULK
+        assert num == packet_no % 256
+        assert status == (1 if pos + size == len(data) else 0)
+        payload += data[pos + 8:pos + size]
+        pos += size
+        packet_no += 1
+    assert payload == b''.join(chunks)
+
+
+def _make_row_stream(columns, rows, nbc):
+    tds = _TdsSocket()
+    sock = _FakeSock([])
+    w = _TdsSession(tds, sock, None)._writer
+    w.begin_packet(4)
+    for row in rows:
+        if nbc:
+            bitmap = bytearray((len(columns) + 7) // 8)
+            for i, value in enumerate(row):
+                if value is None:
+                    bitmap[i // 8] |= 1 << (i % 8)
+            w.write(bytes(bitmap))
+        for col, value in zip(columns, row):
+            if not nbc or value is not None:
+                col.serializer.write(w, value)
+    w.flush()
+    return sock._sent
+
+
+@pytest.mark.parametrize('nbc', [False, True])
+def test_row_decoder(nbc):
+    serializers = [
+        pytds.tds_types.IntSerializer.instance,
+        pytds.tds_types.BigIntSerializer.instance,
+        pytds.tds_types.BitSerializer.instance,
+        IntNSerializer(IntType()),
+        pytds.tds_types.FloatSerializer.instance,
+        pytds.tds_types.SmallIntSerializer.instance,
+        NVarChar72Serializer(size=20, collation=raw_collation),
+        pytds.tds_types.TinyIntSerializer.instance,
+        pytds.tds_types.RealSerializer.instance,
+        BitNSerializer(BitType()),
+    ]
+    columns = []
+    for serializer in serializers:
+        col = Column()
+        col.serializer = serializer
+        columns.append(col)
+    rows = [
+        [1, -2, True, 3, 1.5, -4, u'строка', 5, 0.5, False],
+        [-1, 2 ** 40, False, None, -1.5, 4, None, 255, -0.5, None],
+    ]
+    if nbc:
+        rows.append([None, 1, None, 3, None, None, u'x', 7, None, True])
+    tds = _TdsSocket()
+    sess = _TdsSession(tds, _FakeSock([_make_row_stream(columns, rows, nbc)]), None)
+    decoder = pytds.tds._RowDecoder(columns)
+    for expected in rows:
+        row = [None] * len(columns)
+        if nbc:
+            decoder.read_nbcrow(sess._reader, row)
+        else:
+            decoder.read_row(sess._reader, row)
+        assert row == expected
+
+
+def test_session_fetch_rows():
+    col = Column()
+    col.serializer = IntNSerializer(IntType())
+    tds = _TdsSocket()
+    sock = _FakeSock([])
+    w = _TdsSession(tds, sock, None)._writer
+    w.begin_packet(4)
+    for value in (1, None, 3):
+        w.put_byte(pytds.tds_base.TDS_ROW_TOKEN)
+        col.serializer.write(w, value)
+    w.put_byte(pytds.tds_base.TDS_DONE_TOKEN)
+    w.pack(struct.Struct('<HHQ'), pytds.tds_base.TDS_DONE_COUNT, 0, 3)
+    w.flush()
+
+    sess = _TdsSession(tds, _FakeSock([sock._sent]), None)
+    sess.res_info = info = pytds.tds._Results()
+    info.columns.append(col)
+    info.row_decoder = pytds.tds._RowDecoder(info.columns)
+    sess.more_rows = True
+    sess.state = pytds.tds_base.TDS_PENDING
+    assert sess.fetch_rows(2) == [[1], [None]]
+    assert sess.fetch_rows(10) == [[3]]
+    assert info.row_count == 3
+    assert sess.rows_affected == 3
+    assert sess.state == pytds.tds_base.TDS_IDLE
+    assert sess.fetch_rows(10) == []
+
+
+def test_cursor_fetch_before_execute():
+    class Conn(object):
+        pass
+
+    conn = Conn()
+    cur = pytds.Cursor(conn, _TdsSession(_TdsSocket(), _FakeSock([]), None), None)
+    with pytest.raises(pytds.ProgrammingError):
+        cur.fetchmany(2)
+    with pytest.raises(pytds.ProgrammingError):
+        cur.fetchall()
+    with pytest.raises(pytds.ProgrammingError):
+        cur.fetchone()
+
+
+def test_session_fetch_columns():
+    import array
+    columns = []
+    for serializer in (IntNSerializer(IntType()), FloatNSerializer(8), BitNSerializer(BitType()),
+                       NVarChar72Serializer(size=20, collation=raw_collation)):
+        col = Column()
+        col.column_name = 'c{}'.format(len(columns))
+        col.serializer = serializer
+        columns.append(col)
+    rows = [[1, 1.5, True, u'a'], [None, None, None, None], [3, -0.5, False, u'c']]
+    tds = _TdsSocket()
+    sock = _FakeSock([])
+    w = _TdsSession(tds, sock, None)._writer
+    w.begin_packet(4)
+    for row in rows:
+        w.put_byte(pytds.tds_base.TDS_ROW_TOKEN)
+        for col, value in zip(columns, row):
+            col.serializer.write(w, value)
+    w.put_byte(pytds.tds_base.TDS_DONE_TOKEN)
+    w.pack(struct.Struct('<HHQ'), 0, 0, 0)
+    w.flush()
+
+    sess = _TdsSession(tds, _FakeSock([sock._sent]), None)
+    sess.res_info = info = pytds.tds._Results()
+    info.columns.extend(columns)
+    info.row_decoder = pytds.tds._RowDecoder(info.columns)
+    sess.more_rows = True
+    sess.state = pytds.tds_base.TDS_PENDING
+    result = sess.fetch_columns(max_rows=1, pending_rows=[[0, 0.0, False, u'pending']])
+    assert [c.name for c in result] == ['c0', 'c1', 'c2', 'c3']
+    assert result[0].values == array.array('q', [0])
+    assert result[3].values == [u'pending']
+    ints, floats, bits, strs = sess.fetch_columns()
+    assert ints == ('c0', array.array('q', [1, 0, 3]), bytearray(b'\x01\x00\x01'))
+    assert floats.values == array.array('d', [1.5, 0, -0.5])
+    assert floats.validity == bytearray(b'\x01\x00\x01')
+    assert bits.values == array.array('b', [1, 0, 0])
+    assert bits.validity == bytearray(b'\x01\x00\x01')
+    assert strs.values == [u'a', None, u'c']
+    assert info.row_count == 3
+    assert sess.state == pytds.tds_base.TDS_IDLE
+
+
+@pytest.mark.parametrize('nbc', [False, True])
+def test_session_fetch_numpy(nbc):
+    numpy = pytest.importorskip('numpy')
+    import pytds.tds_numpy
+    columns = []
+    for serializer in (pytds.tds_types.IntSerializer.instance, pytds.tds_types.FloatSerializer.instance,
+                       IntNSerializer(IntType()), FloatNSerializer(8), BitNSerializer(BitType()),
+                       DateTime2Serializer(DateTime2Type(precision=7)), MsDecimalSerializer(10, 2),
+                       NVarChar72Serializer(size=20, collation=raw_collation)):
+        col = Column()
+        col.column_name = 'c{}'.format(len(columns))
+        col.serializer = serializer
+        columns.append(col)
+    rows = [
+        [1, 0.5, 10, 1.5, True, datetime.datetime(2017, 1, 2, 3, 4, 5, 123456), decimal.Decimal('1.25'), u'a'],
+        [2, 1.5, None, None, None, None, None, None],
+        [3, 2.5, -30, -0.5, False, datetime.datetime(1, 1, 1), decimal.Decimal('-3.50'), u'c'],
+    ]
+    stream = bytearray()
+    for row in rows:
+        stream.append(pytds.tds_base.TDS_NBC_ROW_TOKEN if nbc else pytds.tds_base.TDS_ROW_TOKEN)
+        stream += _make_row_stream(columns, [row], nbc)[8:]
+    stream += struct.pack('<BHHQ', pytds.tds_base.TDS_DONE_TOKEN, 0, 0, 0)
+    tds = _TdsSocket()
+    sess = _TdsSession(tds, _FakeSock(_split_into_packets(bytes(stream), 4096)), None)
+    sess.res_info = info = pytds.tds._Results()
+    info.columns.extend(columns)
+    info.row_decoder = pytds.tds._RowDecoder(info.columns)
+    sess.more_rows = True
+    sess.state = pytds.tds_base.TDS_PENDING
+    pending = [[0, 0.0, 5, 0.0, False, datetime.datetime(2000, 1, 1), decimal.Decimal('1'), u'p']]
+    batches = list(pytds.tds_numpy.fetch_batches(sess, 2, pending_rows=pending))
+    # pending row shares first batch with a row from the stream
+    assert [len(b) for b in batches] == [2, 2]
+    assert batches[0]['c2'][0] == 5
+    assert batches[0]['c5'][0] == numpy.datetime64('2000-01-01T00:00:00.000000')
+    batch = numpy.ma.concatenate(batches)[1:]
+    assert batch.dtype.names == ('c0', 'c1', 'c2', 'c3', 'c4', 'c5', 'c6', 'c7')
+    assert batch['c0'].dtype == numpy.dtype('<i4')
+    assert batch['c0'].tolist() == [1, 2, 3]
+    assert batch['c1'].tolist() == [0.5, 1.5, 2.5]
+    assert batch['c2'].tolist() == [10, None, -30]
+    assert batch['c3'].tolist() == [1.5, None, -0.5]
+    assert batch['c4'].dtype == numpy.dtype('?')
+    assert batch['c4'].tolist() == [True, None, False]
+    assert batch['c5'].dtype == numpy.dtype('datetime64[us]')
+    assert batch['c5'].tolist() == [datetime.datetime(2017, 1, 2, 3, 4, 5, 123456), None,
+                                     datetime.datetime(1, 1, 1)]
+    assert batch['c6'].dtype == numpy.dtype('<f8')
+    assert batch['c6'].tolist() == [1.25, None, -3.5]
+    assert batch['c7'].tolist() == [u'a', None, u'c']
+    assert info.row_count == 3
+    assert sess.state == pytds.tds_base.TDS_IDLE
+
+
+def test_cursor_fetch_numpy_after_fetch(monkeypatch):
+    pytest.importorskip('numpy')
+    serializer = IntNSerializer(IntType())
+
+    def write_response(w):
+        w.put_byte(pytds.tds_base.TDS7_RESULT_TOKEN)
+        w.put_usmallint(1)
+        w.put_uint(0)
+        w.put_usmallint(Column.fNullable)
+        w.put_byte(serializer.type)
+        serializer.write_info(w)
+        w.put_byte(2)
+        w.write_ucs2(u'c0')
+        for i in range(5):
+            w.put_byte(pytds.tds_base.TDS_ROW_TOKEN)
+            serializer.write(w, i)
+        w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_COUNT, 0, 5)
+
+    conn, sock = _connect_scripted(monkeypatch, [_make_token_stream(write_response)])
+    with conn.cursor() as cur:
+        cur.execute('select c0 from t')
+        assert cur.fetchone() == (0,)
+        # iteration prefetches rows 1 and 2
+        cur._fetch_batch_size = 2
+        assert next(cur) == (1,)
+        batches = list(cur.fetch_numpy(batch_rows=2))
+    assert [batch['c0'].tolist() for batch in batches] == [[2, 3], [4]]
+
+
+def test_numpy_fields_bad_size():
+    pytest.importorskip('numpy')
+    import pytds.tds_numpy
+    fields = [
+        pytds.tds_numpy._RawNField('c0', IntNSerializer(IntType()), 'i', '<i4', 1),
+        pytds.tds_numpy._DateTime2Field('c1', DateTime2Serializer(DateTime2Type(precision=7)), 2),
+    ]
+    for field in fields:
+        # size byte which does not match column type
+        sess = _TdsSession(_TdsSocket(), _FakeSock(_split_into_packets(b'\x03\x00\x00\x00', 4096)), None)
+        with pytest.raises(pytds.InterfaceError):
+            field.read(sess._reader)
+
+
+def _make_token_stream(write):
+    sock = _FakeSock([])
+    w = _TdsSession(_TdsSocket(), sock, None)._writer
+    w.begin_packet(4)
+    write(w)
+    w.flush()
+    return sock._sent[8:]
+
+
+def _write_login_response(w):
+    srv_name, _ = pytds.tds.ucs2_codec.encode(u'Fake Server')
+    w.put_byte(pytds.tds_base.TDS_LOGINACK_TOKEN)
+    w.put_usmallint(1 + 4 + 1 + len(srv_name) + 4)
+    w.put_byte(1)
+    w.put_uint_be(TDS74)
+    w.put_byte(len(srv_name) // 2)
+    w.write(srv_name)
+    w.write(b'\x01\x00\x00\x00')
+    w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, 0, 0, 0)
+
+
+def _write_query_response(w):
+    columns = [IntNSerializer(IntType()), NVarChar72Serializer(size=4000, collation=raw_collation)]
+    w.put_byte(pytds.tds_base.TDS7_RESULT_TOKEN)
+    w.put_usmallint(len(columns))
+    for i, serializer in enumerate(columns):
+        w.put_uint(0)
+        w.put_usmallint(1)
+        w.put_byte(serializer.type)
+        serializer.write_info(w)
+        name, _ = pytds.tds.ucs2_codec.encode(u'c{}'.format(i))
+        w.put_byte(len(name) // 2)
+        w.write(name)
+    rows = [(1, u'one'), (None, None), (3, u'three' * 20)]
+    for row in rows:
+        w.put_byte(pytds.tds_base.TDS_ROW_TOKEN)
+        for serializer, value in zip(columns, row):
+            serializer.write(w, value)
+    w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_COUNT, 0, len(rows))
+
+
+def _import_utils_aio():
+    if sys.version_info[0:2] < (3, 5):
+        pytest.skip('asyncio driver requires Python 3.5 and newer')
+    import utils_aio
+    return utils_aio
+
+
+def test_aio_query_over_small_packets():
+    utils_aio = _import_utils_aio()
+    import simple_server
+    prelogin = simple_server.TdsGenerator().generate_prelogin({
+        pytds.tds_base.PreLoginToken.ENCRYPTION: PreLoginEnc.ENCRYPT_NOT_SUP,
+    })
+    responses = [bytes(prelogin), _make_token_stream(_write_login_response)]
+    query_response = _make_token_stream(_write_query_response)
+    utils_aio.run(utils_aio.query_over_small_packets(responses, query_response, _split_into_packets))
+
+
+def test_aio_pool_connects_without_lock(monkeypatch):
+    utils_aio = _import_utils_aio()
+    utils_aio.run(utils_aio.pool_connects_without_lock(monkeypatch))
+
+
+def test_aio_commit_timeout():
+    utils_aio = _import_utils_aio()
+    import simple_server
+    prelogin = simple_server.TdsGenerator().generate_prelogin({
+        pytds.tds_base.PreLoginToken.ENCRYPTION: PreLoginEnc.ENCRYPT_NOT_SUP,
+    })
+
+    def write_begin_tran_response(w):
+        w.put_byte(pytds.tds_base.TDS_ENVCHANGE_TOKEN)
+        w.put_usmallint(1 + 1 + 8 + 1)
+        w.put_byte(pytds.tds_base.TDS_ENV_BEGINTRANS)
+        w.put_byte(8)
+        w.put_uint8(1)
+        w.put_byte(0)
+        w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, 0, 0, 0)
+
+    responses = [bytes(prelogin), _make_token_stream(_write_login_response),
+                 _make_token_stream(write_begin_tran_response)]
+    utils_aio.run(utils_aio.commit_timeout(responses, _split_into_packets))
+
+
+def test_aio_login(address):
+    utils_aio = _import_utils_aio()
+    with SimpleServer(address=address, enc=PreLoginEnc.ENCRYPT_NOT_SUP):
+        utils_aio.run(utils_aio.login(address))
+
+
+def test_protocol_session_events():
+    from pytds import protocol
+    packets = _split_into_packets(_make_token_stream(_write_query_response), 30)
+    data = b''.join(packets)
+    sess = protocol.ProtocolSession()
+    sess.state = pytds.tds_base.TDS_PENDING
+    events = []
+    for i in range(0, len(data), 7):
+        sess.feed(data[i:i + 7])
+        events.extend(sess.events(max_rows=2))
+    assert type(events[0]) is protocol.ColumnsMetadata
+    assert [col.column_name for col in events[0].columns] == ['c0', 'c1']
+    rows = [row for event in events[1:-1] for row in event.rows]
+    assert rows == [[1, u'one'], [None, None], [3, u'three' * 20]]
+    assert all(len(event.rows) <= 2 for event in events[1:-1])
+    assert events[-1] == protocol.Done(pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_COUNT, 3)
+    assert sess.state == pytds.tds_base.TDS_IDLE
+    assert sess.next_event() is None
+
+
+@pytest.mark.parametrize('contiguous_reads', [False, True])
+def test_protocol_session_matches_blocking_session(contiguous_reads):
+    from pytds import protocol
+    data = b''.join(_split_into_packets(_make_token_stream(_write_query_response), 30))
+    tds = _TdsSocket()
+    tds.contiguous_reads = contiguous_reads
+    blocking = _TdsSession(tds, _FakeSock([data]), None)
+    sans_io = protocol.ProtocolSession()
+    sans_io.feed(data)
+    results = []
+    for sess in (blocking, sans_io):
+        sess.state = pytds.tds_base.TDS_PENDING
+        assert sess.find_result_or_done()
+        rows = sess.fetch_rows(10)
+        results.append((sess.res_info.description, rows, sess.rows_affected, sess.state))
+    assert results[0] == results[1]
+    assert results[0][1] == [[1, u'one'], [None, None], [3, u'three' * 20]]
+
+
+class _FakePooledConn(object):
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+
+def test_connection_pool_limits():
+    pool = pytds.ConnectionPool(max_pool_size=2)
+    key = ('host', 'user')
+    assert pool.acquire(key) is None
+    assert pool.acquire(key) is None
+    item1 = (_FakePooledConn(), None)
+    item2 = (_FakePooledConn(), None)
+    with pytest.raises(pytds.OperationalError):
+        pool.acquire(key, timeout=0.01)
+
+    results = []
+
+    def waiter():
+        results.append(pool.acquire(key, timeout=10))
+
+    threads = [threading.Thread(target=waiter) for _ in range(2)]
+    for t in threads:
+        t.start()
+    while pool.stats(key)['waiting'] < 2:
+        threading.Event().wait(0.001)
+    pool.release(key, item1)
+    pool.discard(key, item2)
+    for t in threads:
+        t.join()
+    # first waiter receives released connection, second one gets place for a new one
+    assert sorted(results, key=lambda x: x is None) == [item1, None]
+    assert not item2[0].connected
+    stats = pool.stats()
+    assert stats['size'] == 2
+    assert stats['checkouts'] == 5
+    assert stats['waits'] == 3
+    assert stats['creations'] == 3
+    assert stats['discards'] == 1
+
+    pool.configure(max_pool_size=1)
+    pool.release(key, item1)
+    assert item1[0].connected is False
+    assert pool.stats(key)['size'] == 1
+    item3 = (_FakePooledConn(), None)
+    pool.release(key, item3)
+    assert pool.stats(key)['idle'] == 1
+    assert pool.acquire(key) is item3
+    pool.release(key, item3)
+    pool.clear()
+    assert not item3[0].connected
+    assert pool.stats(key)['size'] == 0
+    with pytest.raises(ValueError):
+        pool.configure(min_pool_size=2)
+
+
+def test_connection_pool_idle_timeout():
+    pool = pytds.ConnectionPool(min_pool_size=1, idle_timeout=0)
+    key = 'key'
+    items = [(_FakePooledConn(), None) for _ in range(3)]
+    for _ in items:
+        assert pool.acquire(key) is None
+    for item in items:
+        pool.release(key, item)
+    threading.Event().wait(0.01)
+    # two oldest connections expire, one is kept because of min_pool_size
+    assert pool.acquire(key) is items[2]
+    assert [item[0].connected for item in items] == [False, False, True]
+    items[2][0].close()
+    pool.release(key, items[2])
+    assert pool.acquire(key) is None
+    assert pool.stats(key)['size'] == 1
+
+
+def test_writer_reset_connection_flag():
+    from pytds import protocol
+    PacketStatus = pytds.tds_base.PacketStatus
+    sess = protocol.ProtocolSession()
+    sess.conn.tds72_transaction = 5
+    sess.request_reset()
+    assert sess.conn.tds72_transaction == 0
+    w = sess._writer
+    w.bufsize = 512
+    # cancel is not a request which can reset connection
+    w.begin_packet(pytds.tds_base.PacketType.CANCEL)
+    w.flush()
+    assert sess.data_to_send()[1] == PacketStatus.EOM
+    assert w.reset_pending
+    w.begin_packet(pytds.tds_base.PacketType.QUERY)
+    w.write(b'x' * 1100)
+    w.flush()
+    data = sess.data_to_send()
+    statuses = []
+    while data:
+        statuses.append(data[1])
+        data = data[struct.unpack('>H', data[2:4])[0]:]
+    assert statuses == [PacketStatus.RESETCONNECTION, 0, PacketStatus.EOM]
+    assert not w.reset_pending
+    w.begin_packet(pytds.tds_base.PacketType.QUERY)
+    w.flush()
+    assert sess.data_to_send()[1] == PacketStatus.EOM
+    sess.request_reset(keep_transaction=True)
+    w.begin_packet(pytds.tds_base.PacketType.RPC)
+    w.flush()
+    assert sess.data_to_send()[1] == PacketStatus.EOM | PacketStatus.RESETCONNECTIONSKIPTRAN
+
+
+class _FakeRpcSession(object):
+    def __init__(self):
+        self.requests = []
+        self.output_params = {}
+        self._next_handle = 1
+
+    def make_param(self, name, value):
+        return value
+
+    def submit_rpc(self, proc, params, flags):
+        self.requests.append((proc.name, params))
+        if proc is pytds.tds_base.SP_PREPARE:
+            param = Column()
+            param.value = self._next_handle
+            self._next_handle += 1
+            self.output_params = {0: param}
+
+    def process_simple_request(self):
+        pass
+
+
+def test_statement_cache_lru():
+    def make_params(*names):
+        params = []
+        for name in names:
+            col = Column()
+            col.column_name = name
+            col.type = IntType()
+            params.append(col)
+        return params
+
+    cache = pytds._StatementCache(2)
+    sess = _FakeRpcSession()
+    p1 = make_params('@P1')
+    cache.submit(sess, u'select @P1', p1, u'@P1 INT')
+    assert [r[0] for r in sess.requests] == ['sp_prepare', 'sp_execute']
+    assert sess.requests[0][1][1:] == [u'@P1 INT', u'select @P1', 0]
+    assert sess.requests[1][1] == [1] + p1
+    del sess.requests[:]
+    cache.submit(sess, u'select @P1', p1, u'@P1 INT')
+    cache.submit(sess, u'select @P1 + 1', p1, u'@P1 INT')
+    assert [r[0] for r in sess.requests] == ['sp_execute', 'sp_prepare', 'sp_execute']
+    del sess.requests[:]
+    # first statement was used least recently and is evicted
+    cache.submit(sess, u'select @a', make_params('@a'), u'@a INT')
+    assert [r[0] for r in sess.requests] == ['sp_unprepare', 'sp_prepare', 'sp_execute']
+    assert sess.requests[0][1] == [1]
+    assert len(cache) == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_template_cache():
+    from pytds.protocol import ProtocolSession
+    sess = ProtocolSession()
+    sess.conn.type_inferrer = TdsTypeInferrer(
+        type_factory=sess.conn.type_factory, collation=raw_collation, bytes_to_unicode=True, allow_tz=False)
+    cache = pytds._TemplateCache(2)
+    op, params, decl = pytds._bind_operation(sess, 'select %s, %s, %s', (1, u'a', None), cache)
+    assert op == u'select @P1, @P2, NULL'
+    assert decl == u'@P1 INT,@P2 NVARCHAR(MAX)'
+    assert [p.value for p in params] == [1, u'a']
+    assert all(p.serializer is not None for p in params)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    op2, params2, decl2 = pytds._bind_operation(sess, 'select %s, %s, %s', (2, u'b', None), cache)
+    assert (op2, decl2) == (op, decl)
+    assert [p.value for p in params2] == [2, u'b']
+    assert [p.serializer for p in params2] == [p.serializer for p in params]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # value which needs wider type is a different template
+    op3, params3, decl3 = pytds._bind_operation(sess, 'select %s, %s, %s', (2 ** 40, u'b', None), cache)
+    assert decl3 == u'@P1 BIGINT,@P2 NVARCHAR(MAX)'
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # named parameters
+    op4, params4, decl4 = pytds._bind_operation(sess, 'select %(a)s', {'a': 1.5}, cache)
+    pytds._bind_operation(sess, 'select %(a)s', {'a': 2.5}, cache)
+    assert op4 == u'select @a'
+    assert decl4 == u'@a FLOAT'
+    assert (cache.hits, cache.misses) == (2, 3)
+    assert len(cache) == 2
+
+    # decimals are not cached since their type depends on value
+    pytds._bind_operation(sess, 'select %s', (decimal.Decimal('1.5'),), cache)
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_rpc_batch():
+    from pytds.protocol import ProtocolSession
+    sess = ProtocolSession()
+    sess.conn.type_inferrer = TdsTypeInferrer(
+        type_factory=sess.conn.type_factory, collation=raw_collation, bytes_to_unicode=True, allow_tz=False)
+    pytds._submit_operation_batch(sess, 'insert into t values (%s)', [(1,), (2,), ()])
+    data = sess.data_to_send()
+    # second and third calls of sp_executesql are preceded by batch flag
+    assert data.count(b'\xff\xff\xff\x0a\x00') == 2
+    assert sess.state == pytds.tds_base.TDS_PENDING
+
+    done = struct.Struct('<BHHQ')
+    more = pytds.tds_base.TDS_DONE_MORE_RESULTS
+    count = pytds.tds_base.TDS_DONE_COUNT
+
+    def write_response(w):
+        for i in range(3):
+            if i < 2:
+                w.pack(done, pytds.tds_base.TDS_DONEINPROC_TOKEN, more | count, 0, 1)
+            w.pack(done, pytds.tds_base.TDS_DONEPROC_TOKEN, more if i < 2 else 0, 0, 0)
+
+    sess.feed(b''.join(_split_into_packets(_make_token_stream(write_response), 512)))
+    assert sess.process_rpc_batch() == [1, 1, -1]
+    assert sess.state == pytds.tds_base.TDS_IDLE
+
+
+def test_fast_executemany_rewrite():
+    parse = pytds._parse_insert_values
+    assert parse('INSERT INTO dbo.t (a, b) VALUES (%s, %s)') == ('INSERT INTO dbo.t (a, b) VALUES', [None, None])
+    assert parse('insert t values(%(a)s,%(b)s);') == ('insert t values', ['a', 'b'])
+    assert parse('insert into t (a) values (%s, 1)') is None
+    assert parse('insert into t (a) values (%s, %(b)s)') is None
+    assert parse('insert into t (a) select %s') is None
+    assert parse("insert into t (a) values ('x'); insert into t (a) values (%s)") is None
+    assert parse('update t set a = %s') is None
+
+    assert pytds._multirow_insert(u'insert t values', 2, 2) == u'insert t values (%s, %s), (%s, %s)'
+
+    chunks = pytds._insert_chunks([None, None], [(1, u'a'), (None, u'b'), (2, None), (u'x', u'c')])
+    # string can't share column with integers
+    assert chunks == [[[1, u'a'], [None, u'b'], [2, None]], [[u'x', u'c']]]
+    chunks = pytds._insert_chunks(['a'], [{'a': i} for i in range(2500)])
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    chunks = pytds._insert_chunks([None] * 3, [(1, 2, 3)] * 1500)
+    assert [len(chunk) for chunk in chunks] == [699, 699, 102]
+    assert pytds._insert_chunks([None], [(1, 2)]) is None
+    assert pytds._insert_chunks([None], [(2 ** 70,)]) is None
+    assert pytds._insert_chunks(['a'], [{'b': 1}]) is None
+
+
+def test_sql_type_by_serializer():
+    from pytds.tds_types import sql_type_by_serializer
+
+    def declaration(serializer):
+        return sql_type_by_serializer(serializer).get_declaration()
+
+    assert declaration(IntNSerializer(BigIntType())) == 'BIGINT'
+    assert declaration(FloatNSerializer(4)) == 'REAL'
+    assert declaration(MsDecimalSerializer(precision=12, scale=3)) == 'DECIMAL(12, 3)'
+    assert declaration(NVarChar72Serializer(size=50, collation=raw_collation)) == 'NVARCHAR(50)'
+    assert declaration(NVarCharMaxSerializer(collation=raw_collation)) == 'NVARCHAR(MAX)'
+    assert declaration(VarChar72Serializer(size=20, collation=raw_collation)) == 'VARCHAR(20)'
+    assert declaration(VarBinarySerializer72(16)) == 'VARBINARY(16)'
+    assert declaration(VarBinarySerializerMax()) == 'VARBINARY(MAX)'
+    assert declaration(DateTime2Serializer(DateTime2Type(precision=3))) == 'DATETIME2(3)'
+    assert declaration(DateTimeNSerializer(8)) == 'DATETIME'
+    assert declaration(MoneyNSerializer(4)) == 'SMALLMONEY'
+    assert declaration(MsUniqueSerializer()) == 'UNIQUEIDENTIFIER'
+
+
+class _FakeBulkConn(object):
+    def __init__(self, loaded, fail_on=None, fail_at_end=False, autocommit=None):
+        self._loaded = loaded
+        self.autocommit = autocommit
+        self._fail_on = fail_on
+        self._fail_at_end = fail_at_end
+        self.committed = False
+        self.rolled_back = False
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def copy_to(self, table_or_view, data, **kwargs):
+        for row in data:
+            if row == self._fail_on:
+                raise pytds.IntegrityError('duplicate key')
+            self._loaded.append(row)
+        if self._fail_at_end:
+            raise pytds.OperationalError('lost connection')
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_parallel_copy(monkeypatch):
+    import pytds.bulk
+    loaded = []
+    conns = []
+
+    def connect(**kwargs):
+        conn = _FakeBulkConn(loaded, **kwargs)
+        conns.append(conn)
+        return conn
+
+    monkeypatch.setattr(pytds, 'connect', connect)
+    rows = [(i,) for i in range(1000)]
+    stats = pytds.bulk.parallel_copy({}, 't', iter(rows), workers=3, chunk_rows=7)
+    assert sorted(loaded) == rows
+    assert sum(s.rows for s in stats) == 1000
+    assert [s.worker for s in stats] == [0, 1, 2]
+    assert all(conn.committed and conn.closed for conn in conns)
+    assert all(conn.autocommit is False for conn in conns)
+
+    with pytest.raises(ValueError):
+        pytds.bulk.parallel_copy({'autocommit': True}, 't', iter(rows), workers=3, chunk_rows=7)
+
+    del conns[:]
+    with pytest.raises(pytds.IntegrityError):
+        pytds.bulk.parallel_copy({'fail_on': (500,)}, 't', iter(rows), workers=3, chunk_rows=7)
+    assert all(conn.closed for conn in conns)
+    assert not any(conn.committed for conn in conns)
+
+
+def test_parallel_copy_fails_as_unit(monkeypatch):
+    import itertools
+    import time
+    import pytds.bulk
+    conns = []
+    counter = itertools.count()
+
+    def connect(**kwargs):
+        # the last worker fails after other workers have loaded their rows
+        conn = _FakeBulkConn([], fail_at_end=next(counter) == 2)
+        conns.append(conn)
+        if conn._fail_at_end:
+            time.sleep(0.1)
+        return conn
+
+    monkeypatch.setattr(pytds, 'connect', connect)
+    with pytest.raises(pytds.OperationalError):
+        pytds.bulk.parallel_copy({}, 't', iter([(i,) for i in range(100)]), workers=3, chunk_rows=10)
+    assert len(conns) == 3
+    assert not any(conn.committed for conn in conns)
+    assert all(conn.closed for conn in conns)
+    assert sum(conn.rolled_back for conn in conns) == 2
+
+
+def test_submit_bulk_columns():
+    def bulk_stream(submit, *args):
+        tds = _TdsSocket()
+        tds.tds_version = TDS74
+        sock = _FakeSock(b'')
+        tds._main_session = _TdsSession(tds, sock, None)
+        tds.sock = sock
+        metadata = []
+        for name, typ in [('i', IntType()), ('b', BigIntType()), ('f', FloatType()), ('t', BitType())]:
+            col = Column(name=name, type=typ, flags=Column.fNullable)
+            metadata.append(col)
+        getattr(tds._main_session, submit)(metadata, *args)
+        return bytes(sock._sent)
+
+    num_rows = 20000
+    ints = [i - 10 for i in range(num_rows)]
+    bigs = [None if i % 7 == 0 else i * 2 ** 33 for i in range(num_rows)]
+    floats = [i / 4.0 for i in range(num_rows)]
+    float_validity = bytearray(0 if i % 1000 == 5 else 1 for i in range(num_rows))
+    bits = [i % 3 == 0 for i in range(num_rows)]
+    rows = [(ints[i], bigs[i], floats[i] if float_validity[i] else None, bits[i]) for i in range(num_rows)]
+    expected = bulk_stream('submit_bulk', rows)
+    columns = [array.array('i', ints), bigs, (array.array('d', floats), float_validity), array.array('b', bits)]
+    assert bulk_stream('submit_bulk_columns', columns) == expected
+    # ColumnData and values packed from lists
+    columns = [ints, bigs, pytds.tds.ColumnData('f', floats, float_validity), bits]
+    assert bulk_stream('submit_bulk_columns', columns) == expected
+
+
+def test_submit_bulk_limits():
+    tds = _TdsSocket()
+    tds.tds_version = TDS74
+    sock = _FakeSock(b'')
+    sess = _TdsSession(tds, sock, None)
+    tds._main_session = sess
+    tds.sock = sock
+    metadata = [Column(name='c1', type=BigIntType(), flags=Column.fNullable)]
+    rows = iter([(i,) for i in range(1000)])
+    assert sess.submit_bulk(metadata, rows, max_rows=300) == 300
+    assert next(rows) == (300,)
+    num_packets = len(_split_into_packets(bytes(sock._sent[8:]), sess._writer.bufsize))
+    assert sess._writer.stream_bytes == len(sock._sent) - 8 * num_packets
+
+    # every row takes 10 bytes
+    sess.state = pytds.tds_base.TDS_IDLE
+    assert sess.submit_bulk(metadata, rows, max_bytes=1000) < 100
+    assert sess._writer.stream_bytes >= 1000
+
+    columns = [[1, 2, 3], (array.array('i', [4, 5, 6]), bytearray([1, 0, 1]))]
+    assert pytds.tds._slice_bulk_columns(columns, 1, 3) == [[2, 3], (array.array('i', [5, 6]), bytearray([0, 1]))]
+
+
+def test_type_memoization():
+    factory = SerializerFactory(TDS74)
+    inferrer = TdsTypeInferrer(type_factory=factory, collation=raw_collation, bytes_to_unicode=True)
+    before = pytds.tds_types.type_cache_stats()
+    assert inferrer.from_value(1) is inferrer.from_value(2)
+    assert inferrer.from_value(2 ** 40) == BigIntType()
+    assert inferrer.from_value(u'a') is inferrer.from_value(u'b')
+    assert inferrer.from_value(datetime.datetime(2020, 1, 1)) == DateTime2Type(precision=6)
+    assert inferrer.from_value(decimal.Decimal('1.5')) == DecimalType(precision=2, scale=1)
+    assert inferrer.from_value(decimal.Decimal('1.25')) == DecimalType(precision=3, scale=2)
+    # other settings don't share entries
+    other = TdsTypeInferrer(type_factory=SerializerFactory(TDS71), collation=raw_collation)
+    assert other.from_value(datetime.datetime(2020, 1, 1)) == DateTimeType()
+    after = pytds.tds_types.type_cache_stats()
+    assert after['types']['hits'] - before['types']['hits'] >= 2
+
+    serializer = factory.serializer_by_type(NVarCharType(size=10), collation=raw_collation)
+    assert factory.serializer_by_type(NVarCharType(size=10), collation=raw_collation) is serializer
+    assert factory.serializer_by_type(NVarCharType(size=20), collation=raw_collation) is not serializer
+    collation = Collation(1033, 0, True, False, False, False, False, False, 0)
+    assert factory.serializer_by_type(NVarCharType(size=10), collation=collation)._collation is collation
+    assert SerializerFactory(TDS71).serializer_by_type(DecimalType(10, 2)) is not factory.serializer_by_type(
+        DecimalType(10, 2))
+
+    # key has attribute names and doesn't depend on order of instance dictionary
+    first, second = DecimalType(10, 2), DecimalType(10, 2)
+    second.__dict__ = dict(reversed(list(second.__dict__.items())))
+    key = pytds.tds_types._serializer_key(first, None, TDS74)
+    assert key == pytds.tds_types._serializer_key(second, None, TDS74)
+    assert key[2:] == (('_precision', 10), ('_scale', 2))
+
+
+def test_metadata_cache():
+    serializers = [IntNSerializer(IntType()), NVarChar72Serializer(size=40, collation=raw_collation)]
+
+    def write_response(w, serializers):
+        w.put_byte(pytds.tds_base.TDS7_RESULT_TOKEN)
+        w.put_usmallint(len(serializers))
+        for i, serializer in enumerate(serializers):
+            w.put_uint(0)
+            w.put_usmallint(Column.fNullable)
+            w.put_byte(serializer.type)
+            serializer.write_info(w)
+            name = u'c{}'.format(i)
+            w.put_byte(len(name))
+            w.write_ucs2(name)
+        w.put_byte(pytds.tds_base.TDS_ROW_TOKEN)
+        for serializer in serializers:
+            serializer.write(w, None)
+        w.put_byte(pytds.tds_base.TDS_DONE_TOKEN)
+        w.pack(struct.Struct('<HHQ'), 0, 0, 0)
+
+    def query(tds, serializers):
+        payload = bytes(_make_token_stream(lambda w: write_response(w, serializers)))
+        sess = _TdsSession(tds, _FakeSock(_split_into_packets(payload, 512)), None)
+        sess.state = pytds.tds_base.TDS_PENDING
+        assert sess.find_result_or_done()
+        assert sess.fetch_rows(10) == [[None] * len(serializers)]
+        return sess.res_info
+
+    tds = _TdsSocket()
+    first = query(tds, serializers)
+    second = query(tds, serializers)
+    assert second is not first
+    assert second.columns is first.columns
+    assert second.description is first.description
+    assert second.row_decoder is first.row_decoder
+    assert second.row_count == 1
+    assert (tds.metadata_cache.hits, len(tds.metadata_cache)) == (1, 1)
+
+    # different collation of the same column
+    collation = Collation(1033, 0, True, False, False, False, False, False, 0)
+    other = query(tds, [serializers[0], NVarChar72Serializer(size=40, collation=collation)])
+    assert other.columns[1].serializer._collation.pack() == collation.pack()
+    assert len(tds.metadata_cache) == 2
+
+    assert other.columns is not first.columns
+    assert tds.metadata_cache.hits == 1
+
+    # different type of a column with the same name
+    other = query(tds, [FloatNSerializer(8), serializers[1]])
+    assert isinstance(other.columns[0].serializer, FloatNSerializer)
+    assert other.row_decoder is not first.row_decoder
+    assert (tds.metadata_cache.hits, len(tds.metadata_cache)) == (1, 3)
+
+    # columns with chunk handlers are not cached
+    query(tds, [NVarCharMaxSerializer(collation=raw_collation)])
+    query(tds, [NVarCharMaxSerializer(collation=raw_collation)])
+    assert tds.metadata_cache.hits == 1
+
+    conn = pytds.Connection()
+    conn._conn = tds
+    tds._is_connected = True
+    assert conn.metadata_cache_stats() == {'hits': 1, 'misses': 5, 'size': 3}
+
+    # cache is disabled with metadata_cache_size=0, login then leaves it unset
+    disabled = pytds.Connection()
+    pytds._prepare_connection(disabled, server='localhost', metadata_cache_size=0)
+    assert disabled._login.metadata_cache_size == 0
+    assert _TdsLogin.metadata_cache_size == 64
+    tds.metadata_cache = None
+    assert conn.metadata_cache_stats() is None
+    first = query(tds, serializers)
+    assert query(tds, serializers).columns is not first.columns
+
+
+def test_fast_fixed_decoders():
+    import random
+    from pytds import tds_types
+    rnd = random.Random(0)
+    for _ in range(2000):
+        days = rnd.randrange(3652059)
+        ticks = rnd.randrange(864000000000)
+        assert tds_types._decode_datetime(days, ticks // 10) == tds_types.DateTime2(
+            tds_types.Date(days), tds_types.Time(ticks * 100)).to_pydatetime()
+        assert tds_types._decode_time(ticks // 10) == tds_types.Time(ticks * 100).to_pytime()
+        offset = rnd.randrange(-840, 841)
+        if 1 <= days < 3652058:
+            expected = tds_types.DateTimeOffset(tds_types.Date(days), tds_types.Time(ticks * 100), offset)
+            local_days, microseconds = divmod(ticks // 10 + offset * 60000000, tds_types._microseconds_per_day)
+            value = tds_types._decode_datetime(days + local_days, microseconds, tds_types._offset_timezone(offset))
+            assert value == expected.to_pydatetime()
+            assert value.utcoffset() == expected.to_pydatetime().utcoffset()
+        legacy_days = rnd.randrange(-53690, 2958464)
+        time_part = rnd.randrange(25920000)
+        assert DateTimeSerializer.decode(legacy_days, time_part) == DateTime(legacy_days, time_part).to_pydatetime()
+        magnitude = rnd.randrange(10 ** rnd.randrange(1, 39))
+        scale = rnd.randrange(39)
+        with decimal.localcontext() as ctx:
+            ctx.prec = 38
+            expected = decimal.Decimal(magnitude) / 10 ** scale
+            negative = decimal.Decimal(magnitude) * -1 / 10 ** scale
+        assert str(tds_types._decode_decimal(1, magnitude, scale)) == str(expected)
+        assert str(tds_types._decode_decimal(0, magnitude, scale)) == str(negative)
+
+    tds = _TdsSocket()
+    sess = _TdsSession(tds, _FakeSock([]), None)
+    assert sess.utc_tzinfo is None
+    sess.tzinfo_factory = pytds.tz.FixedOffsetTimezone
+    assert sess.utc_tzinfo.utcoffset(None) == datetime.timedelta(0)
+
+
+def test_fast_encoders():
+    import random
+    from pytds import tds_types
+
+    class Writer(object):
+        def __init__(self):
+            self.data = b''
+            self.session = None
+
+        def write(self, data):
+            self.data += data
+
+        def put_byte(self, value):
+            self.data += struct.pack('B', value)
+
+        def put_smallint(self, value):
+            self.data += struct.pack('<h', value)
+
+        def pack(self, struc, *args):
+            self.data += struc.pack(*args)
+
+    def encode(serializer, value):
+        w = Writer()
+        serializer.write(w, value)
+        return w.data
+
+    rnd = random.Random(0)
+    for _ in range(2000):
+        value = datetime.datetime.min + datetime.timedelta(days=rnd.randrange(3652059),
+                                                           microseconds=rnd.randrange(86400000000))
+        prec = rnd.randrange(8)
+        dt2 = tds_types.DateTime2Serializer(tds_types.DateTime2Type(precision=prec))
+        legacy = Writer()
+        dt2._write_time(legacy, tds_types.Time.from_pytime(value), prec)
+        dt2._write_date(legacy, tds_types.Date.from_pydate(value))
+        assert encode(dt2, value) == struct.pack('B', dt2.size) + legacy.data
+        time = tds_types.MsTimeSerializer(tds_types.TimeType(precision=prec))
+        legacy = Writer()
+        time._write_time(legacy, tds_types.Time.from_pytime(value.time()), prec)
+        assert encode(time, value.time()) == struct.pack('B', time.size) + legacy.data
+        date = tds_types.MsDateSerializer(tds_types.DateType())
+        assert encode(date, value.date()) == b'\x03' + struct.pack('<l', value.toordinal() - 1)[:3]
+        if tds_types.DateTime.MIN_PYDATETIME <= value <= tds_types.DateTime.MAX_PYDATETIME:
+            dt = tds_types.DateTime.from_pydatetime(value)
+            assert DateTimeSerializer.encode(value) == DateTimeSerializer._struct.pack(dt.days, dt.time_part)
+            assert DateTimeSerializer.decode(dt.days, dt.time_part) == dt.to_pydatetime()
+
+        precision = rnd.randrange(1, 39)
+        scale = rnd.randrange(precision + 1)
+        magnitude = rnd.randrange(10 ** precision)
+        positive = rnd.randrange(2)
+        with decimal.localcontext() as ctx:
+            ctx.prec = 38
+            value = decimal.Decimal(magnitude) / 10 ** scale
+            if not positive:
+                value = -value
+        serializer = tds_types.MsDecimalSerializer(precision=precision, scale=scale)
+        buf = encode(serializer, value)
+        assert buf[0:1] == struct.pack('B', serializer.size)
+        assert buf[1:2] == struct.pack('B', 1 if magnitude and positive else 0)
+        assert tds_types._decode_num(buf[2:]) == magnitude
+
+    with pytest.raises(pytds.DataError):
+        encode(tds_types.MsDecimalSerializer(precision=4, scale=0), decimal.Decimal(10 ** 10))
+
+
+def test_read_str_in_place():
+    from pytds.tds import _header, _TdsReader, _TdsContiguousReader
+    from pytds.collate import ucs2_codec
+    collation = Collation(1033, 0, True, False, False, False, False, False, 0)
+    payload = ucs2_codec.encode(u'hello')[0] + collation.pack() + ucs2_codec.encode(u'world')[0] + collation.pack()
+    # second string and collation span packet boundary
+    packets = [payload[:13], payload[13:23], payload[23:]]
+    packets = [_header.pack(4, 0, _header.size + len(p), 0, i) + p for i, p in enumerate(packets)]
+    for reader_class in (_TdsReader, _TdsContiguousReader):
+        sess = _TdsSession(_TdsSocket(), _FakeSock(list(packets)), None)
+        r = reader_class(sess)
+        assert r.read_str(10, ucs2_codec) == u'hello'
+        first = r.get_collation()
+        assert first.pack() == collation.pack()
+        assert r.read_ucs2(5) == u'world'
+        assert r.get_collation() is first
+    assert first.get_codec() is collation.get_codec()
+
+
+class _ScriptedSock(_FakeSock):
+    """ Socket which answers every complete request with the next response of the script
+
+    Requests are recorded as tuples of packet type and payload, cancel requests
+    are acknowledged without taking a response from the script.
+    """
+    def __init__(self, responses):
+        super(_ScriptedSock, self).__init__([])
+        self._responses = list(responses)
+        self._request = b''
+        self.requests = []
+
+    def sendall(self, buf, flags=0):
+        buf = bytes(bytearray(buf))
+        while buf:
+            packet_type, status, size = struct.unpack('>BBH', buf[:4])
+            self._request += buf[8:size]
+            buf = buf[size:]
+            if packet_type == pytds.tds_base.PacketType.CANCEL:
+                self._packets.extend(_split_into_packets(struct.pack(
+                    '<BHHQ', pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_CANCELLED, 0, 0), 512))
+            elif status & 1:
+                self.requests.append((packet_type, self._request))
+                self._request = b''
+                self._packets.extend(_split_into_packets(self._responses.pop(0), 512))
+
+    def settimeout(self, timeout):
+        pass
+
+    def gettimeout(self):
+        return None
+
+
+def _write_error(w, number, message):
+    message, _ = pytds.tds.ucs2_codec.encode(message)
+    w.put_byte(pytds.tds_base.TDS_ERROR_TOKEN)
+    w.put_usmallint(4 + 1 + 1 + 2 + len(message) + 1 + 1 + 4)
+    w.put_int(number)
+    w.put_byte(1)
+    w.put_byte(16)
+    w.put_usmallint(len(message) // 2)
+    w.write(message)
+    w.put_byte(0)
+    w.put_byte(0)
+    w.put_int(1)
+    w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_ERROR, 0, 0)
+
+
+def _write_done(w):
+    w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, 0, 0, 0)
+
+
+def _connect_scripted(monkeypatch, responses):
+    """ Opens connection to :class:`_ScriptedSock` which answers login and then gives responses """
+    import socket
+    import simple_server
+    prelogin = simple_server.TdsGenerator().generate_prelogin({
+        pytds.tds_base.PreLoginToken.ENCRYPTION: PreLoginEnc.ENCRYPT_NOT_SUP,
+    })
+    sock = _ScriptedSock([bytes(prelogin), _make_token_stream(_write_login_response)] + list(responses))
+    monkeypatch.setattr(socket, 'create_connection', lambda *args, **kwargs: sock)
+    conn = pytds.connect('127.0.0.1', port=1433, user='sa', password='password', autocommit=True,
+                         disable_connect_retry=True)
+    return conn, sock
+
+
+def _parse_bulk(payload):
+    """ Parses data stream of ``INSERT BULK``, returns session and rows """
+    from pytds.protocol import ProtocolSession, Rows
+    sess = ProtocolSession()
+    sess.conn._login = _TdsLogin()
+    sess.conn._login.bytes_to_unicode = True
+    sess.feed(b''.join(_split_into_packets(payload, 512)))
+    rows = []
+    for event in sess.events():
+        if isinstance(event, Rows):
+            rows.extend(event.rows)
+    return sess, rows
+
+
+def test_copy_to_discovered_nvarchar(monkeypatch):
+    collation = Collation(1033, 0, True, False, False, False, False, False, 0)
+    columns = [IntNSerializer(IntType()), NVarChar72Serializer(size=20, collation=collation)]
+
+    def write_probe_response(w):
+        w.put_byte(pytds.tds_base.TDS7_RESULT_TOKEN)
+        w.put_usmallint(len(columns))
+        for i, serializer in enumerate(columns):
+            w.put_uint(0)
+            w.put_usmallint(Column.fNullable)
+            w.put_byte(serializer.type)
+            serializer.write_info(w)
+            name = u'c{}'.format(i)
+            w.put_byte(len(name))
+            w.write_ucs2(name)
+        w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_COUNT, 0, 0)
+
+    probe = _make_token_stream(write_probe_response)
+    done = _make_token_stream(_write_done)
+    failure = _make_token_stream(lambda w: _write_error(w, 207, u'Invalid column name'))
+    conn, sock = _connect_scripted(monkeypatch, [
+        probe, done, done,  # first load discovers columns
+        done, done,  # second load uses cached columns
+        done, failure,  # third load fails
+        probe, done, done,  # so fourth load discovers columns again
+        probe, done, done,  # as well as explicit refresh
+    ])
+    rows = [[1, u'один'], [None, None], [3, u'x' * 20]]
+
+    def load(**kwargs):
+        del sock.requests[:]
+        with conn.cursor() as cur:
+            cur.copy_to(table_or_view='t', data=rows, **kwargs)
+        return [packet_type for packet_type, _ in sock.requests]
+
+    query, bulk = pytds.tds_base.PacketType.QUERY, pytds.tds_base.PacketType.BULK
+    assert load() == [query, query, bulk]
+    operation = pytds.tds.ucs2_codec.decode(sock.requests[1][1][22:])[0]
+    assert operation.startswith(u'INSERT BULK [t]([c0] INT,[c1] NVARCHAR(20))')
+    sess, parsed = _parse_bulk(sock.requests[2][1])
+    assert parsed == rows
+    assert sess.res_info.columns[1].serializer._collation.pack() == collation.pack()
+
+    assert load() == [query, bulk]
+    with pytest.raises(pytds.ProgrammingError):
+        load()
+    assert len(conn._bulk_metadata) == 0
+    assert load() == [query, query, bulk]
+    assert load(refresh_metadata=True) == [query, query, bulk]
+
+
+def test_copy_to_discovered_legacy_lob(monkeypatch):
+    collation = Collation(1033, 0, True, False, False, False, False, False, 0)
+
+    def write_probe_response(w):
+        w.put_byte(pytds.tds_base.TDS7_RESULT_TOKEN)
+        w.put_usmallint(3)
+        for i, type_id in enumerate([pytds.tds_base.SYBTEXT, pytds.tds_base.SYBNTEXT, pytds.tds_base.SYBIMAGE]):
+            w.put_uint(0)
+            w.put_usmallint(Column.fNullable)
+            w.put_byte(type_id)
+            w.put_int(0x7fffffff)
+            if type_id != pytds.tds_base.SYBIMAGE:
+                w.put_collation(collation)
+            # table name
+            w.put_byte(1)
+            w.put_usmallint(1)
+            w.write_ucs2(u't')
+            name = u'c{}'.format(i)
+            w.put_byte(len(name))
+            w.write_ucs2(name)
+        w.pack(struct.Struct('<BHHQ'), pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_COUNT, 0, 0)
+
+    done = _make_token_stream(_write_done)
+    conn, sock = _connect_scripted(monkeypatch, [_make_token_stream(write_probe_response), done, done])
+    rows = [[u'abc', u'один', b'\x01\x02'], [None, None, None]]
+    del sock.requests[:]
+    with conn.cursor() as cur:
+        cur.copy_to(table_or_view='t', data=rows)
+    operation = pytds.tds.ucs2_codec.decode(sock.requests[1][1][22:])[0]
+    assert operation.startswith(u'INSERT BULK [t]([c0] VARCHAR(MAX),[c1] NVARCHAR(MAX),[c2] VARBINARY(MAX))')
+    sess, parsed = _parse_bulk(sock.requests[2][1])
+    assert parsed == rows
+    assert sess.res_info.columns[0].serializer._collation.pack() == collation.pack()
+
+
+def test_copy_to_batches(monkeypatch):
+    conn, sock = _connect_scripted(monkeypatch, [_make_token_stream(_write_done)] * 100)
+    commits = []
+    monkeypatch.setattr(conn, 'commit', lambda: commits.append(len(sock.requests)))
+    columns = [Column(name='c0', type=IntType(), flags=Column.fNullable)]
+    rows = [[i] for i in range(10)]
+
+    def load(**kwargs):
+        del sock.requests[:]
+        del commits[:]
+        reports = []
+        with conn.cursor() as cur:
+            cur.copy_to(table_or_view='t', columns=columns, progress=lambda *args: reports.append(args), **kwargs)
+        batches = []
+        for packet_type, payload in sock.requests:
+            if packet_type == pytds.tds_base.PacketType.BULK:
+                batches.append(_parse_bulk(payload)[1])
+        return batches, reports
+
+    batches, reports = load(data=iter(rows), batch_rows=4)
+    assert batches == [rows[0:4], rows[4:8], rows[8:10]]
+    # every batch is committed after its INSERT BULK and data stream are processed
+    assert commits == [2, 4, 6]
+    assert [r[0] for r in reports] == [4, 8, 10]
+    assert reports[0][1] < reports[1][1] < reports[2][1]
+
+    batches, reports = load(data=rows, batch_rows=4, start_batch=2)
+    assert batches == [rows[8:10]]
+    assert [r[0] for r in reports] == [2]
+
+    # every row takes 6 bytes, so size limit ends batches before they get 400 rows
+    many_rows = [[i] for i in range(1000)]
+    batches, reports = load(data=many_rows, batch_rows=400, batch_kb=1)
+    assert len(batches) > 3
+    assert all(len(batch) < 400 for batch in batches)
+    assert sum(batches, []) == many_rows
+    assert reports[-1][0] == 1000
+    with pytest.raises(ValueError):
+        load(data=rows, batch_rows=4, batch_kb=1, start_batch=1)
+    with pytest.raises(ValueError):
+        load(data=rows, start_batch=1)
+
+    values = array.array('i', range(10))
+    batches, reports = load(columns_data={'c0': values}, batch_rows=4, start_batch=1)
+    assert batches == [rows[4:8], rows[8:10]]
+    assert commits == [2, 4]
+    assert [r[0] for r in reports] == [4, 6]
+    with pytest.raises(ValueError):
+        load(columns_data={'c0': values}, batch_rows=4, batch_kb=1)
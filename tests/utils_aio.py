@@ -0,0 +1,202 @@
+"""
+Coroutines for tests of :mod:`pytds.aio`
+
+Kept out of unit_test.py because async syntax doesn't compile on Python 2.7,
+import this module only on Python 3.5 and newer.
+"""
+import asyncio
+import struct
+import time
+import types
+
+import pytest
+
+import pytds
+import pytds.aio
+import pytds.tds_base
+
+
+def run(coro):
+    """ Runs coroutine in a new event loop, works on Python versions without asyncio.run """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        # cancel leftovers, e.g. server side connection handlers
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        pending = [task for task in all_tasks(loop) if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def query_over_small_packets(responses, query_response, split_into_packets):
+    """ Runs queries against a server which sends responses in tiny packets
+
+    :param responses: Payloads of responses to prelogin and login
+    :param query_response: Payload of response to every other request
+    :param split_into_packets: Function which splits payload into packets of given size
+    """
+    async def handle(reader, writer):
+        try:
+            while True:
+                # read whole request
+                while True:
+                    header = await reader.readexactly(8)
+                    await reader.readexactly(struct.unpack('>H', header[2:4])[0] - 8)
+                    if header[1] & 1:
+                        break
+                if header[0] == pytds.tds_base.PacketType.CANCEL:
+                    payload = struct.pack('<BHHQ', pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_CANCELLED, 0, 0)
+                else:
+                    payload = responses.pop(0) if responses else query_response
+                # send response in tiny packets one by one
+                for packet in split_into_packets(payload, 24):
+                    writer.write(packet)
+                    await writer.drain()
+                    await asyncio.sleep(0)
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        conn = await pytds.aio.connect('127.0.0.1', port=port, user='sa', password='password',
+                                       autocommit=True, disable_connect_retry=True)
+        async with conn:
+            assert conn.product_version == 0x01000000
+            async with conn.cursor() as cur:
+                await cur.execute('select c0, c1 from t')
+                assert [d[0] for d in cur.description] == ['c0', 'c1']
+                assert await cur.fetchmany(2) == [(1, u'one'), (None, None)]
+                rest = []
+                async for row in cur:
+                    rest.append(row)
+                assert rest == [(3, u'three' * 20)]
+                assert cur.rowcount == 3
+                assert await cur.execute_scalar('select c0 from t') == 1
+                conn.as_dict = True
+                await cur.execute('select c0, c1 from t')
+                assert (await cur.fetchall())[0] == {'c0': 1, 'c1': u'one'}
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def login(address):
+    """ Logs into the server listening on address, then checks that MARS is refused """
+    conn = await pytds.aio.connect(
+        dsn=address[0],
+        port=address[1],
+        user="sa",
+        password='password',
+        disable_connect_retry=True,
+        autocommit=True)
+    await conn.close()
+    with pytest.raises(pytds.NotSupportedError):
+        await pytds.aio.connect(dsn=address[0], port=address[1], use_mars=True)
+
+
+async def _yield(times=10):
+    for _ in range(times):
+        await asyncio.sleep(0)
+
+
+async def pool_connects_without_lock(monkeypatch):
+    """ Checks that pool opens connections concurrently and that release
+    and failed logins are not blocked by logins in progress
+    """
+    logins = []
+
+    async def connect(*args, **kwargs):
+        login = asyncio.get_event_loop().create_future()
+        logins.append(login)
+        return await login
+
+    def make_conn():
+        session = types.SimpleNamespace(request_reset=lambda: None)
+        conn = pytds.aio.Connection()
+        conn._conn = types.SimpleNamespace(main_session=session)
+        conn._is_usable = lambda: True
+
+        async def rollback():
+            pass
+        conn.rollback = rollback
+        return conn
+
+    monkeypatch.setattr(pytds.aio, 'connect', connect)
+    pool = pytds.aio.Pool(0, 2, (), {})
+    first = asyncio.ensure_future(pool._acquire())
+    second = asyncio.ensure_future(pool._acquire())
+    third = asyncio.ensure_future(pool._acquire())
+    await _yield()
+    # two logins are in progress at once, third acquirer waits for a free slot
+    assert (len(logins), pool.size) == (2, 2)
+    conn = make_conn()
+    logins[1].set_result(conn)
+    assert await second is conn
+    await asyncio.wait_for(pool.release(conn), 1)
+    assert await asyncio.wait_for(third, 1) is conn
+
+    # failed login frees its slot
+    logins[0].set_exception(pytds.LoginError('Login failed'))
+    with pytest.raises(pytds.LoginError):
+        await first
+    assert pool.size == 1
+    fourth = asyncio.ensure_future(pool._acquire())
+    await _yield()
+    assert len(logins) == 3
+    other = make_conn()
+    logins[2].set_result(other)
+    assert await asyncio.wait_for(fourth, 1) is other
+    assert pool.size == 2
+
+
+async def commit_timeout(responses, split_into_packets):
+    """ Checks that commit which server doesn't answer is cancelled after query timeout
+
+    :param responses: Payloads of responses to prelogin, login and begin transaction requests
+    :param split_into_packets: Function which splits payload into packets of given size
+    """
+    async def handle(reader, writer):
+        try:
+            while True:
+                while True:
+                    header = await reader.readexactly(8)
+                    await reader.readexactly(struct.unpack('>H', header[2:4])[0] - 8)
+                    if header[1] & 1:
+                        break
+                if header[0] == pytds.tds_base.PacketType.CANCEL:
+                    payload = struct.pack('<BHHQ', pytds.tds_base.TDS_DONE_TOKEN, pytds.tds_base.TDS_DONE_CANCELLED, 0, 0)
+                elif responses:
+                    payload = responses.pop(0)
+                else:
+                    # commit is never answered
+                    continue
+                for packet in split_into_packets(payload, 512):
+                    writer.write(packet)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        conn = await pytds.aio.connect('127.0.0.1', port=port, user='sa', password='password',
+                                       autocommit=False, timeout=0.2, disable_connect_retry=True)
+        async with conn:
+            assert conn._conn.tds72_transaction
+            start = time.time()
+            with pytest.raises(pytds.TimeoutError):
+                await asyncio.wait_for(conn.commit(), 5)
+            assert time.time() - start < 2
+            # cancel request is acknowledged before next request is sent
+            await asyncio.wait_for(conn._cancel_if_pending(), 5)
+            assert conn._is_usable()
+    finally:
+        server.close()
+        await server.wait_closed()